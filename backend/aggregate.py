@@ -0,0 +1,351 @@
+# aggregate.py
+# Single-pass, constant-memory aggregation of run logs.
+# Memory depends on the number of distinct run names, not on rows.
+
+import glob, hashlib, json, math, os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS = ("energy_kwh", "co2e_kg", "latency_ms", "sci_wh_per_req", "cost_eur")
+PHASE_METRICS = ("latency_ms", "energy_kwh")
+# Span child records (spans.py) carry a run_name too but are not runs; readers
+# project these fields to tell them apart (kind == "span") and group them.
+SPAN_COLUMNS = ("kind", "span_path")
+
+class RunningStats:
+    """
+    count / sum / min / max and Welford mean+variance, mergeable across partitions.
+    Values may carry a frequency weight (sampled records); `n` is then the
+    weighted count and mean/variance are the weighted ones (West 1979).
+    """
+
+    __slots__ = ("n", "total", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float, w: float = 1) -> None:
+        self.n += w
+        self.total += w * x
+        d = x - self.mean
+        self.mean += d * w / self.n
+        self.m2 += w * d * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """Fold `other` into self (Chan et al. parallel variance)."""
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.total, self.mean, self.m2 = other.n, other.total, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        n = self.n + other.n
+        d = other.mean - self.mean
+        self.mean += d * other.n / n
+        self.m2 += other.m2 + d * d * self.n * other.n / n
+        self.n = n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"n": self.n, "total": self.total, "mean": self.mean, "m2": self.m2,
+                "min": self.min if self.n else None, "max": self.max if self.n else None}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RunningStats":
+        s = cls()
+        s.n, s.total, s.mean, s.m2 = d["n"], float(d["total"]), float(d["mean"]), float(d["m2"])
+        if s.n:
+            s.min, s.max = float(d["min"]), float(d["max"])
+        return s
+
+class PhaseBreakdown:
+    """Per-(run_name, span_path) RunningStats of span latency and energy."""
+
+    def __init__(self):
+        self.groups: Dict[Tuple[str, str], Dict[str, RunningStats]] = {}
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def _group(self, key: Tuple[str, str]) -> Dict[str, RunningStats]:
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = {m: RunningStats() for m in PHASE_METRICS}
+        return g
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        g = self._group((rec["run_name"], rec.get("span_path") or rec.get("span") or "?"))
+        w = rec.get("sample_weight") or 1
+        for m in PHASE_METRICS:
+            v = rec.get(m)
+            g[m].add(float(v) if v is not None else 0.0, w)
+
+    def merge(self, other: "PhaseBreakdown") -> "PhaseBreakdown":
+        for key, g in other.groups.items():
+            mine = self._group(key)
+            for m, s in g.items():
+                mine[m].merge(s)
+        return self
+
+    def run_names(self) -> List[str]:
+        return sorted({name for name, _ in self.groups})
+
+    def phases(self, run_name: str) -> List[Tuple[str, Dict[str, RunningStats]]]:
+        """(span_path, stats) for one run, parents before their children."""
+        return sorted((path, g) for (name, path), g in self.groups.items() if name == run_name)
+
+    def to_dict(self) -> List[Any]:
+        return [[name, path, {m: s.to_dict() for m, s in g.items()}] for (name, path), g in self.groups.items()]
+
+    @classmethod
+    def from_dict(cls, d: List[Any]) -> "PhaseBreakdown":
+        pb = cls()
+        for name, path, g in d:
+            pb.groups[(name, path)] = {m: RunningStats.from_dict(s) for m, s in g.items()}
+        return pb
+
+class StreamingAggregator:
+    """
+    Per-`run_name` RunningStats for each metric. Missing metric values count
+    as 0.0, matching the original `r.get(..., 0.0)` readers. A record's
+    `sample_weight` (see sampling.py) is its frequency weight, default 1.
+    Span records are folded into `phases` instead of the run groups.
+    """
+
+    def __init__(self, metrics: Sequence[str] = METRICS, run_names: Optional[Iterable[str]] = None):
+        self.metrics = tuple(metrics)
+        self.only = set(run_names) if run_names is not None else None
+        self.groups: Dict[str, Dict[str, RunningStats]] = {}
+        self.phases = PhaseBreakdown()
+
+    def _group(self, name: str) -> Dict[str, RunningStats]:
+        g = self.groups.get(name)
+        if g is None:
+            g = self.groups[name] = {m: RunningStats() for m in self.metrics}
+        return g
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        name = rec["run_name"]
+        if self.only is not None and name not in self.only:
+            return
+        if rec.get("kind") == "span":
+            self.phases.add(rec)
+            return
+        g = self._group(name)
+        w = rec.get("sample_weight") or 1
+        for m in self.metrics:
+            v = rec.get(m)
+            g[m].add(float(v) if v is not None else 0.0, w)
+
+    def add_all(self, records: Iterable[Dict[str, Any]]) -> "StreamingAggregator":
+        for r in records:
+            self.add(r)
+        return self
+
+    def merge(self, other: "StreamingAggregator") -> "StreamingAggregator":
+        for name, g in other.groups.items():
+            mine = self._group(name)
+            for m, s in g.items():
+                mine[m].merge(s)
+        self.phases.merge(other.phases)
+        return self
+
+    def count(self, name: str) -> int:
+        g = self.groups.get(name)
+        return g[self.metrics[0]].n if g else 0
+
+    def means(self, name: str) -> Dict[str, float]:
+        """{'n': rows (weighted), metric: mean, ...}; zeros for an unknown run name."""
+        g = self.groups.get(name)
+        out: Dict[str, float] = {"n": self.count(name)}
+        for m in self.metrics:
+            out[m] = g[m].mean if g else 0.0
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"metrics": list(self.metrics),
+                "groups": {n: {m: s.to_dict() for m, s in g.items()} for n, g in self.groups.items()},
+                "phases": self.phases.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "StreamingAggregator":
+        agg = cls(d["metrics"])
+        for name, g in d["groups"].items():
+            agg.groups[name] = {m: RunningStats.from_dict(s) for m, s in g.items()}
+        agg.phases = PhaseBreakdown.from_dict(d.get("phases", []))
+        return agg
+
+# ---------------------------------------------------------------------------
+# Incremental aggregation of an append-only JSONL log.
+#
+# A sidecar checkpoint stores the byte offset already folded in, the
+# aggregate state, and a hash of the last complete line before that offset.
+# If the file shrank, changed inode, or that line no longer matches, the log
+# was truncated/rotated and we rebuild from byte zero.
+
+CHECKPOINT_VERSION = 2   # 2: phases from span records
+
+def checkpoint_path(log_path: str) -> str:
+    return log_path + ".cwstate.json"
+
+def _read_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if state.get("version") == CHECKPOINT_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+def _tail_matches(f, state: Dict[str, Any]) -> bool:
+    n = int(state["tail_len"])
+    if n == 0:
+        return state["offset"] == 0
+    f.seek(state["offset"] - n)
+    return hashlib.sha1(f.read(n)).hexdigest() == state["tail_sha1"]
+
+def aggregate_incremental(
+    log_path: str,
+    state_path: Optional[str] = None,
+    metrics: Sequence[str] = METRICS,
+) -> Tuple[StreamingAggregator, int, bool]:
+    """
+    Fold only the bytes appended since the last checkpoint into the saved
+    aggregates. Returns (aggregator, new rows parsed, rebuilt_from_scratch).
+    A trailing line without a newline (writer mid-append) is left for next time.
+    """
+    state_path = state_path or checkpoint_path(log_path)
+    st = os.stat(log_path)
+    state = _read_checkpoint(state_path)
+
+    with open(log_path, "rb") as f:
+        rebuilt = (
+            state is None
+            or list(state["agg"]["metrics"]) != list(metrics)
+            or state.get("inode") != st.st_ino
+            or st.st_size < state["offset"]
+            or not _tail_matches(f, state)
+        )
+        if rebuilt:
+            agg, offset, tail = StreamingAggregator(metrics), 0, b""
+        else:
+            agg, offset, tail = StreamingAggregator.from_dict(state["agg"]), state["offset"], None
+
+        f.seek(offset)
+        rows = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            tail = line
+            if line.strip():
+                agg.add(json.loads(line))
+                rows += 1
+
+    if tail is None:  # nothing new; keep the old tail
+        tail_len, tail_sha1 = state["tail_len"], state["tail_sha1"]
+    else:
+        tail_len, tail_sha1 = len(tail), hashlib.sha1(tail).hexdigest()
+    new_state = {"version": CHECKPOINT_VERSION, "log": os.path.abspath(log_path), "inode": st.st_ino,
+                 "offset": offset, "tail_len": tail_len, "tail_sha1": tail_sha1, "agg": agg.to_dict()}
+    tmp = state_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(new_state, f)
+    os.replace(tmp, state_path)
+    return agg, rows, rebuilt
+
+# ---------------------------------------------------------------------------
+# Parallel ingestion of many logs (one per host) and of large single files.
+# JSONL files are cut into byte ranges aligned to newlines; each worker folds
+# its ranges into a partial StreamingAggregator and the parts are merged.
+
+LOG_PATTERNS = ("*.jsonl", "*.cwcol", "*.parquet", "*.cwseg.gz", "*.cwseg.zst")
+
+def expand_paths(specs: Iterable[str]) -> List[str]:
+    """Files, directories (searched for run logs) and glob patterns -> sorted unique paths."""
+    out = set()
+    for spec in specs:
+        if os.path.isdir(spec):
+            for pat in LOG_PATTERNS:
+                out.update(glob.glob(os.path.join(spec, "**", pat), recursive=True))
+        elif glob.has_magic(spec):
+            out.update(p for p in glob.glob(spec, recursive=True) if os.path.isfile(p))
+        else:
+            out.add(spec)
+    return sorted(out)
+
+def plan_chunks(paths: Sequence[str], chunk_bytes: int) -> List[Tuple[str, int, int]]:
+    """(path, start, end) byte ranges; non-JSONL files are one task each (end = -1)."""
+    from runstore import detect_format
+    tasks = []
+    for p in paths:
+        if detect_format(p) != "jsonl":
+            tasks.append((p, 0, -1))
+            continue
+        size = os.path.getsize(p)
+        for start in range(0, max(size, 1), chunk_bytes):
+            tasks.append((p, start, min(size, start + chunk_bytes)))
+    return tasks
+
+def _iter_range(path: str, start: int, end: int) -> Iterable[Dict[str, Any]]:
+    """Records of lines that *start* inside [start, end)."""
+    with open(path, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()  # finish the line that straddles `start` (owned by the previous chunk)
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            if line.strip():
+                yield json.loads(line)
+
+def _aggregate_task(args) -> StreamingAggregator:
+    path, start, end, metrics, run_names = args
+    agg = StreamingAggregator(metrics, run_names)
+    if end < 0:
+        from runstore import iter_records
+        return agg.add_all(iter_records(path, ["run_name", "sample_weight", *SPAN_COLUMNS, *metrics]))
+    return agg.add_all(_iter_range(path, start, end))
+
+def aggregate_parallel(
+    paths: Sequence[str],
+    workers: Optional[int] = None,
+    chunk_bytes: int = 64 << 20,
+    metrics: Sequence[str] = METRICS,
+    run_names: Optional[Iterable[str]] = None,
+) -> StreamingAggregator:
+    """Aggregate many logs across a process pool; workers=1 runs in-process."""
+    workers = workers or os.cpu_count() or 1
+    only = sorted(run_names) if run_names is not None else None
+    tasks = [(p, s, e, tuple(metrics), only) for p, s, e in plan_chunks(paths, chunk_bytes)]
+    total = StreamingAggregator(metrics, only)
+    if workers == 1 or len(tasks) == 1:
+        for part in map(_aggregate_task, tasks):
+            total.merge(part)
+        return total
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        for part in pool.map(_aggregate_task, tasks):
+            total.merge(part)
+    return total
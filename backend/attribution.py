@@ -0,0 +1,249 @@
+# attribution.py
+# CPU-time attribution for TrackerSession(attribution="cpu"): the energy
+# measured between two accounting events is split among the tracked calls
+# active at the time in proportion to the CPU seconds each consumed, counting
+# every thread and child process working on a call's behalf.
+#   - the calling thread is attached automatically by TrackerSession.begin()
+#   - TrackedThreadPool / bind(fn) attach pool threads to the submitting call
+#   - TrackedProcessPool follows its workers via /proc/<pid>/stat, or else
+#     credits each task's CPU (resource.getrusage in the worker) on completion
+#   - watch_pid(pid) follows any other child process the same way
+# A thread's CPU is split equally among the calls attached to it, so asyncio
+# tasks sharing the event loop thread share its CPU like the "share" mode.
+
+import contextvars, functools, os, threading, time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set
+
+try:
+    import resource   # POSIX only
+except ImportError:
+    resource = None
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+def thread_clock(ident: int) -> Optional[int]:
+    """CPU-time clock id of a thread (readable from other threads), if the platform has one."""
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None
+
+def proc_cpu(pid: int) -> Optional[float]:
+    """utime + stime of `pid` and its reaped children, in seconds, from /proc/<pid>/stat."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    # after "pid (comm)": state is field 3, utime/stime/cutime/cstime are fields 14-17
+    return sum(int(v) for v in fields[11:15]) / _CLK_TCK
+
+def self_cpu() -> float:
+    """CPU seconds of this process (all threads)."""
+    if resource is not None:
+        ru = resource.getrusage(resource.RUSAGE_SELF)
+        return ru.ru_utime + ru.ru_stime
+    return time.process_time()
+
+class CpuAccount:
+    """Energy attributed to one tracked call; `pending` holds CPU reported after the fact."""
+
+    __slots__ = ("kwh", "pending", "active")
+
+    def __init__(self):
+        self.kwh = 0.0
+        self.pending = 0.0
+        self.active = True
+
+class _Source:
+    """One CPU counter (a thread or a process) and the calls it works for."""
+
+    __slots__ = ("read", "last", "accounts")
+
+    def __init__(self, read: Optional[Callable[[], Optional[float]]], last: float):
+        self.read = read          # None: only readable from inside its own thread
+        self.last = last
+        self.accounts: Set[CpuAccount] = set()
+
+class CpuLedger:
+    """
+    Bookkeeping behind the "cpu" attribution mode. Not thread-safe on its own:
+    TrackerSession calls it under its accounting lock, right after computing
+    the energy of the interval since the previous event.
+    """
+
+    def __init__(self):
+        self.accounts: Set[CpuAccount] = set()
+        self.threads: Dict[int, _Source] = {}
+        self.pids: Dict[int, _Source] = {}
+
+    def open(self) -> CpuAccount:
+        acc = CpuAccount()
+        self.accounts.add(acc)
+        return acc
+
+    def close(self, acc: CpuAccount) -> None:
+        acc.active = False
+        self.accounts.discard(acc)
+        for table in (self.threads, self.pids):
+            for key in [k for k, src in table.items() if acc in src.accounts]:
+                self._drop(table, key, acc)
+
+    def attach_thread(self, acc: CpuAccount) -> None:
+        """Charge the calling thread's CPU to `acc` from now on."""
+        ident = threading.get_ident()
+        src = self.threads.get(ident)
+        if src is None:
+            cid = thread_clock(ident)
+            read = (lambda cid=cid: time.clock_gettime(cid)) if cid is not None else None
+            src = self.threads[ident] = _Source(read, time.thread_time())
+        src.accounts.add(acc)
+
+    def detach_thread(self, acc: CpuAccount) -> None:
+        """Stop charging the calling thread to `acc` (must run in that thread)."""
+        ident = threading.get_ident()
+        src = self.threads.get(ident)
+        if src is None or acc not in src.accounts:
+            return
+        if src.read is None:   # CPU since attach only becomes known here
+            now = time.thread_time()
+            self._spread(src, now - src.last)
+            src.last = now
+        self._drop(self.threads, ident, acc)
+
+    def watch_pid(self, acc: CpuAccount, pid: int) -> bool:
+        src = self.pids.get(pid)
+        if src is None:
+            base = proc_cpu(pid)
+            if base is None:
+                return False
+            src = self.pids[pid] = _Source(lambda pid=pid: proc_cpu(pid), base)
+        src.accounts.add(acc)
+        return True
+
+    def split(self, energy_kwh: float) -> None:
+        """Read every CPU counter and split `energy_kwh` by the CPU consumed since the last call."""
+        for table in (self.threads, self.pids):
+            for src in table.values():
+                if src.read is None:
+                    continue
+                try:
+                    v = src.read()
+                except OSError:
+                    v = None
+                if v is None:
+                    continue
+                self._spread(src, v - src.last)
+                src.last = v
+        if not self.accounts:
+            return
+        weights = {acc: acc.pending for acc in self.accounts}
+        for acc in self.accounts:
+            acc.pending = 0.0
+        if energy_kwh <= 0:
+            return
+        total = sum(weights.values())
+        if total > 0:
+            for acc, w in weights.items():
+                acc.kwh += energy_kwh * w / total
+        else:  # nobody used CPU (all waiting on I/O): split equally
+            each = energy_kwh / len(self.accounts)
+            for acc in self.accounts:
+                acc.kwh += each
+
+    @staticmethod
+    def _spread(src: _Source, cpu_s: float) -> None:
+        if cpu_s <= 0 or not src.accounts:
+            return
+        each = cpu_s / len(src.accounts)
+        for acc in src.accounts:
+            acc.pending += each
+
+    @staticmethod
+    def _drop(table: Dict[int, _Source], key: int, acc: CpuAccount) -> None:
+        src = table[key]
+        src.accounts.discard(acc)
+        if not src.accounts:
+            del table[key]
+
+# (session, account) of the tracked call running in this context, set by
+# TrackerSession.begin() in "cpu" mode; pools read it when work is submitted.
+_current: contextvars.ContextVar = contextvars.ContextVar("carbonwise_account", default=None)
+
+def bind(fn: Callable) -> Callable:
+    """
+    Wrap `fn` to run in another thread on behalf of the current tracked call:
+    its CPU is charged to that call and spans opened inside nest under it.
+    """
+    ctx = contextvars.copy_context()
+    cur = _current.get()
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        if cur is None:
+            return ctx.copy().run(fn, *args, **kwargs)
+        session, acc = cur
+        session.attach_thread(acc)
+        try:
+            return ctx.copy().run(fn, *args, **kwargs)
+        finally:
+            session.detach_thread(acc)
+    return bound
+
+def watch_pid(pid: int) -> bool:
+    """Charge a child process (e.g. subprocess.Popen) to the current tracked call."""
+    cur = _current.get()
+    return cur is not None and cur[0].watch_pid(cur[1], pid)
+
+class TrackedThreadPool(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose tasks are charged to the tracked call that submitted them."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(bind(fn), *args, **kwargs)
+
+def _measured_call(fn: Callable, args: tuple, kwargs: dict):
+    c0 = self_cpu()
+    result = fn(*args, **kwargs)
+    return result, self_cpu() - c0
+
+class TrackedProcessPool(ProcessPoolExecutor):
+    """
+    ProcessPoolExecutor whose tasks are charged to the tracked call that
+    submitted them. Where /proc is readable the worker processes are watched
+    live, so their CPU lands in the right accounting intervals. Which worker
+    will run a task is not known at submit time, so the call is attached to
+    every worker the pool has, not just the one running its task: CPU a
+    worker spends on another call's task while both calls are open is split
+    equally among them; give overlapping calls their own pools where that
+    matters. Without /proc, each task reports its own CPU seconds
+    (getrusage in the worker) and the call is credited when the task
+    completes.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        cur = _current.get()
+        inner = super().submit(_measured_call, fn, args, kwargs)
+        live = False
+        if cur is not None:
+            pids = list(getattr(self, "_processes", None) or {})
+            live = bool(pids) and all([cur[0].watch_pid(cur[1], pid) for pid in pids])
+        outer: Future = Future()
+
+        def done(f: Future) -> None:
+            if f.cancelled():
+                outer.cancel()
+                outer.set_running_or_notify_cancel()
+                return
+            exc = f.exception()
+            if exc is not None:
+                outer.set_exception(exc)
+                return
+            result, cpu_s = f.result()
+            if cur is not None and not live:
+                cur[0].add_cpu(cur[1], cpu_s)
+            outer.set_result(result)
+
+        outer.add_done_callback(lambda o: o.cancelled() and inner.cancel())
+        inner.add_done_callback(done)
+        return outer
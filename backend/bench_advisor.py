@@ -0,0 +1,72 @@
+# bench_advisor.py
+# Time region_advisor.plan_batch on synthetic jobs, regions and hourly
+# intensity series (a daily sine per region with a random phase), and
+# spot-check the chosen placements against a brute-force scalar search.
+# Usage:
+#   python bench_advisor.py --jobs 100000 --regions 36 --max-delay-h 24
+
+import argparse, math, random, time
+import numpy as np
+from grid_intensity import GridIntensity, IntensitySeries
+from region_advisor import _jobs, plan_batch
+
+def synthetic(n_jobs, n_regions, max_delay_h, seed=1):
+    rnd = random.Random(seed)
+    now = int(time.time()) // 3600 * 3600
+    tbl, series = [], {}
+    for k in range(n_regions):
+        g, phase = rnd.randint(50, 600), rnd.uniform(0, 24)
+        tbl.append({"region": f"r{k}", "display_name": f"R{k}", "gco2_per_kwh": g,
+                    "eur_per_kwh": round(rnd.uniform(0.1, 0.4), 3), "latency_ms": rnd.randint(5, 150)})
+        series[f"r{k}"] = IntensitySeries((now + h * 3600, g * (1 + 0.5 * math.sin(2 * math.pi * (h + phase) / 24)))
+                                          for h in range(-24 * 10, 24 * 10))
+    jobs = _jobs([str(j) for j in range(n_jobs)],
+                 [rnd.uniform(0.01, 5) for _ in range(n_jobs)],
+                 [now + rnd.randint(-5 * 86400, 3 * 86400) for _ in range(n_jobs)],
+                 [rnd.uniform(0, 6) for _ in range(n_jobs)],
+                 [f"r{rnd.randrange(n_regions)}" for _ in range(n_jobs)],
+                 [rnd.choice([0, max_delay_h / 2, max_delay_h]) for _ in range(n_jobs)], tbl)
+    return tbl, GridIntensity(series), jobs
+
+def brute_force(j, jobs, tbl, grid, max_latency_ms, max_cost_increase_pct):
+    cur = tbl[jobs["region"][j]]
+    e, s0, d = jobs["energy_kwh"][j], jobs["start"][j], jobs["duration_h"][j]
+    best = math.inf
+    for r in tbl:
+        if r is not cur and (r["latency_ms"] > max_latency_ms
+                             or r["eur_per_kwh"] > cur["eur_per_kwh"] * (1 + max_cost_increase_pct / 100.0)):
+            continue
+        for k in range(int(jobs["max_delay_h"][j]) + 1):
+            t = s0 + k * 3600
+            best = min(best, e * grid.mean(r["region"], t, t + d * 3600) / 1000.0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=100_000)
+    ap.add_argument("--regions", type=int, default=36)
+    ap.add_argument("--max-delay-h", dest="max_delay_h", type=float, default=24.0)
+    ap.add_argument("--max-latency-ms", dest="max_latency_ms", type=float, default=100.0)
+    ap.add_argument("--max-cost-increase-pct", dest="max_cost_increase_pct", type=float, default=20.0)
+    ap.add_argument("--check", type=int, default=50, help="jobs to verify by brute force")
+    args = ap.parse_args()
+
+    tbl, grid, jobs = synthetic(args.jobs, args.regions, args.max_delay_h)
+    t0 = time.perf_counter()
+    plan = plan_batch(jobs, tbl, grid, max_latency_ms=args.max_latency_ms,
+                      max_cost_increase_pct=args.max_cost_increase_pct)
+    secs = time.perf_counter() - t0
+    cells = args.jobs * args.regions * (int(args.max_delay_h) + 1)
+    base, best = float(np.nansum(plan["baseline_kg"])), float(np.nansum(plan["best_kg"]))
+    print(f"{args.jobs} jobs x {args.regions} regions x {int(args.max_delay_h) + 1} slots: "
+          f"{secs:.2f} s ({cells / secs / 1e6:.0f} M placements/s)")
+    print(f"projected: {base:.1f} → {best:.1f} kg CO₂e ({100 * (base - best) / base:.1f}% less)")
+
+    bad = 0
+    for j in random.Random(2).sample(range(args.jobs), min(args.check, args.jobs)):
+        want = brute_force(j, jobs, tbl, grid, args.max_latency_ms, args.max_cost_increase_pct)
+        bad += abs(want - plan["best_kg"][j]) > 1e-9 * max(1.0, want)
+    print(f"brute-force check: {min(args.check, args.jobs) - bad}/{min(args.check, args.jobs)} match")
+
+if __name__ == "__main__":
+    main()
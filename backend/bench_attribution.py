@@ -0,0 +1,98 @@
+# bench_attribution.py
+# Self-checking run of CPU-time attribution (TrackerSession(attribution="cpu")):
+#   1. N tracked calls in parallel threads, each running cpu_burn from the
+#      example scripts for a different length, plus one mostly-idle call
+#   2. a tracked call fanning cpu_burn out to a TrackedThreadPool and a
+#      TrackedProcessPool while another tracked call burns on its own
+# Checks that the attributed energies add up to what the session measured
+# over the same span, and prints each call's energy share next to its CPU
+# share. Exits 1 if the totals do not add up.
+# Usage:
+#   python bench_attribution.py --workers 4 --secs 0.5
+
+import argparse, sys, threading, time
+import tracker
+from attribution import TrackedProcessPool, TrackedThreadPool, self_cpu
+from cw_bench import cpu_burn
+
+def run_calls(session, jobs):
+    """Run (name, fn) jobs as concurrent tracked calls; returns [(name, kWh, cpu_s)], span kWh."""
+    out = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(jobs))
+
+    def worker(name, fn):
+        barrier.wait()
+        token = session.begin()
+        c0 = time.thread_time()
+        extra = fn()
+        cpu = time.thread_time() - c0 + (extra or 0.0)
+        _, kwh = session.end(token)
+        with lock:
+            out.append((name, kwh, cpu))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=job) for job in jobs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # every call was active from the barrier to (at least) the last start, so
+    # the session energy over [t0, t1] is what the calls must add up to
+    t1 = time.perf_counter()
+    return sorted(out), session.energy_between(t0, t1)
+
+def burn_in_thread(secs):
+    c0 = time.thread_time()
+    cpu_burn(secs)
+    return time.thread_time() - c0
+
+def burn_in_process(secs):
+    c0 = self_cpu()
+    cpu_burn(secs)
+    return self_cpu() - c0
+
+def report(title, rows, total_kwh, tol):
+    got = sum(kwh for _, kwh, _ in rows)
+    cpu_total = sum(cpu for _, _, cpu in rows) or 1.0
+    print(f"\n{title}")
+    print(f"{'call':>12} {'CPU s':>8} {'CPU %':>7} {'energy %':>9}")
+    for name, kwh, cpu in rows:
+        print(f"{name:>12} {cpu:8.2f} {100 * cpu / cpu_total:6.1f}% {100 * kwh / got if got else 0:8.1f}%")
+    err = abs(got - total_kwh) / total_kwh if total_kwh else 0.0
+    ok = err <= tol
+    print(f"attributed {got:.3e} kWh vs measured {total_kwh:.3e} kWh ({100 * err:.2f}% off): {'OK' if ok else 'FAIL'}")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--secs", type=float, default=0.5, help="cpu_burn length unit per worker")
+    ap.add_argument("--measure-secs", dest="measure_secs", type=float, default=0.1)
+    ap.add_argument("--tol", type=float, default=0.02, help="allowed relative error of the total")
+    args = ap.parse_args()
+
+    session = tracker.TrackerSession(args.measure_secs, attribution="cpu").start()
+    time.sleep(2 * args.measure_secs)   # a couple of samples so the rate is known
+    ok = True
+
+    jobs = [(f"burn{i + 1}", lambda i=i: cpu_burn(args.secs * (i + 1))) for i in range(args.workers)]
+    jobs.append(("mostly-idle", lambda: (cpu_burn(args.secs / 5), time.sleep(args.secs * args.workers))[0]))
+    rows, total = run_calls(session, jobs)
+    ok &= report(f"{args.workers} threads running cpu_burn + 1 mostly-idle call", rows, total, args.tol)
+
+    def fanout():
+        with TrackedThreadPool(2) as tp, TrackedProcessPool(2) as pp:
+            futs = [tp.submit(burn_in_thread, args.secs) for _ in range(2)]
+            futs += [pp.submit(burn_in_process, args.secs) for _ in range(2)]
+            return sum(f.result() for f in futs)
+
+    jobs = [("fanout", fanout), ("solo", lambda: cpu_burn(args.secs * 2))]
+    rows, total = run_calls(session, jobs)
+    ok &= report("thread + process pool fan-out vs a solo call", rows, total, args.tol)
+
+    session.stop()
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
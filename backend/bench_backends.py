@@ -0,0 +1,79 @@
+# bench_backends.py
+# Start-up and read cost of each energy backend (energy_backends.py). Every
+# backend is measured in a fresh interpreter, so the import cost (CodeCarbon's
+# dependency tree, for one) is counted the way a short-lived job pays it.
+# Columns: `import tracker`, start() (including any lazy import), one
+# energy_kwh() read, stop(), and the energy reported over a fixed cpu_burn.
+# Backends that are not usable on this host (e.g. rapl without readable
+# /sys/class/powercap) are listed as skipped.
+# Usage:
+#   python bench_backends.py --burn 1.0 --reads 2000
+
+import argparse, json, os, statistics, subprocess, sys, time
+
+def child(name, burn, reads):
+    t0 = time.perf_counter()
+    from tracker import make_backend   # the import an instrumented job pays
+    from energy_backends import BACKENDS
+    t_import = time.perf_counter() - t0
+    if not BACKENDS[name].available():
+        return {"backend": name, "skipped": True}
+    backend = make_backend(name, measure_secs=0.5)
+    t0 = time.perf_counter()
+    backend.start()
+    t_start = time.perf_counter() - t0
+    sample = []
+    for _ in range(reads):
+        t0 = time.perf_counter()
+        backend.energy_kwh()
+        sample.append(time.perf_counter() - t0)
+    from cw_bench import cpu_burn
+    e0 = backend.energy_kwh()
+    cpu_burn(burn)
+    e1 = backend.energy_kwh()
+    t0 = time.perf_counter()
+    final = backend.stop()
+    t_stop = time.perf_counter() - t0
+    return {
+        "backend": name,
+        "import_ms": t_import * 1e3,
+        "start_ms": t_start * 1e3,
+        "read_us": statistics.median(sample) * 1e6,
+        "stop_ms": t_stop * 1e3,
+        "burn_kwh": e1 - e0,
+        "final_kwh": final,
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=["rapl", "cputdp", "codecarbon", "fake"])
+    ap.add_argument("--burn", type=float, default=1.0, help="seconds of cpu_burn to measure")
+    ap.add_argument("--reads", type=int, default=2000)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.burn, args.reads)))
+        return
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.getenv("PYTHONPATH")])))
+    print(f"| backend | import ms | start ms | read µs | stop ms | kWh over {args.burn:g}s burn |")
+    print("|---|---:|---:|---:|---:|---:|")
+    for name in args.backends:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name,
+                              "--burn", str(args.burn), "--reads", str(args.reads)],
+                             capture_output=True, text=True, env=env)
+        lines = [l for l in out.stdout.splitlines() if l.startswith("{")]
+        if out.returncode != 0 or not lines:
+            print(f"| {name} | failed: {(out.stderr.strip().splitlines() or ['?'])[-1]} | | | | |")
+            continue
+        r = json.loads(lines[-1])
+        if r.get("skipped"):
+            print(f"| {name} | skipped (not available here) | | | | |")
+            continue
+        print(f"| {name} | {r['import_ms']:.1f} | {r['start_ms']:.1f} | {r['read_us']:.2f} | "
+              f"{r['stop_ms']:.1f} | {r['burn_kwh']:.3e} |")
+
+if __name__ == "__main__":
+    main()
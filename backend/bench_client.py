@@ -0,0 +1,97 @@
+# bench_client.py
+# Throughput of remote inference against the local stub server, for the same
+# prompts sent four ways:
+#   fresh       one requests.post per prompt, one after another (the old
+#               examples_hathora_client.py loop: a new connection every time)
+#   pooled x1   InferenceClient, sequential, reusing one keep-alive connection
+#   pooled xN   InferenceClient fanning out with N requests in flight
+# Reports req/s, latency and TTFB percentiles, connections the server saw,
+# and checks that the tracked records carry ttfb_ms / bytes_in / bytes_out.
+# Usage:
+#   python bench_client.py --requests 200 --concurrency 4 16 --latency-ms 40 --fail-rate 0.02
+
+import argparse, json, os, tempfile, threading, time
+import requests
+import tracker
+from remote_client import InferenceClient, chat_payload
+from stub_inference_server import make_server
+
+def pct(vals, q):
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+def stats(base):
+    return requests.get(f"{base}/stats", timeout=5).json()
+
+def fresh(url, payloads):
+    """Old behaviour: a module-level requests.post per prompt (no session, no retry)."""
+    lat, failed = [], 0
+    for p in payloads:
+        t0 = time.perf_counter()
+        try:
+            requests.post(url, json=p, timeout=30).raise_for_status()
+        except requests.RequestException:
+            failed += 1
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    return lat, [], failed
+
+def pooled(url, payloads, concurrency, retries):
+    with InferenceClient(url, concurrency=concurrency, retries=retries, backoff_s=0.02,
+                         run_name=f"bench_client/x{concurrency}") as client:
+        replies = client.map(payloads)
+    return ([r.latency_ms for r in replies], [r.ttfb_ms for r in replies if r.ttfb_ms is not None],
+            sum(not r.ok for r in replies))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=200, help="prompts per mode")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[4, 16])
+    ap.add_argument("--max-tokens", dest="max_tokens", type=int, default=32)
+    ap.add_argument("--latency-ms", dest="latency_ms", type=float, default=40.0, help="stub delay per request")
+    ap.add_argument("--token-ms", dest="token_ms", type=float, default=0.25, help="stub delay per token")
+    ap.add_argument("--capacity", type=int, default=64, help="stub requests served at once")
+    ap.add_argument("--fail-rate", dest="fail_rate", type=float, default=0.0, help="stub 503 fraction (retried)")
+    ap.add_argument("--retries", type=int, default=3)
+    ap.add_argument("--energy-backend", dest="energy_backend", default="cputdp")
+    args = ap.parse_args()
+
+    srv = make_server(port=0, latency_ms=args.latency_ms, token_ms=args.token_ms, capacity=args.capacity,
+                      fail_rate=args.fail_rate)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    url = f"{base}/v1/chat/completions"
+
+    tmp = tempfile.mkdtemp()
+    tracker.LOG_PATH = os.path.join(tmp, "bench_log.jsonl")
+    tracker.start_session(measure_secs=0.5, energy_backend=args.energy_backend)
+    payloads = [chat_payload(f"prompt {i}: name one way to cut inference energy", args.max_tokens)
+                for i in range(args.requests)]
+
+    modes = [("fresh", lambda: fresh(url, payloads)), ("pooled x1", lambda: pooled(url, payloads, 1, args.retries))]
+    modes += [(f"pooled x{c}", lambda c=c: pooled(url, payloads, c, args.retries)) for c in args.concurrency]
+
+    print(f"{args.requests} requests per mode; stub {args.latency_ms:g} ms + {args.token_ms:g} ms/token "
+          f"x {args.max_tokens} tokens, fail rate {args.fail_rate:g}")
+    print("| mode | req/s | speedup | p50 ms | p99 ms | TTFB p50 ms | connections | failed |")
+    print("|---|---:|---:|---:|---:|---:|---:|---:|")
+    first = None
+    for name, run in modes:
+        s0 = stats(base)
+        t0 = time.perf_counter()
+        lat, ttfb, failed = run()
+        rate = len(lat) / (time.perf_counter() - t0)
+        first = first or rate
+        conns = stats(base)["connections"] - s0["connections"] - 1   # minus the /stats probe itself
+        print(f"| {name} | {rate:.1f} | {rate / first:.1f}x | {pct(lat, 0.5):.1f} | {pct(lat, 0.99):.1f} | "
+              f"{f'{pct(ttfb, 0.5):.1f}' if ttfb else '-'} | {conns} | {failed} |")
+    tracker.stop_session()
+    srv.shutdown()
+
+    with open(tracker.LOG_PATH, encoding="utf-8") as f:
+        recs = [json.loads(line) for line in f]
+    complete = sum(all(k in r for k in ("ttfb_ms", "bytes_in", "bytes_out", "attempts")) for r in recs)
+    retried = sum(r.get("attempts", 1) > 1 for r in recs)
+    print(f"\ntracked records: {len(recs)}, with ttfb_ms/bytes_in/bytes_out/attempts: {complete}, retried: {retried}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# bench_compact.py
+# On-disk size and read speed of compacted segments (logcompact.py) against
+# the JSONL the tracker writes, on a synthetic log built with the tracker's
+# own record layout: a few run names and meta blocks, span children, sampled
+# and remote-client records, and a share of pre-1.2.0 records with the env
+# block inline (migrated during compaction).
+#   1. bytes on disk: JSONL, plain gzip of it, segment (gzip / zstd)
+#   2. read time through runstore.iter_records with the cw_report and
+#      cw_quality_gate projections and with whole records
+#   3. round trip (logcompact.verify) and a rotation under a live appender
+#      that must not lose a record
+# Usage:
+#   python bench_compact.py --records 200000 --old-share 0.2
+
+import argparse, gzip, os, random, shutil, tempfile, threading, time, uuid
+import tracker
+from cw_quality_gate import GATE_COLUMNS
+from cw_report import REPORT_COLUMNS
+from envmeta import ENV_KEYS, env_id, env_block
+from logcompact import compact, default_codec, rotate, verify
+from runstore import iter_records
+from sinks import append_lines, encode_line
+
+RUNS = ("baseline", "optimized", "hathora", "batch/x8", "bench_client/x16")
+METAS = (
+    {"precision": "fp16", "spec_decode": False, "quant": None, "region": "eu-west-1"},
+    {"precision": "int4", "spec_decode": True, "quant": "int4", "region": "europe-west9"},
+    {"source": "remote", "endpoint": "api.example.net", "concurrency": 8, "region": "eu-west-1"},
+    {"notes": "nightly", "region": "eu-central-1"},
+)
+PHASES = ("tokenize", "prefill", "decode")
+
+def make_log(path, n, old_share, seed=7):
+    """Write ~n records (runs plus their spans) to path and its env side table; returns the count."""
+    rnd = random.Random(seed)
+    refs = [{"schema_version": tracker.SCHEMA_VERSION, "env_id": env_id(tracker.SCHEMA_VERSION, b)}
+            for b in ("rapl", "cputdp")]
+    for ref in refs:
+        tracker.register_env(path, ref["env_id"])
+    old_env = {k: v for k, v in env_block(refs[0]["env_id"]).items() if k in ENV_KEYS and k != "energy_backend"}
+    old_env["schema_version"] = "1.1.0"
+    t = 1_760_000_000
+    lines, count = [], 0
+    while count < n:
+        run = rnd.randrange(len(RUNS))
+        old = rnd.random() < old_share
+        kwh = rnd.lognormvariate(-9.5, 1.2)
+        g = (275, 80, 275, 420, 230)[run]
+        t += rnd.randrange(3)
+        rec = tracker._build_record(
+            RUNS[run], rnd.choice((1, 1, 10, 32)), METAS[run % len(METAS)],
+            old_env if old else refs[run % 2], kwh, kwh * g / 1000.0, rnd.lognormvariate(5.0, 0.6),
+            rnd.choice((None, None, 0.5)), None if old else g, run_id=str(uuid.UUID(int=rnd.getrandbits(128))))
+        rec["ts"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t))
+        if RUNS[run] == "hathora":
+            rec.update(ttfb_ms=round(rec["latency_ms"] * 0.8, 2), bytes_out=rnd.randrange(200, 400),
+                       bytes_in=rnd.randrange(600, 3000), status=200, attempts=1, backoff_ms=0.0, error=None)
+        if RUNS[run] == "batch/x8":
+            rec["sample_weight"] = 8
+        spans = []
+        if not old and RUNS[run] in ("baseline", "optimized"):
+            start = 0.0
+            for sid, name in enumerate(PHASES, 1):
+                lat = rec["latency_ms"] * (0.1, 0.3, 0.6)[sid - 1]
+                e = kwh * (0.1, 0.3, 0.6)[sid - 1]
+                spans.append({"kind": "span", "run_id": rec["run_id"], "run_name": rec["run_name"], "ts": rec["ts"],
+                              "span_id": sid, "parent_span_id": None, "span": name, "span_path": name, "depth": 0,
+                              "start_ms": round(start, 3), "latency_ms": round(lat, 3), "energy_kwh": round(e, 12),
+                              "co2e_kg": round(e * g / 1000.0, 12), "thread_id": 140213, "task": None, "error": None})
+                start += lat
+            rec["spans"] = len(spans)
+        for r in (rec, *spans):
+            lines.append(encode_line(r))
+        count += 1 + len(spans)
+        if len(lines) >= 4096:
+            append_lines(path, b"".join(lines))
+            lines = []
+    append_lines(path, b"".join(lines))
+    return count
+
+def read_secs(path, columns, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = sum(1 for _ in iter_records(path, columns))
+        best = min(best, time.perf_counter() - t0)
+    return best, n
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, default=200_000)
+    ap.add_argument("--old-share", dest="old_share", type=float, default=0.2, help="fraction of 1.1.0 records")
+    ap.add_argument("--repeat", type=int, default=3, help="best of N reads")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    log = os.path.join(tmp, "run_log.jsonl")
+    n = make_log(log, args.records, args.old_share)
+    raw = os.path.getsize(log)
+    with open(log, "rb") as f, gzip.open(os.path.join(tmp, "plain.jsonl.gz"), "wb", compresslevel=9) as g:
+        shutil.copyfileobj(f, g)
+    plain = os.path.getsize(os.path.join(tmp, "plain.jsonl.gz"))
+
+    codecs = ["gzip"] + (["zstd"] if default_codec() == "zstd" else [])
+    segs = {}
+    print(f"{n} records, {raw / n:.0f} B/record as JSONL\n")
+    print("| file | bytes | B/record | vs JSONL | compact s |")
+    print("|---|---:|---:|---:|---:|")
+    print(f"| JSONL | {raw} | {raw / n:.0f} | 1.0x | - |")
+    print(f"| JSONL, gzip -9 | {plain} | {plain / n:.1f} | {raw / plain:.1f}x | - |")
+    for codec in codecs:
+        seg = os.path.join(tmp, f"run_log.cwseg.{'gz' if codec == 'gzip' else 'zst'}")
+        t0 = time.perf_counter()
+        stats = compact(log, seg, codec)
+        secs = time.perf_counter() - t0
+        segs[codec] = seg
+        size = stats["bytes_out"]
+        print(f"| segment, {codec} | {size} | {size / n:.1f} | {raw / size:.1f}x | {secs:.2f} |")
+    print(f"\n{stats['migrated']} records migrated, {stats['metas']} meta blocks, {stats['shapes']} shapes")
+
+    print("\n| read (best of %d) | JSONL s | %s |" % (args.repeat, " | ".join(f"segment {c} s" for c in codecs)))
+    print("|---|---:|" + "---:|" * len(codecs))
+    for name, cols in (("cw_report columns", REPORT_COLUMNS), ("quality gate columns", GATE_COLUMNS),
+                       ("whole records", None)):
+        base, _ = read_secs(log, cols, args.repeat)
+        cells = []
+        for codec in codecs:
+            s, m = read_secs(segs[codec], cols, args.repeat)
+            assert m == n, (m, n)
+            cells.append(f"{s:.2f} ({base / s:.2f}x)")
+        print(f"| {name} | {base:.2f} | {' | '.join(cells)} |")
+
+    for codec in codecs:
+        print(f"\nverified {verify(log, segs[codec])} records ({codec})")
+
+    # rotation while a writer keeps appending: every record lands in the segment or the new log
+    live = os.path.join(tmp, "live.jsonl")
+    stop = threading.Event()
+    written = [0]
+
+    def appender():
+        while not stop.is_set():
+            append_lines(live, encode_line({"run_name": "live", "ts": "2026-01-01T00:00:00Z", "latency_ms": 1.0,
+                                            "seq": written[0]}))
+            written[0] += 1
+
+    th = threading.Thread(target=appender)
+    th.start()
+    time.sleep(0.5)
+    rot = rotate(live, max_bytes=1, settle_secs=0.05)
+    time.sleep(0.2)
+    stop.set()
+    th.join()
+    seen = rot["records"] + sum(1 for _ in iter_records(live))
+    print(f"rotation under load: {written[0]} appended, {rot['records']} in {os.path.basename(rot['segment'])} "
+          f"+ {seen - rot['records']} in the new log")
+    if seen != written[0]:
+        raise SystemExit("rotation lost or duplicated records")
+    shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main()
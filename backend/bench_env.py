@@ -0,0 +1,74 @@
+# bench_env.py
+# Start-up and per-record cost of tracker metadata, before/after env ids:
+#   - `import tracker` in a fresh interpreter, next to `import codecarbon`
+#     (what every tracker import used to pay)
+#   - building the env block on every call (old) vs the cached env_id lookup
+#   - bytes per JSONL record with the env block inline (old) vs meta.env_id,
+#     plus the one-off side table row
+# Usage:
+#   python bench_env.py --repeat 5 --calls 2000
+
+import argparse, json, os, statistics, subprocess, sys, time
+import envmeta, tracker
+
+def fresh_import_ms(module, repeat):
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1e3)"
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = []
+    for _ in range(repeat):
+        r = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=here)
+        lines = r.stdout.strip().splitlines()
+        if r.returncode != 0 or not lines:
+            return None
+        out.append(float(lines[-1]))
+    return statistics.median(out)
+
+def inline_env(backend):
+    """The env block as every record carried it up to schema 1.1.0."""
+    return {
+        "schema_version": "1.1.0",
+        "python_version": envmeta.platform.python_version(),
+        "platform": envmeta.platform.platform(),
+        "cpu": envmeta.platform.processor(),
+        "codecarbon_version": envmeta._pkg_ver("codecarbon"),
+        "energy_backend": backend,
+        "cwd": os.getcwd(),
+    }
+
+def per_call_us(fn, calls):
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import measurement")
+    ap.add_argument("--calls", type=int, default=2000)
+    args = ap.parse_args()
+
+    print("| import | median ms |")
+    print("|---|---:|")
+    for module in ("tracker", "codecarbon"):
+        ms = fresh_import_ms(module, args.repeat)
+        print(f"| {module} | {'n/a' if ms is None else f'{ms:.1f}'} |")
+
+    print("\n| env metadata per call | µs |")
+    print("|---|---:|")
+    print(f"| rebuilt (old) | {per_call_us(lambda: inline_env('cputdp'), args.calls):.2f} |")
+    print(f"| cached env_id | {per_call_us(lambda: tracker._env_meta('cputdp'), args.calls):.3f} |")
+
+    meta = {"notes": "CarbonWise tracker", "region": "eu-west-1"}
+    old = tracker._build_record("bench", 1, meta, inline_env("cputdp"), 1.2e-6, 3.4e-7, 12.5, None, 300.0)
+    new = tracker._build_record("bench", 1, meta, tracker._env_meta("cputdp"), 1.2e-6, 3.4e-7, 12.5, None, 300.0)
+    eid = new["meta"]["env_id"]
+    side = json.dumps({"env_id": eid, "first_seen": new["ts"], **envmeta.env_block(eid)}) + "\n"
+    b_old, b_new = len(json.dumps(old)) + 1, len(json.dumps(new)) + 1
+    print("\n| record | bytes |")
+    print("|---|---:|")
+    print(f"| inline env (old) | {b_old} |")
+    print(f"| env_id | {b_new} ({100 * (1 - b_new / b_old):.0f}% smaller) |")
+    print(f"| side table row (once per env) | {len(side)} |")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# bench_ingest.py
+# Multi-file / chunked ingestion throughput at 1, 4 and 16 workers.
+# Usage:
+#   python bench_ingest.py --files 32 --rows 100000 --workers 1 4 16
+
+import argparse, json, os, random, tempfile, time
+from aggregate import aggregate_parallel, expand_paths
+
+def make_logs(folder, files, rows):
+    rnd = random.Random(0)
+    for h in range(files):
+        with open(os.path.join(folder, f"host{h:03d}.jsonl"), "w", encoding="utf-8") as f:
+            for _ in range(rows):
+                f.write(json.dumps({
+                    "run_name": rnd.choice(["baseline", "optimized", "hathora"]),
+                    "energy_kwh": rnd.random() * 1e-4, "co2e_kg": rnd.random() * 3e-5,
+                    "latency_ms": rnd.random() * 1e4, "requests": 10,
+                    "sci_wh_per_req": rnd.random() * 0.01, "cost_eur": rnd.random() * 1e-5,
+                    "meta": {"region": "eu-west-1", "notes": "CarbonWise tracker"},
+                }) + "\n")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=32)
+    ap.add_argument("--rows", type=int, default=100000, help="rows per file")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--chunk-mb", dest="chunk_mb", type=int, default=16)
+    ap.add_argument("--dir", help="existing log directory (skips generation)")
+    args = ap.parse_args()
+
+    folder = args.dir or tempfile.mkdtemp()
+    if not args.dir:
+        make_logs(folder, args.files, args.rows)
+    paths = expand_paths([folder])
+    total_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+    print(f"{len(paths)} files, {total_mb:.0f} MB, {os.cpu_count()} CPUs")
+
+    base = None
+    for w in args.workers:
+        t0 = time.perf_counter()
+        agg = aggregate_parallel(paths, w, chunk_bytes=args.chunk_mb << 20)
+        dt = time.perf_counter() - t0
+        rows = sum(agg.count(n) for n in agg.groups)
+        base = base or dt
+        print(f"workers={w:>2}: {dt:6.2f}s  {rows / dt:>12,.0f} rows/s  {total_mb / dt:6.1f} MB/s  speed-up {base / dt:4.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# bench_metrics.py
+# Cost of the live metrics registry (metrics.py):
+#   1. MetricsRegistry.observe per call, single thread
+#   2. 32 threads observing at once: per-thread shards vs one shared shard
+#      behind a lock; both must count every call exactly
+#   3. track(shared=True) overhead per call with and without a registry
+#   4. live budget alert: a 2 s call with a budget it crosses at ~1 s is
+#      flagged while it runs, not when it returns
+# Usage:
+#   python bench_metrics.py --calls 200000 --threads 32
+
+import argparse, os, tempfile, threading, time, types
+import tracker
+from metrics import MetricsRegistry
+from cw_bench import cpu_burn
+
+class LockedRegistry(MetricsRegistry):
+    """Baseline: every thread writes one shared shard under a global lock."""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self._local = types.SimpleNamespace()   # one shard dict for all threads
+        self._obs_lock = threading.Lock()
+
+    def observe(self, *args, **kwargs):
+        with self._obs_lock:
+            MetricsRegistry.observe(self, *args, **kwargs)
+
+def per_call_ns(fn, calls):
+    t0 = time.perf_counter()
+    for i in range(calls):
+        fn("bench", 12.5 + (i & 63), 3.2e-7)
+    return (time.perf_counter() - t0) / calls * 1e9
+
+def contention(reg, threads, calls):
+    start = threading.Barrier(threads + 1)
+
+    def worker():
+        obs = reg.observe
+        start.wait()
+        for i in range(calls):
+            obs("bench", 12.5 + (i & 63), 3.2e-7)
+
+    ts = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in ts:
+        t.join()
+    secs = time.perf_counter() - t0
+    return secs / (threads * calls) * 1e9, reg.snapshot()["bench"]["calls"]
+
+def noop():
+    return None
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=200_000, help="single-thread observe() calls")
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--per-thread", dest="per_thread", type=int, default=20_000)
+    ap.add_argument("--tracked", type=int, default=50_000, help="track(shared=True) calls per mode")
+    args = ap.parse_args()
+
+    reg = MetricsRegistry()
+    per_call_ns(reg.observe, 1000)   # warm the shard
+    print("| observe() | ns/call |")
+    print("|---|---:|")
+    print(f"| sharded, 1 thread | {per_call_ns(reg.observe, args.calls):.0f} |")
+    locked = LockedRegistry()
+    print(f"| global lock, 1 thread | {per_call_ns(locked.observe, args.calls):.0f} |")
+
+    print(f"\n| {args.threads} threads x {args.per_thread} | ns/call (wall / total calls) | counted | expected |")
+    print("|---|---:|---:|---:|")
+    want = args.threads * args.per_thread
+    for name, r in (("sharded", MetricsRegistry()), ("global lock", LockedRegistry())):
+        ns, got = contention(r, args.threads, args.per_thread)
+        print(f"| {name} | {ns:.0f} | {got:.0f} | {want} |")
+
+    tracker.LOG_PATH = os.path.join(tempfile.mkdtemp(), "bench_log.jsonl")
+    tracker.start_session(measure_secs=0.5, energy_backend="fake")
+    plain = tracker.track("bench", shared=True, sample_every=1_000_000)(noop)   # records ~never: isolate begin/end
+    for _ in range(1000):
+        plain()
+    t0 = time.perf_counter()
+    for _ in range(args.tracked):
+        plain()
+    base = (time.perf_counter() - t0) / args.tracked * 1e9
+    tracker.set_metrics(MetricsRegistry())
+    t0 = time.perf_counter()
+    for _ in range(args.tracked):
+        plain()
+    with_m = (time.perf_counter() - t0) / args.tracked * 1e9
+    print(f"\ntrack(shared=True) per call: {base:.0f} ns without metrics, {with_m:.0f} ns with (+{with_m - base:.0f} ns)")
+    tracker.stop_session()
+
+    # live alert: cputdp charges ~TDP W per busy CPU second
+    tracker.start_session(measure_secs=0.1, energy_backend="cputdp")
+    reg = MetricsRegistry(poll_secs=0.05)
+    tracker.set_metrics(reg)
+    alerts = []
+    reg.on_alert(lambda a: alerts.append((time.perf_counter(), a)))
+    tdp = float(os.environ.get("CARBONWISE_CPU_TDP_W", "85"))
+    burn_s = 2.0
+    budget_wh = tdp * burn_s / 3600.0 / 2   # crossed half-way through
+    job = tracker.track("budgeted", shared=True, carbon_budget_wh=budget_wh)(cpu_burn)
+    t0 = time.perf_counter()
+    job(burn_s)
+    t_end = time.perf_counter() - t0
+    tracker.set_metrics(None)
+    tracker.stop_session()
+    print(f"\nbudget {budget_wh * 1000:.2f} mWh on a {burn_s:g} s call (returned after {t_end:.2f} s):")
+    for t, a in alerts:
+        print(f"  {a['level']:<8} at {t - t0:.2f} s, {a['energy_wh'] * 1000:.2f} mWh so far")
+    if not alerts or alerts[-1][1]["level"] != "exceeded" or alerts[-1][0] - t0 >= t_end:
+        raise SystemExit("no live 'exceeded' alert before the call returned")
+
+if __name__ == "__main__":
+    main()
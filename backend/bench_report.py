@@ -0,0 +1,62 @@
+# bench_report.py
+# Pure-Python per-group summaries (statistics + sorted lists) vs the NumPy
+# summary engine on synthetic rows.
+# Usage:
+#   python bench_report.py --rows 2000000 --runs 20
+
+import argparse, statistics, time
+import numpy as np
+from aggregate import METRICS
+from summary_engine import summarize_arrays, PERCENTILES
+
+def python_summary(rows):
+    """The list-per-metric approach, extended with percentiles and stdev."""
+    groups = {}
+    for r in rows:
+        groups.setdefault(r["run_name"], []).append(r)
+    out = {}
+    for name, rs in groups.items():
+        stats = {}
+        for m in METRICS:
+            vals = sorted(r[m] for r in rs)
+            n = len(vals)
+            pcts = []
+            for p in PERCENTILES:
+                pos = p / 100.0 * (n - 1)
+                lo = int(pos)
+                hi = min(lo + 1, n - 1)
+                pcts.append(vals[lo] + (vals[hi] - vals[lo]) * (pos - lo))
+            stats[m] = (statistics.mean(vals), statistics.stdev(vals) if n > 1 else 0.0, pcts)
+        out[name] = stats
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--bootstrap", type=int, default=1000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, args.runs, args.rows)
+    X = rng.lognormal(size=(args.rows, len(METRICS)))
+    names = [f"run{i}" for i in range(args.runs)]
+
+    t0 = time.perf_counter()
+    summarize_arrays(names, codes, X, n_boot=0)
+    t_np = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    summarize_arrays(names, codes, X, n_boot=args.bootstrap)
+    t_np_boot = time.perf_counter() - t0
+    print(f"numpy engine   : {t_np:.2f}s ({args.rows / t_np:,.0f} rows/s)")
+    print(f"numpy + {args.bootstrap} bootstrap: {t_np_boot:.2f}s")
+
+    rows = [{"run_name": names[c], **dict(zip(METRICS, x))} for c, x in zip(codes.tolist(), X.tolist())]
+    t0 = time.perf_counter()
+    python_summary(rows)
+    t_py = time.perf_counter() - t0
+    print(f"pure python    : {t_py:.2f}s ({args.rows / t_py:,.0f} rows/s)")
+    print(f"speed-up (no bootstrap): {t_py / t_np:.1f}x")
+
+if __name__ == "__main__":
+    main()
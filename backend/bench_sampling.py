@@ -0,0 +1,76 @@
+# bench_sampling.py
+# Tracker overhead at high QPS: a cheap request handler wrapped with
+# track(shared=True) unsampled, 1-in-N, reservoir and the adaptive overhead
+# budget. Reports overhead % of request CPU time and checks that weighted
+# totals from the sampled log match the number of calls made.
+# Unsampled calls still pay the session's begin/end; a budget below that
+# fixed cost cannot be met and the controller reports its estimate instead.
+# Usage:
+#   python bench_sampling.py --calls 20000 --work-us 1000 --budget 1
+
+import argparse, json, os, tempfile, time
+import tracker
+from tracker import track
+from aggregate import StreamingAggregator
+
+def busy(us: float) -> None:
+    end = time.thread_time() + us / 1e6
+    while time.thread_time() < end:
+        pass
+
+def run(label, kw, calls, work_us, log):
+    tracker.LOG_PATH = log
+    handler = track(label, shared=True, meta={"region": "eu-west-1"}, **kw)(busy)
+    tracker.start_session()   # CodeCarbon start-up is not per-request overhead
+    t0 = time.thread_time()
+    for _ in range(calls):
+        handler(work_us)
+    cpu = time.thread_time() - t0
+    tracker.stop_session()
+    tracker.set_sink(None)
+    if handler.reservoir is not None:
+        handler.reservoir.flush()
+    if handler.sampler is not None and handler.sampler.overhead_pct is not None:
+        print(f"{'':>18}controller: N={handler.sampler.every}, estimated overhead {handler.sampler.overhead_pct:.2f}%")
+    return cpu
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=20_000)
+    ap.add_argument("--work-us", dest="work_us", type=float, default=1000.0, help="CPU per request")
+    ap.add_argument("--every", type=int, default=100)
+    ap.add_argument("--reservoir", type=int, default=50, help="k per 1s window")
+    ap.add_argument("--budget", type=float, default=1.0, help="overhead budget, %% of request CPU")
+    args = ap.parse_args()
+
+    folder = tempfile.mkdtemp()
+    work = args.calls * args.work_us / 1e6
+    configs = [
+        ("unsampled", {}),
+        (f"1-in-{args.every}", {"sample_every": args.every}),
+        (f"reservoir-{args.reservoir}/s", {"sample_reservoir": (args.reservoir, 1.0)}),
+        (f"budget-{args.budget:g}%", {"overhead_budget_pct": args.budget}),
+    ]
+    calls = max(1000, args.calls // 10)
+    t0 = time.thread_time()
+    for _ in range(calls):
+        busy(args.work_us)
+    cpu_bare = (time.thread_time() - t0) / calls
+    print(f"{args.calls:,} calls x {args.work_us:g} us CPU ({work:.1f}s of work); bare call {cpu_bare * 1e6:.1f} us")
+
+    for label, kw in configs:
+        log = os.path.join(folder, f"{label.replace('/', '_')}.jsonl")
+        cpu = run(label, kw, args.calls, args.work_us, log)
+        rows = 0
+        agg = StreamingAggregator(("latency_ms",))
+        with open(log, encoding="utf-8") as f:
+            for line in f:
+                rows += 1
+                agg.add(json.loads(line))
+        overhead = 100.0 * (cpu / args.calls - cpu_bare) / cpu_bare
+        est = agg.count(label)
+        print(f"{label:>16}: overhead {overhead:6.2f}%  rows {rows:>8,}  weighted calls {est:>10,.0f} "
+              f"({100.0 * (est - args.calls) / args.calls:+.2f}%)")
+
+if __name__ == "__main__":
+    main()
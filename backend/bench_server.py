@@ -0,0 +1,85 @@
+# bench_server.py
+# Concurrent-client load test for cw_server.py: keep-alive clients poll the
+# endpoints with If-None-Match like a dashboard refresh; reports p50/p99
+# latency, throughput and bytes per response.
+# Usage:
+#   python bench_server.py --clients 32 --requests 200 --rows 200000
+
+import argparse, http.client, json, os, random, tempfile, threading, time
+from cw_server import make_server
+
+PATHS = ["/summary", "/runs/baseline?limit=50", "/timeseries?run=baseline&window=1h", "/regions?current=eu-west-1&energy_kwh=0.9"]
+
+def make_log(path, rows):
+    rnd = random.Random(0)
+    t0 = 1762560000  # 2025-11-08
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            ts = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t0 + i * 5))
+            f.write(json.dumps({"run_name": rnd.choice(["baseline", "optimized"]), "ts": ts,
+                                "energy_kwh": rnd.random() * 1e-4, "co2e_kg": rnd.random() * 3e-5,
+                                "latency_ms": rnd.lognormvariate(5, 1), "sci_wh_per_req": 0.01, "cost_eur": 1e-5}) + "\n")
+
+def client(port, n, lat, sizes, statuses):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    etags = {}
+    for i in range(n):
+        path = PATHS[i % len(PATHS)]
+        headers = {"Accept-Encoding": "gzip"}
+        if path in etags:
+            headers["If-None-Match"] = etags[path]
+        t0 = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        resp = conn.getresponse()
+        body = resp.read()
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        sizes.append(len(body))
+        statuses.append(resp.status)
+        if resp.getheader("ETag"):
+            etags[path] = resp.getheader("ETag")
+    conn.close()
+
+def pct(vals, q):
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=200, help="per client")
+    ap.add_argument("--rows", type=int, default=200000)
+    ap.add_argument("--log", help="existing log (skips generation)")
+    args = ap.parse_args()
+
+    log = args.log
+    if not log:
+        log = os.path.join(tempfile.mkdtemp(), "run_log.jsonl")
+        make_log(log, args.rows)
+    srv = make_server(log, port=0)
+    port = srv.server_address[1]
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    t0 = time.perf_counter()
+    for p in PATHS:  # cold build, reported separately
+        c = http.client.HTTPConnection("127.0.0.1", port)
+        c.request("GET", p)
+        c.getresponse().read()
+        c.close()
+    print(f"log: {os.path.getsize(log) / 1e6:.1f} MB, cold build of all endpoints: {time.perf_counter() - t0:.2f}s")
+
+    lat, sizes, statuses = [], [], []
+    threads = [threading.Thread(target=client, args=(port, args.requests, lat, sizes, statuses)) for _ in range(args.clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    dt = time.perf_counter() - t0
+    srv.shutdown()
+    n = len(lat)
+    print(f"{args.clients} clients x {args.requests} requests: {n / dt:,.0f} req/s")
+    print(f"latency p50 {pct(lat, 0.5):.2f} ms, p99 {pct(lat, 0.99):.2f} ms, max {max(lat):.2f} ms")
+    print(f"304s: {statuses.count(304)}/{n}, mean bytes/response {sum(sizes) / n:,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# bench_sink.py
+# Records/s of the default per-record append vs BufferedJsonlSink, plus a
+# multi-process append check (every line must parse).
+# Usage:
+#   python bench_sink.py --records 100000 --procs 4
+
+import argparse, json, os, tempfile, time
+from multiprocessing import Process
+import tracker
+from sinks import BufferedJsonlSink
+
+def sample_record(i):
+    return tracker._build_record(
+        "bench", 1, {"notes": "bench"}, {"schema_version": tracker.SCHEMA_VERSION},
+        1e-6 * i, 2.75e-7 * i, 0.5, None, 275.0,
+    )
+
+def run_default(path, n):
+    tracker.LOG_PATH = path
+    tracker.set_sink(None)
+    t0 = time.perf_counter()
+    for i in range(n):
+        tracker._write_record(sample_record(i))
+    return time.perf_counter() - t0
+
+def run_buffered(path, n):
+    sink = BufferedJsonlSink(path, max_records=2000, max_delay_secs=0.2)
+    tracker.set_sink(sink)
+    t0 = time.perf_counter()
+    for i in range(n):
+        tracker._write_record(sample_record(i))
+    t_call = time.perf_counter() - t0
+    tracker.set_sink(None)  # closes and drains
+    return t_call, time.perf_counter() - t0
+
+def _writer(path, n):
+    run_buffered(path, n)
+
+def check_lines(path, expected):
+    n = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            json.loads(line)
+            n += 1
+    return n == expected, n
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, default=100000)
+    ap.add_argument("--procs", type=int, default=4)
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp()
+    n = args.records
+
+    # Cost of building records alone, so both paths are compared on the sink part.
+    t0 = time.perf_counter()
+    for i in range(n):
+        sample_record(i)
+    t_build = time.perf_counter() - t0
+
+    t_def = run_default(os.path.join(tmp, "default.jsonl"), n)
+    t_call, t_total = run_buffered(os.path.join(tmp, "buffered.jsonl"), n)
+    print(f"records: {n} (build only: {n / t_build:,.0f} rec/s)")
+    print(f"default append : {n / t_def:,.0f} rec/s")
+    print(f"buffered (call): {n / t_call:,.0f} rec/s")
+    print(f"buffered (drained): {n / t_total:,.0f} rec/s")
+
+    if args.procs > 1:
+        path = os.path.join(tmp, "shared.jsonl")
+        per = n // args.procs
+        procs = [Process(target=_writer, args=(path, per)) for _ in range(args.procs)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        ok, got = check_lines(path, per * args.procs)
+        print(f"{args.procs} processes -> {got} lines, all whole: {'yes' if ok else 'NO'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# bench_tracker.py
+# Decorator overhead of track(shared=True) at fixed request rates.
+# Usage:
+#   python bench_tracker.py --rates 1000 10000 100000 --secs 2
+
+import argparse, os, tempfile, time, statistics
+import tracker
+from tracker import track
+
+def noop():
+    return None
+
+def paced(fn, rate, secs):
+    """Call fn at `rate` calls/s for `secs`; return per-call latencies (µs) and achieved rate."""
+    n = int(rate * secs)
+    lat = []
+    start = time.perf_counter()
+    for i in range(n):
+        due = start + i / rate
+        while time.perf_counter() < due:
+            pass
+        t0 = time.perf_counter()
+        fn()
+        lat.append((time.perf_counter() - t0) * 1e6)
+    return lat, n / (time.perf_counter() - start)
+
+def pct(vals, q):
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rates", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--secs", type=float, default=2.0)
+    ap.add_argument("--percall", type=int, default=5, help="calls for the legacy per-call tracker (0 to skip)")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    tracker.LOG_PATH = os.path.join(tmp, "bench_log.jsonl")
+    tracker.start_session(measure_secs=0.5)
+    wrapped = track(run_name="bench", shared=True)(noop)
+
+    print("| mode | target/s | achieved/s | overhead mean µs | p50 µs | p99 µs |")
+    print("|---|---:|---:|---:|---:|---:|")
+    for rate in args.rates:
+        bare, _ = paced(noop, rate, args.secs)
+        lat, achieved = paced(wrapped, rate, args.secs)
+        base = statistics.mean(bare)
+        print(f"| shared | {rate} | {achieved:.0f} | {statistics.mean(lat) - base:.2f} | "
+              f"{pct(lat, 0.5) - base:.2f} | {pct(lat, 0.99) - base:.2f} |")
+
+    if args.percall:
+        legacy = track(run_name="bench_percall", measure_secs=0.5)(noop)
+        lat = []
+        for _ in range(args.percall):
+            t0 = time.perf_counter()
+            legacy()
+            lat.append((time.perf_counter() - t0) * 1e6)
+        print(f"| per-call | - | {1e6 / statistics.mean(lat):.1f} | {statistics.mean(lat):.0f} | "
+              f"{pct(lat, 0.5):.0f} | {pct(lat, 0.99):.0f} |")
+    tracker.stop_session()
+
+if __name__ == "__main__":
+    main()
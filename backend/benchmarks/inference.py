@@ -0,0 +1,22 @@
+# benchmarks/inference.py
+# Simulated batch inference (what the old baseline / optimized example scripts
+# used to run): a fixed amount of CPU work per request, scaled by the config's
+# precision and by speculative decoding (fewer target-model passes).
+# Run with:  python cw_bench.py -k inference
+
+from cw_bench import benchmark, cpu_work
+
+REQUESTS = 30
+ITERATIONS_PER_REQUEST = 50_000
+PRECISION_COST = {"fp32": 1.6, "fp16": 1.0, "bf16": 1.0, "int8": 0.8, "int4": 0.7}
+SPEC_DECODE_COST = 0.85
+
+@benchmark(requests=REQUESTS, configs={
+    "baseline":  {"precision": "fp16", "quant": None, "spec_decode": False, "region": "eu-west-1"},
+    "int8":      {"precision": "int8", "quant": "int8", "spec_decode": False, "region": "eu-west-1"},
+    "optimized": {"precision": "int4", "quant": "int4", "spec_decode": True, "region": "europe-west9"},
+})
+def inference(cfg):
+    cost = PRECISION_COST[cfg["precision"]] * (SPEC_DECODE_COST if cfg["spec_decode"] else 1.0)
+    for _ in range(REQUESTS):
+        cpu_work(ITERATIONS_PER_REQUEST * cost)
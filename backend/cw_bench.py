@@ -0,0 +1,354 @@
+# cw_bench.py
+# Benchmark runner: discovers benchmark definitions (benchmarks/*.py), runs
+# warm-up and interleaved, repeated trials of every configuration, records
+# each trial through track() with host and git fingerprints, and writes a
+# pairs file so cw_quality_gate.py can gate the results directly.
+#
+#   # benchmarks/inference.py
+#   from cw_bench import benchmark, cpu_work
+#   @benchmark(requests=30, configs={
+#       "baseline":  {"precision": "fp16", "quant": None, "spec_decode": False},
+#       "optimized": {"precision": "int4", "quant": "int4", "spec_decode": True}})
+#   def inference(cfg):
+#       ...
+#
+# Trials are recorded as run_name "<benchmark>/<config>[@tag]"; the first
+# config is the baseline the others are compared with. --tag/--against
+# compare the same configs across commits (run once per checkout into the
+# same log). For stable numbers the process is pinned to one CPU, GC is
+# collected before and disabled during each trial, and configs run in a
+# shuffled order each round so drift (thermal, noisy neighbours) hits all
+# of them alike. The summary prints each comparison's minimum detectable
+# effect and the trials needed to resolve --detect percent.
+# Usage:
+#   python cw_bench.py --trials 30 --warmup 3 --log bench_log.jsonl --gate
+#   python cw_bench.py -k inference --tag main         # on main
+#   python cw_bench.py -k inference --tag pr --against main --gate
+
+import argparse, gc, glob, hashlib, importlib.util, json, math, os, platform, random, socket, subprocess, sys, time, uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(HERE, "benchmarks")
+
+# ---------------------------------------------------------------------------
+# Definitions
+
+class Benchmark:
+    __slots__ = ("name", "fn", "configs", "requests", "source")
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any], configs: Dict[str, Dict[str, Any]],
+                 requests: int, source: str):
+        self.name, self.fn, self.configs, self.requests, self.source = name, fn, configs, requests, source
+
+    @property
+    def baseline(self) -> str:
+        return next(iter(self.configs))
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+def benchmark(name: Optional[str] = None, *, configs: Dict[str, Dict[str, Any]], requests: int = 1) -> Callable:
+    """
+    Register `fn(cfg)` as one trial of a benchmark. `configs` maps config
+    names to meta dicts (precision, quant, spec_decode, region, ...); the
+    first one is the baseline. `requests` is the functional unit for SCI.
+    """
+    if not configs:
+        raise ValueError("a benchmark needs at least one config")
+
+    def deco(fn: Callable) -> Callable:
+        bname = name or fn.__name__
+        if bname in BENCHMARKS and BENCHMARKS[bname].fn is not fn:
+            raise ValueError(f"benchmark {bname!r} defined twice")
+        BENCHMARKS[bname] = Benchmark(bname, fn, dict(configs), requests, getattr(fn, "__module__", "?"))
+        return fn
+    return deco
+
+def cpu_burn(seconds: float):
+    # simple CPU loop so CodeCarbon sees real power draw
+    t_end = time.perf_counter() + seconds
+    x = 0.0
+    while time.perf_counter() < t_end:
+        # a few math ops per loop
+        x = (x + 1.234567) * 1.000001
+        x = math.sin(x) * math.cos(x)
+
+def cpu_work(iterations: int) -> float:
+    """A fixed amount of CPU work (unlike cpu_burn, which fills a fixed time), so speed changes show up."""
+    x = 0.0
+    for _ in range(int(iterations)):
+        x = (x + 1.234567) * 1.000001
+        x = math.sin(x) * math.cos(x)
+    return x
+
+def discover(paths: List[str]) -> Dict[str, Benchmark]:
+    """Import every benchmark module under `paths` (files or directories; skips _*.py)."""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files += sorted(f for f in glob.glob(os.path.join(p, "*.py")) if not os.path.basename(f).startswith("_"))
+        else:
+            files.append(p)
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    sys.modules.setdefault("cw_bench", sys.modules[__name__])   # definitions register here even under __main__
+    for f in files:
+        mod_name = "cw_benchmarks_" + os.path.splitext(os.path.basename(f))[0]
+        spec = importlib.util.spec_from_file_location(mod_name, f)
+        mod = importlib.util.module_from_spec(spec)
+        sys.modules[mod_name] = mod
+        spec.loader.exec_module(mod)
+    return BENCHMARKS
+
+# ---------------------------------------------------------------------------
+# Fingerprints and isolation
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def host_fingerprint(cpu: Optional[int] = None) -> Dict[str, Any]:
+    """What makes numbers from two hosts incomparable; host_id hashes it."""
+    model = None
+    for line in (_read("/proc/cpuinfo") or "").splitlines():
+        if line.startswith("model name"):
+            model = line.split(":", 1)[1].strip()
+            break
+    mem = None
+    for line in (_read("/proc/meminfo") or "").splitlines():
+        if line.startswith("MemTotal:"):
+            mem = int(line.split()[1])
+            break
+    probe = cpu if cpu is not None else 0
+    host = {
+        "hostname": socket.gethostname(),
+        "cpu_model": model or platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "mem_kb": mem,
+        "kernel": platform.release(),
+        "python": f"{platform.python_implementation()} {platform.python_version()}",
+        "governor": _read(f"/sys/devices/system/cpu/cpu{probe}/cpufreq/scaling_governor"),
+        "pinned_cpu": cpu,
+    }
+    host["host_id"] = hashlib.sha1(json.dumps(host, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return host
+
+def git_fingerprint(cwd: str = HERE) -> Dict[str, Any]:
+    def git(*args):
+        try:
+            r = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, timeout=10)
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return r.stdout.strip() if r.returncode == 0 else None
+    sha = git("rev-parse", "--short=12", "HEAD")
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"git_sha": sha or "unknown", "git_dirty": bool(status) if status is not None else None}
+
+def pin_cpu(cpu: Optional[int]) -> Optional[int]:
+    """Pin this process to `cpu` (default: the last allowed CPU when there are several)."""
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+    allowed = sorted(os.sched_getaffinity(0))
+    if cpu is None:
+        if len(allowed) < 2:
+            return None
+        cpu = allowed[-1]
+    os.sched_setaffinity(0, {cpu})
+    return cpu
+
+# ---------------------------------------------------------------------------
+# Running
+
+def run_name(bench: str, config: str, tag: Optional[str] = None) -> str:
+    return f"{bench}/{config}" + (f"@{tag}" if tag else "")
+
+def run_suite(benches: List[Benchmark], trials: int, warmup: int, tag: Optional[str], base_meta: Dict[str, Any],
+              seed: int, energy_backend: Optional[str] = None, max_trials: Optional[int] = None,
+              enough: Optional[Callable[[Benchmark, Dict[str, List[float]]], bool]] = None,
+              progress: bool = True) -> Dict[str, int]:
+    """
+    Run every benchmark; returns trials run per benchmark. After `trials`
+    rounds, rounds continue up to `max_trials` until enough(bench, wall ms
+    per run name) says the comparisons are resolved.
+    """
+    import tracker
+    tracker.start_session(measure_secs=0.5, energy_backend=energy_backend)
+    rnd = random.Random(seed)
+    done: Dict[str, int] = {}
+    for b in benches:
+        tracked = {}
+        for cname, cfg in b.configs.items():
+            meta = {**cfg, **base_meta, "bench": b.name, "config": cname}
+            if tag:
+                meta["tag"] = tag
+            tracked[cname] = tracker.track(run_name(b.name, cname, tag), requests=b.requests, meta=meta,
+                                           shared=True)(b.fn)
+        for cname, cfg in b.configs.items():
+            for _ in range(warmup):
+                b.fn(dict(cfg))
+        order = list(b.configs)
+        wall: Dict[str, List[float]] = {run_name(b.name, c, tag): [] for c in order}
+        limit = max(trials, max_trials or trials)
+        for i in range(limit):
+            rnd.shuffle(order)   # interleaved: slow drift is spread over every config
+            for cname in order:
+                gc.collect()
+                gc.disable()
+                try:
+                    t0 = time.perf_counter()
+                    tracked[cname](dict(b.configs[cname]))
+                    wall[run_name(b.name, cname, tag)].append((time.perf_counter() - t0) * 1e3)
+                finally:
+                    gc.enable()
+            if progress:
+                print(f"\r{b.name}: trial {i + 1}/{trials if i < trials else limit}", end="", file=sys.stderr, flush=True)
+            if i + 1 >= trials and (enough is None or enough(b, wall)):
+                break
+        done[b.name] = i + 1
+        if progress:
+            print(file=sys.stderr)
+    tracker.stop_session()
+    return done
+
+# ---------------------------------------------------------------------------
+# Comparing
+
+SUMMARY_METRICS = ("latency_ms", "energy_kwh")
+
+def load_groups(log: str, names: List[str]) -> Dict[str, Dict[str, List[float]]]:
+    from runstore import iter_records
+    want = set(names)
+    out: Dict[str, Dict[str, List[float]]] = {n: {m: [] for m in SUMMARY_METRICS} for n in names}
+    for r in iter_records(log, ["run_name", "kind", *SUMMARY_METRICS]):
+        if r.get("kind") == "span" or r.get("run_name") not in want:
+            continue
+        for m in SUMMARY_METRICS:
+            if r.get(m) is not None:
+                out[r["run_name"]][m].append(float(r[m]))
+    return out
+
+def compare(a: List[float], b: List[float]) -> Optional[Dict[str, float]]:
+    """Mean difference of b vs a in %, its 95% CI half-width and the minimum detectable effect (80% power)."""
+    if len(a) < 2 or len(b) < 2:
+        return None
+    ma, mb = sum(a) / len(a), sum(b) / len(b)
+    va = sum((x - ma) ** 2 for x in a) / (len(a) - 1)
+    vb = sum((x - mb) ** 2 for x in b) / (len(b) - 1)
+    if ma <= 0:
+        return None
+    se = math.sqrt(va / len(a) + vb / len(b)) / ma * 100.0
+    return {"diff_pct": 100.0 * (mb - ma) / ma, "ci95_pct": 1.96 * se, "mde_pct": 2.80 * se,
+            "cv_pct": 100.0 * math.sqrt(va) / ma, "n": min(len(a), len(b))}
+
+def print_summary(pairs: List[Tuple[str, str]], groups: Dict[str, Dict[str, List[float]]], detect: float) -> None:
+    print(f"\n| baseline | candidate | metric | n | diff % | ±95% | MDE % | trials for {detect:g}% |")
+    print("|---|---|---|---:|---:|---:|---:|---:|")
+    for base, cand in pairs:
+        for m in SUMMARY_METRICS:
+            c = compare(groups[base][m], groups[cand][m])
+            if c is None:
+                print(f"| {base} | {cand} | {m} | - | - | - | - | - |")
+                continue
+            need = math.ceil(c["n"] * (c["mde_pct"] / detect) ** 2) if c["mde_pct"] > 0 else c["n"]
+            print(f"| {base} | {cand} | {m} | {c['n']} | {c['diff_pct']:+.2f} | {c['ci95_pct']:.2f} | "
+                  f"{c['mde_pct']:.2f} | {max(need, 2)} |")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="*", default=[BENCH_DIR], help="benchmark files or directories (default benchmarks/)")
+    ap.add_argument("-k", dest="select", action="append", help="only benchmarks whose name contains this (repeatable)")
+    ap.add_argument("--list", action="store_true", help="list benchmarks and configs, then exit")
+    ap.add_argument("--trials", type=int, default=30, help="recorded trials per config")
+    ap.add_argument("--max-trials", dest="max_trials", type=int,
+                    help="keep adding trials (up to this many) until every comparison resolves --detect")
+    ap.add_argument("--warmup", type=int, default=3, help="untracked warm-up calls per config")
+    ap.add_argument("--cpu", type=int, help="CPU to pin to (default: the last allowed one)")
+    ap.add_argument("--no-pin", dest="pin", action="store_false")
+    ap.add_argument("--seed", type=int, default=0, help="seed for the per-round config order")
+    ap.add_argument("--log", default="bench_log.jsonl", help="run log to append trials to")
+    ap.add_argument("--tag", help="suffix run names with @TAG (e.g. a branch) to compare across checkouts")
+    ap.add_argument("--against", help="compare each config with the same config @AGAINST already in the log")
+    ap.add_argument("--energy-backend", dest="energy_backend", help="energy backend (default: auto)")
+    ap.add_argument("--pairs-out", dest="pairs_out", help="pairs file for cw_quality_gate (default <log>.pairs)")
+    ap.add_argument("--detect", type=float, default=2.0, help="regression size (%) the trial count should resolve")
+    ap.add_argument("--gate", action="store_true", help="run cw_quality_gate.py on the result and exit with its status")
+    args = ap.parse_args()
+    if args.trials < 1:
+        ap.error("--trials must be at least 1")
+
+    benches = list(discover(args.paths).values())
+    if args.select:
+        benches = [b for b in benches if any(s in b.name for s in args.select)]
+    if not benches:
+        raise SystemExit("no benchmarks found")
+    if args.list:
+        for b in benches:
+            print(f"{b.name} ({b.source}, {b.requests} requests/trial): " +
+                  ", ".join(f"{c}{' [baseline]' if c == b.baseline else ''}" for c in b.configs))
+        return
+
+    cpu = pin_cpu(args.cpu) if args.pin else None
+    host, git = host_fingerprint(cpu), git_fingerprint()
+    print(f"host {host['host_id']}: {host['cpu_model']}, {host['cpus']} CPUs, pinned to {cpu}, "
+          f"governor {host['governor'] or 'n/a'}; git {git['git_sha']}{' (dirty)' if git['git_dirty'] else ''}")
+    if host["governor"] not in (None, "performance"):
+        print(f"note: CPU governor is {host['governor']!r}; 'performance' gives steadier numbers", file=sys.stderr)
+
+    import tracker
+    from sinks import JsonlSink
+    tracker.set_sink(JsonlSink(args.log))
+    base_meta = {"host_id": host["host_id"], "cpu_model": host["cpu_model"], **git,
+                 "bench_run": uuid.uuid4().hex[:12]}
+    pairs: Dict[str, List[Tuple[str, str]]] = {}
+    for b in benches:
+        for cname in b.configs:
+            if args.against:
+                pair = (run_name(b.name, cname, args.against), run_name(b.name, cname, args.tag))
+            elif cname != b.baseline:
+                pair = (run_name(b.name, b.baseline, args.tag), run_name(b.name, cname, args.tag))
+            else:
+                continue
+            pairs.setdefault(b.name, []).append(pair)
+    earlier = {}
+    if args.against and os.path.exists(args.log):
+        earlier = load_groups(args.log, [p[0] for ps in pairs.values() for p in ps])
+
+    def enough(b: Benchmark, wall: Dict[str, List[float]]) -> bool:
+        """Every comparison's latency MDE is within --detect (baselines from the log with --against)."""
+        for base, cand in pairs.get(b.name, ()):
+            c = compare(earlier[base]["latency_ms"] if base in earlier else wall[base], wall[cand])
+            if c is None or c["mde_pct"] > args.detect:
+                return False
+        return True
+
+    t0 = time.perf_counter()
+    done = run_suite(benches, args.trials, args.warmup, args.tag, base_meta, args.seed, args.energy_backend,
+                     args.max_trials, enough)
+    tracker.set_sink(None)
+    print(f"{len(benches)} benchmark(s), {', '.join(f'{k}: {v} trials' for k, v in done.items())} "
+          f"in {time.perf_counter() - t0:.1f} s -> {args.log}")
+
+    pairs = [p for ps in pairs.values() for p in ps]
+    if not pairs:
+        return
+    groups = load_groups(args.log, sorted({n for p in pairs for n in p}))
+    print_summary(pairs, groups, args.detect)
+
+    pairs_out = args.pairs_out or args.log + ".pairs"
+    with open(pairs_out, "w", encoding="utf-8") as f:
+        f.write("# baseline candidate  (written by cw_bench.py)\n")
+        for base, cand in pairs:
+            f.write(f"{base} {cand}\n")
+    limit = f"{args.detect:g}"
+    gate = [sys.executable, os.path.join(HERE, "cw_quality_gate.py"), args.log, "--mode", "dist",
+            "--pairs-file", pairs_out, "--check", f"latency_ms:p50:{limit}", "--check", f"energy_kwh:p50:{limit}",
+            "--min_n", str(min(args.trials, 20))]
+    print("\nquality gate: " + " ".join(gate[1:]))
+    if args.gate:
+        sys.exit(subprocess.run(gate).returncode)
+
+if __name__ == "__main__":
+    main()
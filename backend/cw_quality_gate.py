@@ -1,39 +1,149 @@
 # cw_quality_gate.py
 # Usage:
 #   python cw_quality_gate.py run_log.jsonl --baseline baseline --optimized optimized --max_latency_regress 5 --max_sci_regress 5
+#   python cw_quality_gate.py run_log.jsonl --mode dist --check latency_ms:p95:3 --check energy_kwh:p50:2 \
+#       --pair baseline:optimized --pairs-file pairs.txt --test mannwhitney --min_n 30 --json gate.json
 
-import json, argparse, statistics, sys
+import json, argparse, sys
+from runstore import iter_records
+from aggregate import StreamingAggregator
 
-def load_jsonl(p):
-    rows = []
-    with open(p, "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                rows.append(json.loads(line))
-    return rows
+GATE_COLUMNS = ["run_name", "sample_weight", "kind", "latency_ms", "sci_wh_per_req"]
 
-def mean(vals): return statistics.mean(vals) if vals else 0.0
+def parse_check(spec):
+    """'latency_ms:p95:3' -> ('latency_ms', 95.0, 3.0)"""
+    try:
+        metric, q, limit = spec.split(":")
+        return metric, float(q.lstrip("pP")), float(limit)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad check {spec!r}, expected metric:pNN:max_regress_pct")
+
+def read_pairs(args):
+    pairs = [tuple(p.split(":", 1)) for p in args.pair]
+    if args.pairs_file:
+        with open(args.pairs_file, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.replace(":", " ").split()
+                if len(parts) == 2 and not line.lstrip().startswith("#"):
+                    pairs.append((parts[0], parts[1]))
+    return pairs or [(args.baseline, args.optimized)]
+
+def dist_gate(args):
+    """
+    Compare full distributions per (baseline, candidate) pair. A check fails
+    only if its percentile regresses past the limit AND the one-sided test
+    says the candidate is significantly worse (p < alpha); groups smaller
+    than --min_n are reported as insufficient. Sampled records count by
+    their sample_weight: percentiles are weighted, the bootstrap resamples
+    records and weighs each resample, and Mann-Whitney (unweighted) refuses
+    groups whose weights vary.
+    """
+    import numpy as np
+    from summary_engine import load_columns, mann_whitney_greater, bootstrap_greater, weighted_percentile
+
+    checks = args.check or [("latency_ms", 95.0, args.max_latency_regress),
+                            ("sci_wh_per_req", 50.0, args.max_sci_regress)]
+    metrics = sorted({c[0] for c in checks})
+    names, codes, X = load_columns(args.log, (*metrics, "sample_weight"))
+    W = X[:, -1]
+    W[W <= 0] = 1.0                 # unsampled records: missing weight loads as 0.0
+    weighted = bool((W != 1.0).any())
+    order = np.argsort(codes, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(names)))))
+    index = {n: i for i, n in enumerate(names)}
+
+    def values(name, metric):
+        g = index.get(name)
+        if g is None:
+            return np.empty(0), np.empty(0)
+        rows = order[bounds[g]:bounds[g + 1]]
+        return X[rows, metrics.index(metric)], W[rows]
+
+    def pct(x, w, q):
+        return float(weighted_percentile(x, w, q)) if weighted else float(np.percentile(x, q))
+
+    results = []
+    for base, cand in read_pairs(args):
+        for metric, q, limit in checks:
+            (a, wa), (b, wb) = values(base, metric), values(cand, metric)
+            res = {"baseline": base, "candidate": cand, "metric": metric, "percentile": q,
+                   "limit_pct": limit, "n_baseline": int(len(a)), "n_candidate": int(len(b))}
+            if weighted:
+                res.update(calls_baseline=float(wa.sum()), calls_candidate=float(wb.sum()))
+            if min(len(a), len(b)) < args.min_n:
+                res.update(status="insufficient", regress_pct=None, p_value=None)
+            else:
+                qa, qb = pct(a, wa, q), pct(b, wb, q)
+                regress = 100.0 * (qb - qa) / qa if qa > 0 else 0.0
+                if args.test == "bootstrap":
+                    p = bootstrap_greater(a, b, q, n_boot=args.bootstrap,
+                                          wa=wa if weighted else None, wb=wb if weighted else None)
+                else:
+                    if weighted and (np.ptp(wa) > 0 or np.ptp(wb) > 0):
+                        raise SystemExit(f"{base} / {cand}: sample weights vary within a run, which the "
+                                         "Mann-Whitney test ignores; use --test bootstrap")
+                    p = mann_whitney_greater(a, b)
+                failed = regress > limit and p < args.alpha
+                res.update(status="fail" if failed else "pass", baseline_value=qa, candidate_value=qb,
+                           regress_pct=regress, p_value=p)
+            results.append(res)
+    return results
+
+def report_dist(args, results):
+    statuses = {r["status"] for r in results}
+    verdict = "fail" if "fail" in statuses else ("insufficient" if "insufficient" in statuses else "pass")
+    for r in results:
+        head = f"[{r['baseline']} -> {r['candidate']}] {r['metric']} p{r['percentile']:g}"
+        if r["status"] == "insufficient":
+            print(f"{head}: INSUFFICIENT (n={r['n_baseline']}/{r['n_candidate']}, need {args.min_n})")
+        else:
+            print(f"{head}: {r['regress_pct']:+.2f}% (limit {r['limit_pct']}%), "
+                  f"p={r['p_value']:.4f} [{args.test}] -> {r['status'].upper()}")
+    if args.json:
+        doc = {"verdict": verdict, "test": args.test, "alpha": args.alpha, "min_n": args.min_n, "results": results}
+        if args.json == "-":
+            print(json.dumps(doc, indent=2))
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(doc, f, indent=2)
+    if verdict == "pass":
+        print("QUALITY GATE: PASS ✅")
+        sys.exit(0)
+    print("QUALITY GATE: FAIL ❌" if verdict == "fail" else "QUALITY GATE: NOT ENOUGH SAMPLES")
+    sys.exit(1 if verdict == "fail" else 2)
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("log")
+    ap.add_argument("log", help="run log path (.jsonl, .cwcol, .parquet or a .cwseg segment)")
     ap.add_argument("--baseline", default="baseline")
     ap.add_argument("--optimized", default="optimized")
     ap.add_argument("--max_latency_regress", type=float, default=5.0, help="% allowed worse latency")
     ap.add_argument("--max_sci_regress", type=float, default=5.0, help="% allowed worse SCI")
+    ap.add_argument("--mode", choices=["mean", "dist"], default="mean",
+                    help="mean: compare means (original); dist: percentiles + significance tests")
+    ap.add_argument("--check", type=parse_check, action="append",
+                    help="dist mode: metric:pNN:max_regress_pct, repeatable (e.g. latency_ms:p95:3)")
+    ap.add_argument("--pair", action="append", default=[], help="dist mode: baseline:candidate, repeatable")
+    ap.add_argument("--pairs-file", dest="pairs_file", help="dist mode: one 'baseline candidate' pair per line")
+    ap.add_argument("--test", choices=["mannwhitney", "bootstrap"], default="mannwhitney")
+    ap.add_argument("--alpha", type=float, default=0.05, help="significance level for a regression")
+    ap.add_argument("--min_n", type=int, default=20, help="minimum runs per side")
+    ap.add_argument("--bootstrap", type=int, default=2000, help="resamples for --test bootstrap")
+    ap.add_argument("--json", help="also write machine-readable results here ('-' for stdout)")
     args = ap.parse_args()
 
-    rows = load_jsonl(args.log)
-    base = [r for r in rows if r["run_name"] == args.baseline]
-    opt  = [r for r in rows if r["run_name"] == args.optimized]
-    if not base or not opt:
+    if args.mode == "dist":
+        report_dist(args, dist_gate(args))
+
+    agg = StreamingAggregator(GATE_COLUMNS[3:], run_names=[args.baseline, args.optimized])
+    agg.add_all(iter_records(args.log, GATE_COLUMNS))
+    if not agg.count(args.baseline) or not agg.count(args.optimized):
         print("Missing baseline or optimized runs.")
         sys.exit(2)
 
-    b_lat = mean([r["latency_ms"] for r in base])
-    o_lat = mean([r["latency_ms"] for r in opt])
-    b_sci = mean([r.get("sci_wh_per_req", 0.0) for r in base])
-    o_sci = mean([r.get("sci_wh_per_req", 0.0) for r in opt])
+    base, opt = agg.means(args.baseline), agg.means(args.optimized)
+    b_lat, o_lat = base["latency_ms"], opt["latency_ms"]
+    b_sci, o_sci = base["sci_wh_per_req"], opt["sci_wh_per_req"]
 
     def regress_pct(b, o): return 100.0 * (o - b) / b if b > 0 else 0.0
     lat_regress = regress_pct(b_lat, o_lat)
@@ -1,46 +1,88 @@
 # cw_report.py
 # Usage:
 #   python cw_report.py run_log.jsonl --out report.md --pdf report.pdf
+#   (the log may also be a .cwcol or .parquet file, see runstore.py)
+#   python cw_report.py run_log.jsonl --incremental   # parse only what was appended since last run
+#   python cw_report.py logs/ "fleet/*.jsonl" --workers 16   # many logs, ingested in parallel
 
-import json, argparse, statistics, os
+import argparse
 from datetime import datetime
+from runstore import iter_records, detect_format
+from aggregate import StreamingAggregator, aggregate_incremental, aggregate_parallel, expand_paths
 
-def load_jsonl(path):
-    rows = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                rows.append(json.loads(line))
-    return rows
-
-def group_by_name(rows):
-    g = {}
-    for r in rows:
-        g.setdefault(r["run_name"], []).append(r)
-    return g
-
-def mean(vals):
-    return statistics.mean(vals) if vals else 0.0
-
-def summarize(rows):
-    return {
-        "n": len(rows),
-        "energy_kwh": mean([r["energy_kwh"] for r in rows]),
-        "co2e_kg": mean([r["co2e_kg"] for r in rows]),
-        "latency_ms": mean([r["latency_ms"] for r in rows]),
-        "sci_wh_per_req": mean([r.get("sci_wh_per_req", 0.0) for r in rows]),
-        "cost_eur": mean([r.get("cost_eur", 0.0) for r in rows]),
-    }
-
-def md_report(groups, baseline="baseline", optimized="optimized"):
-    base = summarize(groups.get(baseline, []))
-    opt = summarize(groups.get(optimized, []))
+# Only these fields are read, so columnar logs skip everything else.
+REPORT_COLUMNS = ["run_name", "sample_weight", "kind", "span_path",
+                  "energy_kwh", "co2e_kg", "latency_ms", "sci_wh_per_req", "cost_eur"]
+
+def aggregate_log(path, run_names=None):
+    """Single streaming pass; memory grows with distinct run names, not rows."""
+    return StreamingAggregator(run_names=run_names).add_all(iter_records(path, REPORT_COLUMNS))
+
+def summarize(agg, name):
+    return agg.means(name)
+
+METRIC_LABELS = {
+    "energy_kwh": "Energy (kWh)",
+    "co2e_kg": "CO₂e (kg)",
+    "latency_ms": "Latency (ms)",
+    "sci_wh_per_req": "SCI (Wh/req)",
+    "cost_eur": "Cost (€)",
+}
+
+def summarize_numpy(path, **kw):
+    """Percentiles + bootstrap CIs; None when NumPy is not installed."""
+    try:
+        from summary_engine import summarize_log
+    except ImportError:
+        return None
+    return summarize_log(path, **kw)
+
+def md_distribution(summary):
+    """Per-metric tables of mean, CI, stddev and tail percentiles for every run_name."""
+    from summary_engine import pct_label
+    labels = [pct_label(p) for p in summary.percentiles]
+    lines = ["## Distribution", ""]
+    for m in summary.metrics:
+        lines.append(f"### {METRIC_LABELS.get(m, m)}")
+        lines.append("")
+        lines.append(f"| Run | n | Mean | {summary.ci:.0%} CI | Std | " + " | ".join(labels) + " |")
+        lines.append("|---|---:|---:|---:|---:|" + "---:|" * len(labels))
+        for name in summary.names:
+            st = summary.stats(name, m)
+            pcts = " | ".join(f"{st[l]:.4g}" for l in labels)
+            lines.append(f"| {name} | {st['n']} | {st['mean']:.4g} | {st['ci_lo']:.4g} – {st['ci_hi']:.4g} | {st['std']:.4g} | {pcts} |")
+        lines.append("")
+    return lines
+
+def md_phases(agg):
+    """Per-span-path latency and energy for every run that recorded spans (see spans.py)."""
+    phases = getattr(agg, "phases", None)
+    if not phases:
+        return []
+    lines = ["## Phases", ""]
+    for name in phases.run_names():
+        run = agg.means(name)
+        run_kwh = run["energy_kwh"] * run["n"]
+        lines.append(f"### {name}")
+        lines.append("")
+        lines.append("| Phase | Spans | Mean latency (ms) | Total latency (ms) | Energy (kWh) | Share of run energy |")
+        lines.append("|---|---:|---:|---:|---:|---:|")
+        for path, st in phases.phases(name):
+            lat, kwh = st["latency_ms"], st["energy_kwh"]
+            share = f"{100.0 * kwh.total / run_kwh:.1f}%" if run_kwh > 0 else "–"
+            lines.append(f"| {path} | {lat.n:g} | {lat.mean:.2f} | {lat.total:.1f} | {kwh.total:.3g} | {share} |")
+        lines.append("")
+    return lines
+
+def md_report(agg, baseline="baseline", optimized="optimized", skipped=None):
+    base = summarize(agg, baseline)
+    opt = summarize(agg, optimized)
     def pct_drop(a, b):  # from a to b
         return 100.0 * (a - b) / a if a > 0 else 0.0
     ts = datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
     lines = []
-    lines.append(f"# CarbonWise Report")
+    lines.append("# CarbonWise Report")
     lines.append("")
     lines.append(f"_Generated: {ts}_")
     lines.append("")
@@ -54,8 +96,15 @@ def md_report(groups, baseline="baseline", optimized="optimized"):
     lines.append(f"| SCI (Wh/req) | {base['sci_wh_per_req']:.1f} | {opt['sci_wh_per_req']:.1f} | {pct_drop(base['sci_wh_per_req'], opt['sci_wh_per_req']):.1f}% |")
     lines.append(f"| Cost (€) | {base['cost_eur']:.4f} | {opt['cost_eur']:.4f} | {pct_drop(base['cost_eur'], opt['cost_eur']):.1f}% |")
     lines.append("")
+    if hasattr(agg, "percentiles"):
+        lines.extend(md_distribution(agg))
+    lines.extend(md_phases(agg))
     lines.append("## Notes")
     lines.append("- Values are means across runs with the same `run_name`.")
+    if hasattr(agg, "percentiles"):
+        lines.append("- CIs are bootstrap intervals of the mean; percentiles use linear interpolation.")
+    elif skipped:
+        lines.append(f"- Distribution section skipped: {skipped}.")
     lines.append("- SCI = (Wh per request).")
     lines.append("- Cost uses `CARBONWISE_KWH_EUR` if set (default €0.25/kWh).")
     lines.append("")
@@ -88,16 +137,46 @@ def write_pdf(md_text, out_pdf):
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("log", help="run_log.jsonl path")
+    ap.add_argument("log", nargs="+", help="run log paths, directories or globs (.jsonl, .cwcol, .parquet or .cwseg segments)")
     ap.add_argument("--out", default="report.md")
     ap.add_argument("--pdf", default="report.pdf")
     ap.add_argument("--baseline", default="baseline")
     ap.add_argument("--optimized", default="optimized")
+    ap.add_argument("--engine", choices=["auto", "numpy", "stream"], default="auto",
+                    help="numpy adds percentiles/CIs and holds every row's metrics in memory (about 200 bytes/row at peak); "
+                         "stream is means only, constant memory (auto: numpy when installed)")
+    ap.add_argument("--bootstrap", type=int, default=1000, help="bootstrap resamples for CIs")
+    ap.add_argument("--incremental", action="store_true",
+                    help="JSONL only: keep a checkpoint next to the log and parse just the new tail (means only)")
+    ap.add_argument("--state", help="checkpoint path (default: <log>.cwstate.json)")
+    ap.add_argument("--workers", type=int, help="process pool size for multi-file / chunked ingestion (default: CPU count)")
+    ap.add_argument("--chunk-mb", dest="chunk_mb", type=int, default=64, help="split JSONL files into chunks of this size")
     args = ap.parse_args()
 
-    rows = load_jsonl(args.log)
-    groups = group_by_name(rows)
-    text = md_report(groups, args.baseline, args.optimized)
+    paths = expand_paths(args.log)
+    if not paths:
+        raise SystemExit("No run logs found.")
+    agg = skipped = None
+    if args.incremental:
+        if len(paths) != 1 or detect_format(paths[0]) != "jsonl":
+            raise SystemExit("--incremental needs a single JSONL log")
+        agg, new_rows, rebuilt = aggregate_incremental(paths[0], args.state)
+        print(f"{'Rebuilt from scratch' if rebuilt else 'Incremental update'}: {new_rows} new rows")
+        skipped = "--incremental keeps running means only"
+    elif len(paths) > 1 or args.workers:
+        # Parallel streaming path: means/variance only, merged from per-worker partials.
+        agg = aggregate_parallel(paths, args.workers, chunk_bytes=args.chunk_mb << 20)
+        skipped = ("several logs / --workers are merged as running means only; "
+                   "report a single log without --workers for percentiles and CIs")
+    elif args.engine != "stream":
+        agg = summarize_numpy(paths[0], n_boot=args.bootstrap)
+        if agg is None and args.engine == "numpy":
+            raise SystemExit("NumPy is required for --engine numpy")
+    if agg is None:
+        agg = aggregate_log(paths[0])
+    if skipped and args.engine != "stream":
+        print(f"Note: distribution section skipped: {skipped}.")
+    text = md_report(agg, args.baseline, args.optimized, skipped if args.engine != "stream" else None)
 
     with open(args.out, "w", encoding="utf-8") as f:
         f.write(text)
@@ -0,0 +1,229 @@
+# cw_server.py
+# Local HTTP API over a run log, so the dashboard can fetch small aggregates
+# instead of uploading and parsing the whole .jsonl in the browser.
+# Usage:
+#   python cw_server.py run_log.jsonl --port 8765 --table ../public/region_factors.json
+# Endpoints (all GET, JSON; ETag/304 and gzip supported):
+#   /summary
+#   /runs/{run_name}?limit=100
+#   /timeseries?run=baseline&window=1h&since=2025-11-01&until=2025-12-01
+#   /regions?current=eu-west-1&energy_kwh=0.92
+
+import json, argparse, gzip, hashlib, logging, os, threading
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from aggregate import METRICS
+from cw_report import aggregate_log, summarize
+from region_advisor import load_table, greener_regions
+from rollup import RollupStore, WINDOWS, parse_ts
+from runstore import iter_records
+
+DEFAULT_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "public", "region_factors.json")
+GZIP_MIN_BYTES = 512
+logger = logging.getLogger("carbonwise.server")
+
+def file_signature(path: str) -> Tuple[int, int, int]:
+    st = os.stat(path)
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+class LogView:
+    """Aggregates derived from one log; dropped as soon as the file's signature changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sig = None
+        self._agg = None
+        self._rollups = None
+
+    def refresh(self) -> Tuple[int, int, int]:
+        sig = file_signature(self.path)
+        with self._lock:
+            if sig != self._sig:
+                self._sig, self._agg, self._rollups = sig, None, None
+        return sig
+
+    def aggregator(self):
+        with self._lock:
+            if self._agg is None:
+                self._agg = aggregate_log(self.path)
+            return self._agg
+
+    def rollups(self) -> RollupStore:
+        with self._lock:
+            if self._rollups is None:
+                self._rollups = RollupStore().add_all(iter_records(self.path, ["run_name", "ts", "sample_weight", "kind", *METRICS]))
+            return self._rollups
+
+    def recent(self, run_name: str, limit: int) -> List[Dict[str, Any]]:
+        tail: deque = deque(maxlen=limit)
+        for r in iter_records(self.path):
+            if r.get("run_name") == run_name and r.get("kind") != "span":
+                tail.append(r)
+        return list(tail)
+
+class Response:
+    __slots__ = ("status", "body", "gz", "etag")
+
+    def __init__(self, status: int, obj: Any):
+        self.status = status
+        self.body = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+        self.gz = gzip.compress(self.body, 6) if len(self.body) >= GZIP_MIN_BYTES else None
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+
+class LRUCache:
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._d: "OrderedDict[Any, Response]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[Response]:
+        with self._lock:
+            v = self._d.get(key)
+            if v is not None:
+                self._d.move_to_end(key)
+            return v
+
+    def put(self, key, value: Response) -> None:
+        with self._lock:
+            self._d[key] = value
+            self._d.move_to_end(key)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._d.clear()
+
+class QueryService:
+    """Routes requests to cached Responses; cache keys carry the log and table signatures."""
+
+    def __init__(self, log_path: str, table_path: str = DEFAULT_TABLE, cache_size: int = 256):
+        self.log = LogView(log_path)
+        self.table_path = table_path
+        self.cache = LRUCache(cache_size)
+        self._last_sig = None
+
+    def get(self, path: str, query: Dict[str, List[str]]) -> Response:
+        sig = self.log.refresh()
+        if sig != self._last_sig:
+            self.cache.clear()  # log changed: every cached answer is stale
+            self._last_sig = sig
+        table_sig = file_signature(self.table_path) if os.path.exists(self.table_path) else None
+        key = (path, tuple(sorted((k, tuple(v)) for k, v in query.items())), sig, table_sig)
+        resp = self.cache.get(key)
+        if resp is None:
+            try:
+                resp = Response(200, self.route(path, query))
+            except KeyError as e:
+                resp = Response(404, {"error": f"not found: {e.args[0]}"})
+            except ValueError as e:
+                resp = Response(400, {"error": str(e)})
+            self.cache.put(key, resp)
+        return resp
+
+    def route(self, path: str, q: Dict[str, List[str]]) -> Any:
+        arg = lambda k, d=None: q.get(k, [d])[0]
+        if path == "/summary":
+            agg = self.log.aggregator()
+            return {"runs": {name: self._run_summary(agg, name) for name in sorted(agg.groups)}}
+        if path.startswith("/runs/"):
+            name = unquote(path[len("/runs/"):])
+            agg = self.log.aggregator()
+            if name not in agg.groups:
+                raise KeyError(name)
+            limit = int(arg("limit", "100"))
+            return {"run_name": name, "summary": self._run_summary(agg, name),
+                    "recent": self.log.recent(name, max(0, min(limit, 10000)))}
+        if path == "/timeseries":
+            window = arg("window", "1h")
+            if window not in WINDOWS:
+                raise ValueError(f"window must be one of {sorted(WINDOWS)}")
+            since = parse_ts(arg("since")) if arg("since") else None
+            until = parse_ts(arg("until")) if arg("until") else None
+            store = self.log.rollups()
+            names = [arg("run")] if arg("run") else store.run_names(window)
+            return {"window": window, "series": {n: store.query(n, window, since, until) for n in names}}
+        if path == "/regions":
+            tbl = load_table(self.table_path)
+            out: Dict[str, Any] = {"regions": tbl}
+            if arg("current"):
+                rows = greener_regions(tbl, arg("current"), float(arg("energy_kwh", "0")))
+                if rows is None:
+                    raise KeyError(arg("current"))
+                out["greener"] = [{"region": r, "display_name": n, "gco2_per_kwh": g, "saved_pct": p, "saved_kg": kg}
+                                  for r, n, g, p, kg in rows]
+            return out
+        raise KeyError(path)
+
+    @staticmethod
+    def _run_summary(agg, name: str) -> Dict[str, Any]:
+        out = summarize(agg, name)
+        out["stats"] = {m: s.to_dict() for m, s in agg.groups[name].items()}
+        return out
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive for dashboard polling
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            resp = self.server.service.get(url.path.rstrip("/") or "/", parse_qs(url.query))
+        except Exception as e:   # e.g. the log was rotated away or is unreadable; not cached, so retried
+            logger.exception("GET %s failed", self.path)
+            resp = Response(500, {"error": f"{type(e).__name__}: {e}"})
+        common = [("ETag", resp.etag), ("Cache-Control", "no-cache"), ("Vary", "Accept-Encoding"),
+                  ("Access-Control-Allow-Origin", "*")]
+        if resp.status == 200 and self.headers.get("If-None-Match") == resp.etag:
+            self.send_response(304)
+            for k, v in common:
+                self.send_header(k, v)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = resp.body
+        use_gzip = resp.gz is not None and "gzip" in (self.headers.get("Accept-Encoding") or "")
+        self.send_response(resp.status)
+        for k, v in common:
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        if use_gzip:
+            body = resp.gz
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+def make_server(log_path: str, host: str = "127.0.0.1", port: int = 8765, table_path: str = DEFAULT_TABLE,
+                cache_size: int = 256, verbose: bool = False) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    srv.service = QueryService(log_path, table_path, cache_size)
+    srv.verbose = verbose
+    return srv
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("log", help="run log path (.jsonl, .cwcol or .parquet)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--table", default=DEFAULT_TABLE, help="region_factors.json")
+    ap.add_argument("--cache", type=int, default=256, help="LRU entries")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    srv = make_server(args.log, args.host, args.port, args.table, args.cache, args.verbose)
+    print(f"Serving {args.log} on http://{args.host}:{srv.server_address[1]}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
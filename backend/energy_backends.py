@@ -0,0 +1,327 @@
+# energy_backends.py
+# Pluggable energy sources for tracker.py. Every backend exposes a cumulative
+# kWh counter since start(); the tracker only ever takes differences of it.
+#   rapl       - Linux powercap RAPL counters (/sys/class/powercap), exact
+#                and cheap to read; wraparound handled per zone
+#   cputdp     - process CPU seconds x TDP per core, when RAPL is not readable
+#   codecarbon - CodeCarbon's EmissionsTracker, imported only when used
+#   fake       - constant power or scripted energy, for tests and benchmarks
+# Pick one with track(..., energy_backend="rapl"), start_session(energy_backend=...)
+# or CARBONWISE_ENERGY_BACKEND; "auto" tries rapl, then codecarbon, then cputdp.
+
+import glob, os, threading, time
+from typing import Callable, Dict, List, Optional, Tuple
+
+POWERCAP_ROOT = "/sys/class/powercap"
+UJ_PER_KWH = 3.6e12
+
+class EnergyBackend:
+    """
+    Cumulative energy counter. Subclasses implement _read_kwh(). `exact`
+    backends are cheap enough to read at every tracked call's begin/end;
+    the others only move when their own sampler does.
+    """
+
+    name = "base"
+    exact = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> "EnergyBackend":
+        self._started = True
+        return self
+
+    def energy_kwh(self) -> float:
+        """kWh since start(); never decreases."""
+        with self._lock:
+            return self._read_kwh()
+
+    def _read_kwh(self) -> float:
+        raise NotImplementedError
+
+    def stop(self) -> float:
+        """Final reading; the backend may not be used afterwards."""
+        kwh = self.energy_kwh()
+        self._started = False
+        return kwh
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+# ---------------------------------------------------------------------------
+# RAPL
+
+def rapl_zones(root: str = POWERCAP_ROOT) -> List[Tuple[str, str]]:
+    """
+    Readable top-level RAPL zones as (path, name): one "package-N" per socket
+    plus any "dram" subzone (DRAM is outside the package domain). Core/uncore
+    subzones are skipped since the package counter already includes them.
+    """
+    zones = []
+    for path in sorted(glob.glob(os.path.join(root, "*-rapl:*"))):
+        try:
+            with open(os.path.join(path, "name")) as f:
+                name = f.read().strip()
+            with open(os.path.join(path, "energy_uj")) as f:
+                int(f.read())
+        except (OSError, ValueError):
+            continue   # missing, or root-only (energy_uj is 0400 on patched kernels)
+        top = os.path.basename(path).count(":") == 1
+        if (top and name.startswith("package")) or name == "dram":
+            zones.append((path, name))
+    return zones
+
+class _Counter:
+    """One wrapping energy_uj counter, kept open and re-read with pread."""
+
+    __slots__ = ("fd", "max_uj", "last", "total")
+
+    def __init__(self, path: str):
+        self.fd = os.open(os.path.join(path, "energy_uj"), os.O_RDONLY)
+        try:
+            with open(os.path.join(path, "max_energy_range_uj")) as f:
+                self.max_uj = int(f.read())
+        except (OSError, ValueError):
+            self.max_uj = 2 ** 32 - 1
+        self.last = self.read()
+        self.total = 0
+
+    def read(self) -> int:
+        return int(os.pread(self.fd, 32, 0))
+
+    def advance(self) -> int:
+        """Total µJ since construction; one wrap between reads is corrected."""
+        cur = self.read()
+        d = cur - self.last
+        if d < 0:
+            d += self.max_uj + 1
+        self.total += d
+        self.last = cur
+        return self.total
+
+class RaplBackend(EnergyBackend):
+    """
+    Sums package (+ dram) RAPL zones. A counter wraps after max_energy_range_uj
+    (minutes at full power), so a poll thread reads at least every
+    `poll_secs`; the shared session's sampler reads far more often anyway.
+    """
+
+    name = "rapl"
+    exact = True
+
+    def __init__(self, root: str = POWERCAP_ROOT, poll_secs: float = 30.0):
+        super().__init__()
+        self.root = root
+        self.poll_secs = poll_secs
+        self.zones = rapl_zones(root)
+        self._counters: List[_Counter] = []
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    @classmethod
+    def available(cls, root: str = POWERCAP_ROOT) -> bool:
+        return bool(rapl_zones(root))
+
+    def start(self) -> "RaplBackend":
+        if not self.zones:
+            raise RuntimeError(f"no readable RAPL zones under {self.root}")
+        self._counters = [_Counter(p) for p, _ in self.zones]
+        if self.poll_secs:
+            self._poller = threading.Thread(target=self._poll, name="carbonwise-rapl", daemon=True)
+            self._poller.start()
+        return super().start()
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_secs):
+            self.energy_kwh()
+
+    def _read_kwh(self) -> float:
+        return sum(c.advance() for c in self._counters) / UJ_PER_KWH
+
+    def stop(self) -> float:
+        kwh = super().stop()
+        self._stop.set()
+        if self._poller is not None and self._poller is not threading.current_thread():
+            self._poller.join()   # a poll in flight must not pread a closed (or reused) fd
+        self._poller = None
+        with self._lock:          # nor may a reader that got in through energy_kwh()
+            for c in self._counters:
+                os.close(c.fd)
+            self._counters = []
+        return kwh
+
+# ---------------------------------------------------------------------------
+# CPU time x TDP
+
+def process_cpu_seconds() -> float:
+    """User + system CPU of this process and its reaped children."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+class CpuTdpBackend(EnergyBackend):
+    """
+    energy = CPU seconds x (TDP / logical CPUs). TDP comes from
+    CARBONWISE_CPU_TDP_W (default 85 W, CodeCarbon's fallback value), so a
+    process that keeps one core busy is charged TDP / cores watts.
+    """
+
+    name = "cputdp"
+    exact = True
+
+    def __init__(self, tdp_watts: Optional[float] = None, cpus: Optional[int] = None,
+                 cpu_seconds: Callable[[], float] = process_cpu_seconds):
+        super().__init__()
+        self.tdp_watts = float(tdp_watts or os.getenv("CARBONWISE_CPU_TDP_W", "85"))
+        self.cpus = cpus or os.cpu_count() or 1
+        self.cpu_seconds = cpu_seconds
+        self._c0 = 0.0
+
+    def start(self) -> "CpuTdpBackend":
+        self._c0 = self.cpu_seconds()
+        return super().start()
+
+    def _read_kwh(self) -> float:
+        return max(0.0, self.cpu_seconds() - self._c0) * self.tdp_watts / self.cpus / 3.6e6
+
+# ---------------------------------------------------------------------------
+# CodeCarbon
+
+def codecarbon_energy_kwh(tracker) -> float:
+    """Try multiple places CodeCarbon may store energy (kWh)."""
+    try:
+        data = getattr(tracker, "final_emissions_data", None)
+        if data is not None and hasattr(data, "energy_consumed") and data.energy_consumed is not None:
+            return float(data.energy_consumed)
+    except Exception:
+        pass
+    try:
+        total_energy = getattr(tracker, "_total_energy", None)
+        if total_energy is not None and hasattr(total_energy, "kWh"):
+            return float(total_energy.kWh)
+    except Exception:
+        pass
+    try:
+        em = getattr(tracker, "_emissions_data", None)
+        if isinstance(em, dict):
+            val = em.get("energy_consumed")
+            if val is not None:
+                return float(val)
+    except Exception:
+        pass
+    return 0.0
+
+class CodeCarbonBackend(EnergyBackend):
+    """
+    EmissionsTracker behind the backend interface. Its counter only moves every
+    `measure_secs`; stop() also keeps CodeCarbon's own CO2e estimate in
+    `co2e_kg` for the per-call tracker, which records it as before.
+    """
+
+    name = "codecarbon"
+
+    def __init__(self, measure_secs: float = 1.0, country_iso: Optional[str] = None, save_to_file: bool = False):
+        super().__init__()
+        self.measure_secs = measure_secs
+        self.country_iso = country_iso
+        self.save_to_file = save_to_file
+        self.co2e_kg: Optional[float] = None
+        self._tracker = None
+        self._last = 0.0
+
+    @classmethod
+    def available(cls) -> bool:
+        import importlib.util
+        return importlib.util.find_spec("codecarbon") is not None
+
+    def start(self) -> "CodeCarbonBackend":
+        from codecarbon import EmissionsTracker   # heavy: only paid when this backend is used
+        if self.country_iso and not os.getenv("CODECARBON_COUNTRY_ISO_CODE"):
+            os.environ["CODECARBON_COUNTRY_ISO_CODE"] = self.country_iso
+        # Build tracker (works across CodeCarbon versions)
+        try:
+            self._tracker = EmissionsTracker(
+                measure_power_secs=self.measure_secs,
+                country_iso_code=os.getenv("CODECARBON_COUNTRY_ISO_CODE"),
+                save_to_file=self.save_to_file,
+            )
+        except TypeError:
+            self._tracker = EmissionsTracker(measure_power_secs=self.measure_secs)
+        self._tracker.start()
+        return super().start()
+
+    def _read_kwh(self) -> float:
+        self._last = max(self._last, codecarbon_energy_kwh(self._tracker))  # cumulative counter never goes backwards
+        return self._last
+
+    def stop(self) -> float:
+        # stop() returns CO2e in kg and finalizes the energy reading
+        try:
+            self.co2e_kg = float(self._tracker.stop() or 0.0)
+        except Exception:
+            self.co2e_kg = 0.0
+        return super().stop()
+
+# ---------------------------------------------------------------------------
+# Fake
+
+class FakeBackend(EnergyBackend):
+    """Constant `watts` over `clock` time, plus whatever add() injects. Deterministic with a fake clock."""
+
+    name = "fake"
+    exact = True
+
+    def __init__(self, watts: float = 50.0, clock: Callable[[], float] = time.perf_counter):
+        super().__init__()
+        self.watts = watts
+        self.clock = clock
+        self._t0 = 0.0
+        self._extra = 0.0
+
+    def start(self) -> "FakeBackend":
+        self._t0 = self.clock()
+        return super().start()
+
+    def add(self, kwh: float) -> None:
+        with self._lock:
+            self._extra += kwh
+
+    def _read_kwh(self) -> float:
+        return (self.clock() - self._t0) * self.watts / 3.6e6 + self._extra
+
+# ---------------------------------------------------------------------------
+
+BACKENDS: Dict[str, type] = {
+    "rapl": RaplBackend,
+    "cputdp": CpuTdpBackend,
+    "codecarbon": CodeCarbonBackend,
+    "fake": FakeBackend,
+}
+AUTO_ORDER = ("rapl", "codecarbon", "cputdp")
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    """Concrete backend name for `name` / $CARBONWISE_ENERGY_BACKEND / auto."""
+    name = (name or os.getenv("CARBONWISE_ENERGY_BACKEND") or "auto").lower()
+    if name != "auto":
+        if name not in BACKENDS:
+            raise ValueError(f"unknown energy backend {name!r}; choose from {sorted(BACKENDS)} or 'auto'")
+        return name
+    for cand in AUTO_ORDER:
+        if BACKENDS[cand].available():
+            return cand
+    return "cputdp"
+
+_resolved: Dict[Optional[str], str] = {}
+
+def make_backend(name: Optional[str] = None, measure_secs: float = 1.0, country_iso: Optional[str] = None,
+                 save_to_file: bool = False) -> EnergyBackend:
+    """New, unstarted backend; 'auto' is resolved once per process."""
+    key = name or os.getenv("CARBONWISE_ENERGY_BACKEND")
+    if key not in _resolved:
+        _resolved[key] = resolve_backend(key)
+    resolved = _resolved[key]
+    if resolved == "codecarbon":
+        return CodeCarbonBackend(measure_secs, country_iso, save_to_file)
+    return BACKENDS[resolved]()
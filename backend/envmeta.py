@@ -0,0 +1,108 @@
+# envmeta.py
+# Environment metadata for tracker records. The env block (schema, Python,
+# platform, package versions, energy backend, cwd) is computed once per
+# process and named by a short content hash, `env_id`. Records only carry
+# meta.env_id; the full block is appended once to a side table next to the
+# log (run_log.jsonl -> run_log.env.jsonl), and load_env_table() / join_env()
+# put it back for readers that want it.
+
+import hashlib, json, os, platform, threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+SCHEMA_VERSION = "1.2.0"   # 1.2.0: meta.env_id replaces the inline env block
+ENV_SUFFIX = ".env.jsonl"
+# Keys of an env block; before 1.2.0 they sat inline in every record's meta.
+ENV_KEYS = ("schema_version", "python_version", "platform", "cpu", "codecarbon_version", "energy_backend", "cwd")
+
+def _pkg_ver(name: str) -> str:
+    try:
+        import importlib.metadata as im
+        return im.version(name)
+    except Exception:
+        return "unknown"
+
+def env_table_path(log_path: str) -> str:
+    """Side table for `log_path`: <stem>.env.jsonl in the same directory."""
+    root, ext = os.path.splitext(log_path)
+    return (root if ext == ".jsonl" else log_path) + ENV_SUFFIX
+
+# env_id -> block, and (schema_version, energy_backend) -> env_id
+_blocks: Dict[str, Dict[str, Any]] = {}
+_ids: Dict[Tuple[str, Optional[str]], str] = {}
+_written: Set[Tuple[str, str]] = set()
+_lock = threading.Lock()
+
+def env_id(schema_version: str, energy_backend: Optional[str] = None) -> str:
+    """Fingerprint of this process's environment; the block is built on first use only."""
+    key = (schema_version, energy_backend)
+    eid = _ids.get(key)
+    if eid is not None:
+        return eid
+    env = {
+        "schema_version": schema_version,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu": platform.processor(),
+        "codecarbon_version": _pkg_ver("codecarbon"),
+        "energy_backend": energy_backend,
+        "cwd": os.getcwd(),
+    }
+    eid = block_id(env)
+    with _lock:
+        _blocks[eid] = env
+        _ids[key] = eid
+    return eid
+
+def block_id(env: Dict[str, Any]) -> str:
+    """Content hash naming an env block (also used for blocks split out of old records)."""
+    return hashlib.sha1(json.dumps(env, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+def env_block(eid: str) -> Optional[Dict[str, Any]]:
+    return _blocks.get(eid)
+
+def register_env(log_path: str, eid: str) -> None:
+    """Append the block for `eid` to log_path's side table unless it is already there."""
+    if (log_path, eid) in _written:
+        return
+    from sinks import append_lines, encode_line
+    with _lock:
+        if (log_path, eid) in _written:
+            return
+        path = env_table_path(log_path)
+        if eid not in load_env_table(log_path):   # earlier processes share most ids
+            row = {"env_id": eid, "first_seen": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                   **_blocks[eid]}
+            append_lines(path, encode_line(row))
+        _written.add((log_path, eid))
+
+def load_env_table(log_path: str) -> Dict[str, Dict[str, Any]]:
+    """env_id -> env block from log_path's side table ({} if there is none; compacted segments carry their own)."""
+    out: Dict[str, Dict[str, Any]] = {}
+    try:
+        f = open(env_table_path(log_path), "r", encoding="utf-8")
+    except OSError:
+        from runstore import detect_format, segment_envs
+        if os.path.isfile(log_path) and detect_format(log_path) == "cwseg":
+            out.update(segment_envs(log_path))
+        return out
+    with f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue   # torn line from a crashed writer
+            eid = row.pop("env_id", None) if isinstance(row, dict) else None
+            if eid and eid not in out:
+                row.pop("first_seen", None)
+                out[eid] = row
+    return out
+
+def join_env(records: Iterable[Dict[str, Any]], table: Dict[str, Dict[str, Any]]):
+    """Yield records with meta expanded back to the full env block, as logs before 1.2.0 had it."""
+    for rec in records:
+        meta = rec.get("meta")
+        env = table.get(meta.get("env_id")) if isinstance(meta, dict) else None
+        if env is not None:
+            rec = dict(rec, meta={**meta, **env})
+        yield rec
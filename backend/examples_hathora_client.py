@@ -1,13 +1,14 @@
-import os, time, uuid, json, requests
-from typing import List, Dict, Any
+import os
+from typing import List
 from dotenv import load_dotenv
-from tracker import track
+from remote_client import InferenceClient, chat_payload
 
-load_dotenv()  # loads HATHORA_URL, HATHORA_TOKEN, HATHORA_REGION_HINT
+load_dotenv()  # loads HATHORA_URL, HATHORA_TOKEN, HATHORA_REGION_HINT, HATHORA_CONCURRENCY
 
 HATHORA_URL = os.environ.get("HATHORA_URL", "").strip()
 HATHORA_TOKEN = os.environ.get("HATHORA_TOKEN", "").strip()
 REGION_HINT = os.environ.get("HATHORA_REGION_HINT", "eu-west-1")
+CONCURRENCY = int(os.environ.get("HATHORA_CONCURRENCY", "4"))
 
 PROMPTS: List[str] = [
     "In one sentence, explain why reducing AI energy use matters for climate.",
@@ -15,39 +16,22 @@ PROMPTS: List[str] = [
     "Name two ways to make inference more carbon-efficient."
 ]
 
-HEADERS = {
-    "Content-Type": "application/json",
-    "Authorization": f"Bearer {HATHORA_TOKEN}",
-}
-
-def _chat(payload: Dict[str, Any]) -> Dict[str, Any]:
-    r = requests.post(HATHORA_URL, headers=HEADERS, json=payload, timeout=30)
-    r.raise_for_status()
-    return r.json()
-
-@track(
-    run_name="hathora",
-    requests=len(PROMPTS),
-    meta={"source":"hathora","region":REGION_HINT,"notes":"remote LLM via Hathora"},
-    country_iso=None,
-    measure_secs=0.5
-)
 def batch_hathora():
-    for prompt in PROMPTS:
-        payload = {
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 128,
-            "temperature": 0.7,
-        }
-        t0 = time.time()
-        try:
-            resp = _chat(payload)
-            elapsed = (time.time() - t0) * 1000.0
+    # One tracked record per request (run_name "hathora"), with ttfb_ms and payload bytes
+    with InferenceClient(
+        HATHORA_URL, HATHORA_TOKEN,
+        concurrency=CONCURRENCY,
+        run_name="hathora",
+        meta={"source": "hathora", "region": REGION_HINT, "notes": "remote LLM via Hathora"},
+    ) as client:
+        replies = client.map(chat_payload(p, max_tokens=128, temperature=0.7) for p in PROMPTS)
+    for r in replies:
+        if r.ok:
             # Optional: print a short preview (keep it quiet for demos)
-            content = resp.get("choices", [{}])[0].get("message", {}).get("content", "")[:80].replace("\n", " ")
-            print(f"[hathora] {elapsed:.0f}ms  :: {content}")
-        except Exception as e:
-            print(f"[hathora] request failed: {e}")
+            content = r.text()[:80].replace("\n", " ")
+            print(f"[hathora] {r.latency_ms:.0f}ms (ttfb {r.ttfb_ms:.0f}ms)  :: {content}")
+        else:
+            print(f"[hathora] request failed after {r.attempts} attempt(s): {r.error}")
 
 if __name__ == "__main__":
     if not HATHORA_URL or not HATHORA_TOKEN:
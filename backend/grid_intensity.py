@@ -0,0 +1,180 @@
+# grid_intensity.py
+# Time-resolved grid carbon intensity from local hourly series, replacing the
+# per-region constants where a series is available. Input files (CSV, or
+# Parquet with pyarrow) have one row per region and hour:
+#   region,ts,gco2_per_kwh
+#   eu-west-1,2025-11-08T13:00:00Z,312
+# `region` is a cloud region or a country ISO code (matched case-insensitively),
+# `ts` an ISO-8601 time or epoch seconds; each value holds until the next row.
+# Lookups bisect a per-region sorted list (O(log n), ~1µs) and the mean over
+# an interval comes from a running integral, so both run inline per call.
+# Usage:
+#   CARBONWISE_GRID_SERIES=grid/2025.csv python cw_bench.py
+#   python grid_intensity.py grid/2025.csv --region eu-west-1 --at 2025-11-08T13:30:00Z --hours 4
+
+import argparse, bisect, csv, glob, os, threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+def parse_ts(v) -> float:
+    """Epoch seconds from epoch numbers or ISO-8601 text (naive times are UTC)."""
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, datetime):
+        dt = v
+    else:
+        s = str(v).strip()
+        try:
+            return float(s)
+        except ValueError:
+            dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+class IntensitySeries:
+    """One region's step function; cum[i] is the integral (g/kWh x s) from starts[0] to starts[i]."""
+
+    __slots__ = ("starts", "values", "cum")
+
+    def __init__(self, points: Iterable[Tuple[float, float]]):
+        pts = dict(points)   # later rows for the same hour win
+        self.starts: List[float] = sorted(pts)
+        self.values: List[float] = [float(pts[t]) for t in self.starts]
+        if not self.starts:
+            raise ValueError("empty intensity series")
+        cum = [0.0]
+        for i in range(1, len(self.starts)):
+            cum.append(cum[-1] + self.values[i - 1] * (self.starts[i] - self.starts[i - 1]))
+        self.cum = cum
+
+    def at(self, t: float) -> float:
+        """gCO2/kWh in effect at epoch `t` (first/last value outside the series)."""
+        i = bisect.bisect_right(self.starts, t) - 1
+        return self.values[max(i, 0)]
+
+    def _integral(self, t: float) -> float:
+        i = bisect.bisect_right(self.starts, t) - 1
+        if i < 0:
+            return self.values[0] * (t - self.starts[0])
+        return self.cum[i] + self.values[i] * (t - self.starts[i])
+
+    def mean(self, t0: float, t1: float) -> float:
+        """Time-weighted mean gCO2/kWh over [t0, t1]; the point value if the interval is empty."""
+        if t1 <= t0:
+            return self.at(t0)
+        return (self._integral(t1) - self._integral(t0)) / (t1 - t0)
+
+    def at_many(self, ts):
+        """Vectorized at() over a numpy array of epoch seconds."""
+        import numpy as np
+        starts = np.asarray(self.starts)
+        idx = np.clip(np.searchsorted(starts, ts, side="right") - 1, 0, len(starts) - 1)
+        return np.asarray(self.values)[idx]
+
+    def span(self) -> Tuple[float, float]:
+        return self.starts[0], self.starts[-1]
+
+def _iter_csv(path: str) -> Iterator[Tuple[str, float, float]]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                yield row["region"], parse_ts(row["ts"]), float(row["gco2_per_kwh"])
+            except (KeyError, TypeError, ValueError):
+                continue   # header variants / blank cells: skip the row
+
+def _iter_parquet(path: str) -> Iterator[Tuple[str, float, float]]:
+    import pyarrow.parquet as pq
+    tbl = pq.read_table(path, columns=["region", "ts", "gco2_per_kwh"])
+    for region, ts, g in zip(*(tbl.column(c).to_pylist() for c in ("region", "ts", "gco2_per_kwh"))):
+        if region is None or ts is None or g is None:
+            continue
+        yield region, parse_ts(ts), float(g)
+
+def _expand(paths: Sequence[str]) -> List[str]:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out += sorted(glob.glob(os.path.join(p, "*.csv")) + glob.glob(os.path.join(p, "*.parquet")))
+        else:
+            out.append(p)
+    return out
+
+class GridIntensity:
+    """Hourly intensity series per region (keys lower-cased), loaded from CSV/Parquet files or directories."""
+
+    def __init__(self, series: Dict[str, IntensitySeries]):
+        self.series = series
+
+    @classmethod
+    def load(cls, paths: Sequence[str]) -> "GridIntensity":
+        points: Dict[str, List[Tuple[float, float]]] = {}
+        for path in _expand(paths):
+            rows = _iter_parquet(path) if path.endswith(".parquet") else _iter_csv(path)
+            for region, t, g in rows:
+                points.setdefault(region.strip().lower(), []).append((t, g))
+        return cls({k: IntensitySeries(v) for k, v in points.items()})
+
+    def get(self, key: Optional[str]) -> Optional[IntensitySeries]:
+        return self.series.get(key.lower()) if key else None
+
+    def regions(self) -> List[str]:
+        return sorted(self.series)
+
+    def at(self, key: str, t: float) -> Optional[float]:
+        s = self.get(key)
+        return s.at(t) if s is not None else None
+
+    def mean(self, key: str, t0: float, t1: float) -> Optional[float]:
+        s = self.get(key)
+        return s.mean(t0, t1) if s is not None else None
+
+_default: Optional[GridIntensity] = None
+_default_loaded = False
+_default_lock = threading.Lock()
+
+def default_provider() -> Optional[GridIntensity]:
+    """Provider for $CARBONWISE_GRID_SERIES (files/dirs separated by os.pathsep), loaded once; None if unset."""
+    global _default, _default_loaded
+    if _default_loaded:
+        return _default
+    with _default_lock:
+        if not _default_loaded:
+            spec = os.getenv("CARBONWISE_GRID_SERIES")
+            if spec:
+                _default = GridIntensity.load([p for p in spec.split(os.pathsep) if p])
+            _default_loaded = True
+    return _default
+
+def set_default_provider(provider: Optional[GridIntensity]) -> None:
+    """Use `provider` for tracker lookups (None: static tables only)."""
+    global _default, _default_loaded
+    with _default_lock:
+        _default, _default_loaded = provider, True
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="+", help="CSV/Parquet files or directories")
+    ap.add_argument("--region", help="region or country code; default lists coverage")
+    ap.add_argument("--at", help="ISO time or epoch seconds (default now)")
+    ap.add_argument("--hours", type=float, default=0.0, help="also print the mean over this many hours")
+    args = ap.parse_args()
+
+    grid = GridIntensity.load(args.paths)
+    if not args.region:
+        for key in grid.regions():
+            s = grid.series[key]
+            t0, t1 = s.span()
+            print(f"{key}: {len(s.starts)} points, {datetime.fromtimestamp(t0, timezone.utc):%Y-%m-%d %H:%M} → "
+                  f"{datetime.fromtimestamp(t1, timezone.utc):%Y-%m-%d %H:%M} UTC, "
+                  f"{min(s.values):.0f}–{max(s.values):.0f} gCO2/kWh")
+        return
+    if grid.get(args.region) is None:
+        raise SystemExit(f"no series for {args.region}; have {', '.join(grid.regions())}")
+    t = parse_ts(args.at) if args.at else datetime.now(timezone.utc).timestamp()
+    print(f"{args.region} at {datetime.fromtimestamp(t, timezone.utc).isoformat()}: {grid.at(args.region, t):.1f} gCO2/kWh")
+    if args.hours > 0:
+        print(f"mean over the next {args.hours:g} h: {grid.mean(args.region, t, t + args.hours * 3600):.1f} gCO2/kWh")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# logcompact.py
+# Rotation and compaction of run logs. The tracker only appends, so
+# run_log.jsonl grows without bound, and every record repeats its meta block
+# and the display units (energy_wh, co2e_g, ...) derivable from the raw ones.
+# `rotate` moves the live log aside once it passes a size or age limit and
+# compacts it into a segment next to it, run_log.<UTC stamp>-<id>.cwseg.gz
+# (.zst when the zstandard package is installed); the tracker just starts a new
+# file. Segments intern meta blocks, drop fields that recompute exactly,
+# carry the env blocks they reference, and are migrated to the current
+# SCHEMA_VERSION as they are written (format: runstore.py). Everything that
+# reads through runstore.iter_records (cw_report, cw_quality_gate,
+# cw_server, rollup, region_advisor) streams them transparently.
+# Usage:
+#   python logcompact.py rotate run_log.jsonl --max-mb 64 --max-age 1d   # e.g. from cron
+#   python logcompact.py compact old_log.jsonl --verify
+#   python logcompact.py info run_log.20261017T120000Z-3f9c2a.cwseg.gz
+#   python cw_report.py run_log.jsonl run_log.*.cwseg.gz
+
+import argparse, json, os, shutil, time, uuid
+from typing import Any, Dict, Optional
+from envmeta import env_table_path, load_env_table
+from rollup import parse_ts
+from runstore import (DEFAULT_KWH_EUR, SEGMENT_EXTS, SegmentWriter, detect_format, iter_records, iter_segment,
+                      migrate_record, segment_codec, segment_envs)
+
+try:
+    import fcntl
+except ImportError:   # Windows: no advisory locks
+    fcntl = None
+
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def default_codec() -> str:
+    try:
+        import zstandard  # noqa: F401
+        return "zstd"
+    except ImportError:
+        return "gzip"
+
+def parse_age(spec: str) -> float:
+    """'90', '30m', '12h', '1d' -> seconds."""
+    spec = spec.strip().lower()
+    if spec and spec[-1] in AGE_UNITS:
+        return float(spec[:-1]) * AGE_UNITS[spec[-1]]
+    return float(spec)
+
+def segment_path(log_path: str, codec: str, stamp: Optional[str] = None) -> str:
+    """run_log.jsonl -> run_log[.<stamp>].cwseg.gz / .cwseg.zst"""
+    root = log_path[:-len(".jsonl")] if log_path.endswith(".jsonl") else log_path
+    ext = next(e for e, c in SEGMENT_EXTS.items() if c == codec)
+    return f"{root}.{stamp}{ext}" if stamp else root + ext
+
+def compact(src: str, dst: str, codec: Optional[str] = None, level: Optional[int] = None,
+            kwh_eur: float = DEFAULT_KWH_EUR, envs: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Write every record of `src` (any readable format) to segment `dst`.
+    env blocks default to src's side table. dst appears atomically.
+    """
+    if envs is None:
+        envs = load_env_table(src)
+    codec = codec or (segment_codec(dst) if dst.endswith(tuple(SEGMENT_EXTS)) else default_codec())
+    tmp = dst + ".part"
+    w = SegmentWriter(tmp, codec, level=level, kwh_eur=kwh_eur, envs=envs)
+    try:
+        for r in iter_records(src):
+            w.write(r)
+    except BaseException:
+        w.close()
+        os.remove(tmp)
+        raise
+    w.close()
+    os.replace(tmp, dst)
+    return {"records": w.records, "migrated": w.migrated, "metas": w.meta_blocks, "shapes": w.shapes,
+            "bytes_in": os.path.getsize(src), "bytes_out": os.path.getsize(dst), "codec": codec}
+
+def verify(src: str, dst: str, kwh_eur: float = DEFAULT_KWH_EUR) -> int:
+    """Check that dst reads back as src's records, migrated; returns the record count."""
+    n = 0
+    theirs = iter_segment(dst)
+    for n, mine in enumerate(iter_records(src), 1):
+        want = migrate_record(mine, kwh_eur)[0]
+        got = next(theirs, None)
+        if got != want:
+            raise ValueError(f"{dst}: record {n} differs from {src}:\n  {want}\n  {got}")
+    if next(theirs, None) is not None:
+        raise ValueError(f"{dst}: more records than {src}")
+    return n
+
+def _first_ts(path: str) -> Optional[float]:
+    with open(path, "rb") as f:
+        line = f.readline()
+    try:
+        return parse_ts(json.loads(line)["ts"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def rotate(log_path: str, max_bytes: Optional[int] = None, max_age_s: Optional[float] = None,
+           codec: Optional[str] = None, settle_secs: float = 0.2, **kw: Any) -> Optional[Dict[str, Any]]:
+    """
+    Compact the live log into a new segment if it holds at least max_bytes or
+    its first record is older than max_age_s; returns compact()'s stats, or
+    None when neither limit is reached. The log is renamed first, so writers
+    (which open it by name for every append) carry on in a fresh file; the
+    rename target has no log extension, so directory scans never count a
+    record twice. The side table stays: it still describes the new file.
+    If compaction fails, the moved log becomes run_log.<stamp>-<id>.jsonl
+    (with a copy of the side table), so readers still find its records.
+    """
+    try:
+        size = os.path.getsize(log_path)
+    except FileNotFoundError:
+        return None
+    if size == 0:
+        return None
+    due = max_bytes is not None and size >= max_bytes
+    if not due and max_age_s is not None:
+        first = _first_ts(log_path)
+        due = first is None or time.time() - first >= max_age_s
+    if not due:
+        return None
+    codec = codec or default_codec()
+    # the random part keeps two rotations within the same second from replacing each other's segment
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()) + "-" + uuid.uuid4().hex[:6]
+    dst = segment_path(log_path, codec, stamp)
+    moved = f"{log_path}.{stamp}.rotating"
+    os.rename(log_path, moved)
+    time.sleep(settle_secs)   # a writer that opened the old name just before the rename
+    try:
+        with open(moved, "rb") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)   # wait out appends still in flight
+            stats = compact(moved, dst, codec, envs=load_env_table(log_path), **kw)
+    except BaseException:
+        root = log_path[:-len(".jsonl")] if log_path.endswith(".jsonl") else log_path
+        kept = f"{root}.{stamp}.jsonl"
+        if os.path.exists(env_table_path(log_path)):
+            shutil.copyfile(env_table_path(log_path), env_table_path(kept))
+        os.rename(moved, kept)
+        raise
+    os.remove(moved)
+    stats["segment"] = dst
+    return stats
+
+def _report(stats: Dict[str, Any], dst: str) -> None:
+    ratio = stats["bytes_in"] / max(1, stats["bytes_out"])
+    print(f"{dst}: {stats['records']} records ({stats['migrated']} migrated), {stats['metas']} meta blocks, "
+          f"{stats['shapes']} shapes; {stats['bytes_in']} -> {stats['bytes_out']} bytes ({ratio:.1f}x, {stats['codec']})")
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("rotate", help="compact the live log into a segment once it is too big or too old")
+    r.add_argument("log")
+    r.add_argument("--max-mb", dest="max_mb", type=float, help="rotate at this size")
+    r.add_argument("--max-age", dest="max_age", type=parse_age, help="rotate when the first record is this old (30m, 12h, 1d)")
+    c = sub.add_parser("compact", help="write any log as a segment")
+    c.add_argument("src")
+    c.add_argument("dst", nargs="?", help="default: <src stem>.cwseg.gz / .cwseg.zst")
+    c.add_argument("--verify", action="store_true", help="read the segment back and compare")
+    for p in (r, c):
+        p.add_argument("--codec", choices=["gzip", "zstd"], help="default: zstd if zstandard is installed, else gzip")
+        p.add_argument("--level", type=int, help="compression level (default: gzip 9, zstd 10)")
+        p.add_argument("--kwh-eur", dest="kwh_eur", type=float, default=DEFAULT_KWH_EUR,
+                       help="€/kWh that logged cost_eur was computed at (CARBONWISE_KWH_EUR)")
+    i = sub.add_parser("info", help="describe a segment")
+    i.add_argument("path")
+    args = ap.parse_args()
+
+    if args.cmd == "rotate":
+        if args.max_mb is None and args.max_age is None:
+            ap.error("rotate needs --max-mb and/or --max-age")
+        stats = rotate(args.log, None if args.max_mb is None else int(args.max_mb * (1 << 20)), args.max_age,
+                       args.codec, level=args.level, kwh_eur=args.kwh_eur)
+        if stats is None:
+            print(f"{args.log}: below the limits, not rotated")
+        else:
+            _report(stats, stats["segment"])
+    elif args.cmd == "compact":
+        codec = args.codec or default_codec()
+        dst = args.dst or segment_path(args.src, codec)
+        stats = compact(args.src, dst, codec, args.level, args.kwh_eur)
+        _report(stats, dst)
+        if args.verify:
+            print(f"verified {verify(args.src, dst, args.kwh_eur)} records")
+    else:
+        if detect_format(args.path) != "cwseg":
+            raise SystemExit(f"{args.path}: not a compressed segment")
+        n = runs = 0
+        names: Dict[str, int] = {}
+        for rec in iter_segment(args.path, ["run_name", "kind"]):
+            n += 1
+            runs += rec.get("kind") != "span"
+            names[rec.get("run_name")] = names.get(rec.get("run_name"), 0) + 1
+        print(f"{args.path}: {n} records ({runs} runs, {n - runs} spans), {os.path.getsize(args.path)} bytes, "
+              f"{len(segment_envs(args.path))} env blocks")
+        for name, k in sorted(names.items(), key=lambda kv: -kv[1]):
+            print(f"- {name}: {k}")
+
+if __name__ == "__main__":
+    main()
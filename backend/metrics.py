@@ -0,0 +1,424 @@
+# metrics.py
+# Live, in-process metrics for tracked calls, so on-call sees energy per
+# request and budget burn as it happens instead of in the next log read.
+# tracker.py feeds every call (sampled out or not) into a MetricsRegistry:
+#   cw_calls_total, cw_energy_kwh_total, cw_budget_exceeded_total   per run_name
+#   cw_latency_ms, cw_energy_wh    summaries: quantiles over a rolling window
+#   cw_window_calls, cw_window_energy_wh    the same window's totals
+#   cw_runs_in_progress, cw_budget_used_ratio    running calls with a budget
+#   cw_budget_alerts_total{level="warn"|"exceeded"}
+# Each thread writes its own shard (no lock on the hot path, well under 1 µs
+# per call); a scrape merges the shards, folding in those of finished
+# threads. Window quantiles use rollup.QuantileSketch buckets, one sketch per
+# time slot, so old slots drop out whole. A watchdog thread polls the energy
+# of running calls that have carbon_budget_wh, and alerts when the energy so
+# far crosses warn_at x budget and then the budget, before the call returns.
+# Usage:
+#   CARBONWISE_METRICS_PORT=9464 python app.py    # then: curl localhost:9464/metrics
+#   tracker.set_metrics(reg := metrics.MetricsRegistry()); metrics.serve(reg, port=9464)
+#   python metrics.py --port 9464 --demo
+
+import argparse, itertools, logging, math, os, threading, time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+from rollup import QuantileSketch
+
+QUANTILES = (0.5, 0.9, 0.99)
+log = logging.getLogger("carbonwise.metrics")
+_log, _ceil, _monotonic = math.log, math.ceil, time.monotonic   # bound once for observe()
+
+class _Slot:
+    """Totals of one time slot: calls, latency sum, kWh, calls over budget, latency and Wh sketches."""
+
+    __slots__ = ("slot", "n", "lat_sum", "kwh", "exceeded", "lat", "wh")
+
+    def __init__(self, slot: int, alpha: float):
+        self.slot = slot
+        self.n = self.lat_sum = self.kwh = self.exceeded = 0.0
+        self.lat, self.wh = QuantileSketch(alpha), QuantileSketch(alpha)
+
+    def copy(self) -> "_Slot":
+        c = _Slot(self.slot, self.lat.alpha)
+        c.n, c.lat_sum, c.kwh, c.exceeded = self.n, self.lat_sum, self.kwh, self.exceeded
+        c.lat.zeros, c.lat.buckets = self.lat.zeros, self.lat.buckets.copy()   # dict.copy is atomic
+        c.wh.zeros, c.wh.buckets = self.wh.zeros, self.wh.buckets.copy()
+        return c
+
+    def merge(self, other: "_Slot") -> "_Slot":
+        self.n += other.n
+        self.lat_sum += other.lat_sum
+        self.kwh += other.kwh
+        self.exceeded += other.exceeded
+        self.lat.merge(other.lat)
+        self.wh.merge(other.wh)
+        return self
+
+class _Shard:
+    """
+    One thread's metrics for one run_name; only the owning thread writes it.
+    Calls update `cur`, the open time slot. Once per slot, `cur` moves to
+    `closed` (the rest of the window) and its totals into `base`, inside a
+    seq bump that readers check, like a seqlock.
+    """
+
+    __slots__ = ("run_name", "owner", "cur", "until", "closed", "base", "seq")
+
+    def __init__(self, run_name: str, slots: int, alpha: float, owner: threading.Thread):
+        self.run_name, self.owner = run_name, owner
+        self.cur = _Slot(-1, alpha)
+        self.until = -math.inf                 # monotonic time the open slot ends
+        self.closed: Deque[_Slot] = deque(maxlen=max(1, slots - 1))
+        self.base = [0.0, 0.0, 0.0, 0.0]      # n, lat_sum, kwh, exceeded of closed slots
+        self.seq = 0                          # odd while rotating
+
+class _Watch:
+    __slots__ = ("key", "run_name", "run_id", "budget_wh", "energy_fn", "t0", "ratio", "level", "_registry")
+
+    def __init__(self, registry: "MetricsRegistry", key: int, run_name: str, run_id: Optional[str],
+                 budget_wh: float, energy_fn: Callable[[], float]):
+        self._registry, self.key = registry, key
+        self.run_name, self.run_id, self.budget_wh, self.energy_fn = run_name, run_id, budget_wh, energy_fn
+        self.t0 = time.monotonic()
+        self.ratio = 0.0
+        self.level = 0   # 0 none, 1 warned, 2 exceeded
+
+    def close(self) -> None:
+        self._registry._unwatch(self)
+
+class MetricsRegistry:
+    """
+    Counters and rolling-window summaries per run_name, plus live budget
+    watches. observe() is the hot path; snapshot()/prometheus() merge shards.
+    """
+
+    def __init__(self, window_secs: float = 60.0, slots: int = 6, alpha: float = 0.02,
+                 warn_at: float = 0.8, poll_secs: float = 0.5):
+        self.window_secs, self.slots, self.alpha = float(window_secs), int(slots), alpha
+        self.warn_at, self.poll_secs = warn_at, poll_secs
+        self._per_slot = self.slots / self.window_secs      # slots per second
+        self._inv_lg = 1.0 / math.log((1 + alpha) / (1 - alpha))   # QuantileSketch bucket scale
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[_Shard] = []
+        self._retired: Dict[str, tuple] = {}   # run_name -> (base totals, {slot: _Slot}) of finished threads
+        self._watches: Dict[int, _Watch] = {}
+        self._keys = itertools.count(1)
+        self._alerts = {"warn": {}, "exceeded": {}}   # level -> run_name -> count
+        self.recent_alerts: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self._callbacks: List[Callable[[Dict[str, Any]], None]] = []
+        self._watchdog: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+
+    # -- hot path ---------------------------------------------------------
+
+    def observe(self, run_name: str, latency_ms: float, energy_kwh: float, weight: float = 1,
+                exceeded: bool = False) -> None:
+        """Record one finished call (weight: calls it stands for)."""
+        try:
+            sh = self._local.shards[run_name]
+        except (AttributeError, KeyError):
+            sh = self._new_shard(run_name)
+        if _monotonic() >= sh.until:
+            self._rotate(sh)
+        c = sh.cur
+        c.n += weight
+        c.lat_sum += latency_ms * weight
+        c.kwh += energy_kwh * weight
+        if exceeded:
+            c.exceeded += weight
+        # QuantileSketch.add, inlined: this runs on every tracked call
+        inv = self._inv_lg
+        if latency_ms > 0:
+            b = c.lat.buckets
+            k = _ceil(_log(latency_ms) * inv)
+            b[k] = b.get(k, 0) + weight
+        else:
+            c.lat.zeros += weight
+        if energy_kwh > 0:
+            b = c.wh.buckets
+            k = _ceil(_log(energy_kwh * 1000.0) * inv)
+            b[k] = b.get(k, 0) + weight
+        else:
+            c.wh.zeros += weight
+
+    def _rotate(self, sh: _Shard) -> None:
+        slot = int(_monotonic() * self._per_slot)
+        sh.seq += 1
+        old = sh.cur
+        if old.n:
+            sh.closed.append(old)
+            b = sh.base
+            b[0] += old.n
+            b[1] += old.lat_sum
+            b[2] += old.kwh
+            b[3] += old.exceeded
+        sh.cur = _Slot(slot, self.alpha)
+        sh.until = (slot + 1) / self._per_slot
+        sh.seq += 1
+
+    def _new_shard(self, run_name: str) -> _Shard:
+        shards = getattr(self._local, "shards", None)
+        if shards is None:
+            shards = self._local.shards = {}
+        sh = shards[run_name] = _Shard(run_name, self.slots, self.alpha, threading.current_thread())
+        with self._lock:
+            self._shards.append(sh)
+        return sh
+
+    # -- reading ----------------------------------------------------------
+
+    @staticmethod
+    def _read(sh: _Shard):
+        """(base, copy of cur, closed slots) as of one moment between rotations."""
+        while True:
+            seq = sh.seq
+            if not seq & 1:
+                base, cur, closed = list(sh.base), sh.cur.copy(), list(sh.closed)
+                if sh.seq == seq:
+                    return base, cur, closed
+            time.sleep(0)
+
+    def _fold(self, sh: _Shard, oldest: int) -> None:
+        """Merge a finished thread's shard into its run's retired totals (caller holds _lock)."""
+        base, slots = self._retired.setdefault(sh.run_name, ([0.0, 0.0, 0.0, 0.0], {}))
+        cur = sh.cur
+        for i, v in enumerate((cur.n, cur.lat_sum, cur.kwh, cur.exceeded)):
+            base[i] += sh.base[i] + v
+        for sl in (cur, *sh.closed):
+            if sl.n and sl.slot >= oldest:
+                slots.setdefault(sl.slot, _Slot(sl.slot, self.alpha)).merge(sl)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per run_name: cumulative totals and this window's count, energy and quantile sketches."""
+        oldest = int(_monotonic() * self._per_slot) - self.slots + 1
+        with self._lock:
+            live = []
+            for sh in self._shards:
+                if sh.owner.is_alive():
+                    live.append(sh)
+                else:
+                    self._fold(sh, oldest)
+            self._shards = live
+            retired = []
+            for run_name, (base, slots) in self._retired.items():
+                for k in [k for k in slots if k < oldest]:
+                    del slots[k]
+                retired.append((run_name, list(base), None, list(slots.values())))
+        parts = retired
+        for sh in live:
+            base, cur, closed = self._read(sh)
+            parts.append((sh.run_name, base, cur, [cur, *closed]))
+        out: Dict[str, Dict[str, Any]] = {}
+        for run_name, base, cur, window in parts:
+            s = out.get(run_name)
+            if s is None:
+                s = out[run_name] = {"calls": 0.0, "latency_ms_sum": 0.0, "energy_kwh": 0.0, "exceeded": 0.0,
+                                     "window_calls": 0.0, "window_energy_kwh": 0.0,
+                                     "latency_ms": QuantileSketch(self.alpha), "energy_wh": QuantileSketch(self.alpha)}
+            if cur is not None:   # a live shard's open slot is not in its base yet
+                base = [b + v for b, v in zip(base, (cur.n, cur.lat_sum, cur.kwh, cur.exceeded))]
+            s["calls"] += base[0]
+            s["latency_ms_sum"] += base[1]
+            s["energy_kwh"] += base[2]
+            s["exceeded"] += base[3]
+            for sl in window:
+                if sl.slot >= oldest:
+                    s["window_calls"] += sl.n
+                    s["window_energy_kwh"] += sl.kwh
+                    s["latency_ms"].merge(sl.lat)
+                    s["energy_wh"].merge(sl.wh)
+        return out
+
+    # -- live budgets -----------------------------------------------------
+
+    def on_alert(self, fn: Callable[[Dict[str, Any]], None]) -> None:
+        """Call fn(alert) for every budget alert (besides the log warning)."""
+        self._callbacks.append(fn)
+
+    def watch(self, run_name: str, budget_wh: float, energy_fn: Callable[[], float],
+              run_id: Optional[str] = None) -> _Watch:
+        """Watch a running call; energy_fn() returns its kWh so far. close() the result when it ends."""
+        w = _Watch(self, next(self._keys), run_name, run_id, float(budget_wh), energy_fn)
+        with self._lock:
+            self._watches[w.key] = w
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watch_loop, name="carbonwise-budget", daemon=True)
+                self._watchdog.start()
+        return w
+
+    def _unwatch(self, w: _Watch) -> None:
+        with self._lock:
+            self._watches.pop(w.key, None)
+
+    def _watch_loop(self) -> None:
+        while not self._wake.wait(self.poll_secs):
+            self.check_budgets()
+
+    def check_budgets(self) -> List[Dict[str, Any]]:
+        """Poll every watched call once; returns the alerts raised."""
+        with self._lock:
+            watches = list(self._watches.values())
+        raised = []
+        for w in watches:
+            try:
+                wh = w.energy_fn() * 1000.0
+            except Exception:
+                continue
+            w.ratio = wh / w.budget_wh if w.budget_wh > 0 else math.inf
+            level = 2 if w.ratio > 1.0 else 1 if w.ratio >= self.warn_at else 0
+            if level > w.level:
+                w.level = level
+                raised.append(self._alert(w, "exceeded" if level == 2 else "warn", wh))
+        return raised
+
+    def _alert(self, w: _Watch, level: str, wh: float) -> Dict[str, Any]:
+        alert = {"level": level, "run_name": w.run_name, "run_id": w.run_id, "energy_wh": round(wh, 6),
+                 "budget_wh": w.budget_wh, "elapsed_s": round(time.monotonic() - w.t0, 3),
+                 "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        with self._lock:
+            counts = self._alerts[level]
+            counts[w.run_name] = counts.get(w.run_name, 0) + 1
+            self.recent_alerts.append(alert)
+        log.warning("carbon budget %s: %s (%s) at %.3f of %.3f Wh after %.1f s", level, w.run_name,
+                    w.run_id or "-", wh, w.budget_wh, alert["elapsed_s"])
+        for fn in list(self._callbacks):
+            try:
+                fn(alert)
+            except Exception:
+                log.exception("budget alert callback failed")
+        return alert
+
+    def close(self) -> None:
+        self._wake.set()
+
+    # -- exposition -------------------------------------------------------
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        snap = self.snapshot()
+        with self._lock:
+            watches = list(self._watches.values())
+            alerts = {lvl: dict(c) for lvl, c in self._alerts.items()}
+        runs = sorted(snap)
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_: str) -> None:
+            lines.append(f"# HELP {name} {help_}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def sample(name: str, labels: Dict[str, Any], value: float) -> None:
+            lab = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{lab}}} {_num(value)}" if lab else f"{name} {_num(value)}")
+
+        for name, key, help_ in (("cw_calls_total", "calls", "Tracked calls."),
+                                 ("cw_energy_kwh_total", "energy_kwh", "Energy attributed to tracked calls."),
+                                 ("cw_budget_exceeded_total", "exceeded", "Calls that finished over carbon_budget_wh.")):
+            family(name, "counter", help_)
+            for r in runs:
+                sample(name, {"run_name": r}, snap[r][key])
+        win = f"over the last {self.window_secs:g} s"
+        for name, key, total, scale, help_ in (("cw_latency_ms", "latency_ms", "latency_ms_sum", 1.0, "Call latency"),
+                                               ("cw_energy_wh", "energy_wh", "energy_kwh", 1000.0, "Energy per call")):
+            family(name, "summary", f"{help_}; quantiles {win}.")
+            for r in runs:
+                s = snap[r]
+                if s[key].count:
+                    for q in QUANTILES:
+                        sample(name, {"run_name": r, "quantile": q}, s[key].quantile(q))
+                sample(f"{name}_sum", {"run_name": r}, s[total] * scale)
+                sample(f"{name}_count", {"run_name": r}, s["calls"])
+        family("cw_window_calls", "gauge", f"Tracked calls {win}.")
+        for r in runs:
+            sample("cw_window_calls", {"run_name": r}, snap[r]["window_calls"])
+        family("cw_window_energy_wh", "gauge", f"Energy of tracked calls {win}.")
+        for r in runs:
+            sample("cw_window_energy_wh", {"run_name": r}, snap[r]["window_energy_kwh"] * 1000.0)
+
+        family("cw_runs_in_progress", "gauge", "Running calls with a carbon budget.")
+        family("cw_budget_used_ratio", "gauge", "Largest energy-so-far / budget among running calls.")
+        by_run: Dict[str, List[_Watch]] = {}
+        for w in watches:
+            by_run.setdefault(w.run_name, []).append(w)
+        for r in sorted(by_run):
+            sample("cw_runs_in_progress", {"run_name": r}, len(by_run[r]))
+        for r in sorted(by_run):
+            sample("cw_budget_used_ratio", {"run_name": r}, max(w.ratio for w in by_run[r]))
+        family("cw_budget_alerts_total", "counter", f"Budget alerts on running calls (warn at {self.warn_at:g}).")
+        for lvl in ("warn", "exceeded"):
+            for r in sorted(alerts[lvl]):
+                sample("cw_budget_alerts_total", {"run_name": r, "level": lvl}, alerts[lvl][r])
+        return "\n".join(lines) + "\n"
+
+def _escape(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _num(v: float) -> str:
+    if v != v:
+        return "NaN"
+    if v in (math.inf, -math.inf):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+def serve(registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+    """Serve GET /metrics from a daemon thread; returns the server (port 0 picks a free one)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                body, status, ctype = b"not found\n", 404, "text/plain; charset=utf-8"
+            else:
+                body, status, ctype = (registry.prometheus().encode("utf-8"), 200,
+                                       "text/plain; version=0.0.4; charset=utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="carbonwise-metrics", daemon=True).start()
+    return srv
+
+def metrics_from_env() -> Optional[MetricsRegistry]:
+    """CARBONWISE_METRICS_PORT=9464 serves /metrics ([host:]port); CARBONWISE_METRICS=1 only keeps the registry."""
+    spec = os.environ.get("CARBONWISE_METRICS_PORT", "")
+    if not spec and os.environ.get("CARBONWISE_METRICS", "").lower() not in ("1", "true", "yes"):
+        return None
+    reg = MetricsRegistry(window_secs=float(os.environ.get("CARBONWISE_METRICS_WINDOW", "60")))
+    if spec:
+        host, _, port = spec.rpartition(":")
+        serve(reg, host or "127.0.0.1", int(port))
+    return reg
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=9464)
+    ap.add_argument("--demo", action="store_true", help="run tracked demo calls with a small budget")
+    ap.add_argument("--window", type=float, default=60.0, help="rolling window, seconds")
+    args = ap.parse_args()
+
+    import tracker
+    reg = MetricsRegistry(window_secs=args.window)
+    tracker.set_metrics(reg)
+    srv = serve(reg, port=args.port)
+    print(f"metrics on http://127.0.0.1:{srv.server_address[1]}/metrics")
+    if not args.demo:
+        threading.Event().wait()
+    from cw_bench import cpu_burn
+    # ~85 W x 2 s = 0.047 Wh per call: warns at ~1 s, exceeds at ~1.3 s, while the call still runs
+    demo = tracker.track("metrics_demo", shared=True, carbon_budget_wh=0.03, energy_backend="cputdp")(cpu_burn)
+    try:
+        while True:
+            demo(2.0)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,283 @@
 # region_advisor.py
 # Usage:
 #   python region_advisor.py --current eu-west-1 --energy_kwh 0.92 --table region_factors.json
+#   python region_advisor.py --current eu-west-1 --energy_kwh 0.92 --series grid/ --at 2025-11-08T13:00:00Z --hours 2
+#   python region_advisor.py --log run_log.jsonl --series grid/ --max_delay_h 12 --out plan.csv
+#   python region_advisor.py --jobs jobs.csv --series grid/ --max_latency_ms 60 --max_cost_increase_pct 10
+# With --series (hourly CSV/Parquet, see grid_intensity.py) regions are compared
+# at the run's time, averaged over its duration; regions without a series keep
+# their table value.
+# Batch mode (--log / --jobs) places every job in the region and start slot
+# (up to --max_delay_h later) with the least CO2e, vectorized over
+# jobs x regions x slots, and reports the projected savings. Optional table
+# fields per region: eur_per_kwh (cost constraint) and latency_ms.
 
-import json, argparse
+import csv, json, argparse, math, os
+from datetime import datetime, timezone
+import numpy as np
+from grid_intensity import GridIntensity, parse_ts
 
 def load_table(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def intensities_over(tbl, grid, t0, t1):
+    """region -> gCO2/kWh averaged over epoch [t0, t1] where `grid` has a series, else the table value."""
+    out = {}
+    for r in tbl:
+        g = grid.mean(r["region"], t0, t1) if grid is not None else None
+        out[r["region"]] = float(r["gco2_per_kwh"]) if g is None else g
+    return out
+
+def greener_regions(tbl, current, energy_kwh, intensities=None):
+    """
+    Regions cleaner than `current`, greenest first: (region, display_name, gCO2/kWh, % saved, kg saved).
+    `intensities` (region -> gCO2/kWh, e.g. from intensities_over) overrides the table values.
+    """
+    g_of = intensities or {r["region"]: float(r["gco2_per_kwh"]) for r in tbl}
+    reg = {r["region"]: r for r in tbl}
+    if current not in reg:
+        return None
+    cur_g = g_of[current]
+    rows = []
+    for r in tbl:
+        g = g_of[r["region"]]
+        if g < cur_g:
+            saved = (cur_g - g) / cur_g
+            saved_kg = energy_kwh * (cur_g - g) / 1000.0
+            rows.append((r["region"], r["display_name"], g, saved*100.0, saved_kg))
+    rows.sort(key=lambda x: x[2])
+    return rows
+
+# ---------------------------------------------------------------------------
+# Batch mode
+
+LOG_COLUMNS = ["run_id", "run_name", "kind", "ts", "energy_kwh", "latency_ms", "sample_weight", "meta"]
+
+def _jobs(labels, energy, start, duration_h, regions, max_delay_h, tbl):
+    index = {r["region"]: i for i, r in enumerate(tbl)}
+    return {
+        "label": labels,
+        "energy_kwh": np.asarray(energy, dtype=float),
+        "start": np.asarray(start, dtype=float),
+        "duration_h": np.asarray(duration_h, dtype=float),
+        "region": np.array([index.get(r, -1) for r in regions], dtype=np.intp),
+        "max_delay_h": np.asarray(max_delay_h, dtype=float),
+    }
+
+def jobs_from_log(path, tbl, current=None, max_delay_h=24.0):
+    """Jobs from a run log (JSONL/.cwcol/Parquet): energy x sample_weight, start = ts - latency, meta.region."""
+    from runstore import iter_records
+    labels, energy, start, dur, regions = [], [], [], [], []
+    for r in iter_records(path, LOG_COLUMNS):
+        if r.get("kind") == "span" or r.get("energy_kwh") is None or not r.get("ts"):
+            continue
+        lat_h = float(r.get("latency_ms") or 0.0) / 3.6e6
+        meta = r.get("meta") if isinstance(r.get("meta"), dict) else {}
+        labels.append(r.get("run_id") or r.get("run_name") or str(len(labels)))
+        energy.append(float(r["energy_kwh"]) * float(r.get("sample_weight") or 1.0))
+        start.append(parse_ts(r["ts"]) - lat_h * 3600)
+        dur.append(lat_h)
+        regions.append(str(meta.get("region") or meta.get("cloud_region") or current or "").lower())
+    return _jobs(labels, energy, start, dur, regions, [max_delay_h] * len(labels), tbl)
+
+def jobs_from_csv(path, tbl, current=None, max_delay_h=24.0):
+    """
+    Planned jobs: energy_kwh, duration_h, and optionally start (ISO/epoch,
+    default now), region (default --current), max_delay_h, job.
+    """
+    now = datetime.now(timezone.utc).timestamp()
+    labels, energy, start, dur, regions, delay = [], [], [], [], [], []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            labels.append(row.get("job") or str(i))
+            energy.append(float(row["energy_kwh"]))
+            dur.append(float(row.get("duration_h") or 0.0))
+            start.append(parse_ts(row["start"]) if row.get("start") else now)
+            regions.append((row.get("region") or current or "").lower())
+            delay.append(float(row["max_delay_h"]) if row.get("max_delay_h") else max_delay_h)
+    return _jobs(labels, energy, start, dur, regions, delay, tbl)
+
+def hourly_matrix(tbl, grid, t0, hours):
+    """(regions x hours) gCO2/kWh from `t0` on: the series where there is one, else the table constant."""
+    times = t0 + 3600.0 * np.arange(hours)
+    out = np.empty((len(tbl), hours))
+    for k, r in enumerate(tbl):
+        s = grid.get(r["region"]) if grid is not None else None
+        out[k] = s.at_many(times) if s is not None else float(r["gco2_per_kwh"])
+    return out
+
+def plan_batch(jobs, tbl, grid=None, slot_h=1.0, max_latency_ms=None, max_cost_increase_pct=None,
+               kwh_eur=0.25, chunk_cells=250_000):
+    """
+    Least-CO2e (region, start slot) per job. Slot s starts s * slot_h hours
+    after the job's own start, up to its max_delay_h; the job's energy is
+    charged at the region's mean intensity over [start, start + duration]
+    (exact for the hourly step function, via prefix sums). Regions over
+    `max_latency_ms`, or pricier than the job's current region by more than
+    `max_cost_increase_pct`, are excluded, except the current one.
+    Returns per-job arrays: baseline/best kg, best region index, delay_h,
+    plus region-only and time-only optima. Jobs whose current region is not
+    in the table get region -1 and NaN baselines.
+    """
+    n, R = len(jobs["energy_kwh"]), len(tbl)
+    S = int(math.floor(float(jobs["max_delay_h"].max(initial=0.0)) / slot_h + 1e-9)) + 1
+    offs = np.arange(S) * slot_h
+    t0 = math.floor(jobs["start"].min() / 3600.0) * 3600.0 if n else 0.0   # hour of the earliest job
+    H = int(math.ceil((jobs["start"].max(initial=t0) - t0) / 3600.0 + offs[-1] + jobs["duration_h"].max(initial=0.0))) + 2
+    I = hourly_matrix(tbl, grid, t0, H)
+    # Integral of the step function up to hour position x (i = floor(x)):
+    # C[i] + (x - i) * I[i]. Intervals are measured from their start hour
+    # (below), so short jobs do not lose digits to the absolute hour offset.
+    C = np.zeros((R, H))
+    np.cumsum(I[:, :-1], axis=1, out=C[:, 1:])
+
+    price = np.array([float(r.get("eur_per_kwh", kwh_eur)) for r in tbl])
+    lat_ok = np.array([max_latency_ms is None or float(r.get("latency_ms", 0.0)) <= max_latency_ms for r in tbl])
+
+    out = {k: np.full(n, np.nan) for k in ("baseline_kg", "best_kg", "region_only_kg", "time_only_kg", "delay_h")}
+    out["best_region"] = np.full(n, -1, dtype=np.intp)
+    step = max(1, chunk_cells // (R * S))
+    for a in range(0, n, step):
+        b = min(n, a + step)
+        m = b - a
+        e = jobs["energy_kwh"][a:b]
+        d = jobs["duration_h"][a:b, None]
+        cur = jobs["region"][a:b]
+        xs = (jobs["start"][a:b, None] - t0) / 3600.0 + offs[None, :]      # (m, S) hour positions
+        i0 = np.minimum(xs.astype(np.intp), H - 1)
+        u = xs - i0                                                         # start, from hour i0
+        ue = u + d                                                          # end, from hour i0
+        i1 = np.minimum(i0 + ue.astype(np.intp), H - 1)
+        # kg = e / 1000 * (integral(end) - integral(start)) / d, built in place: (R, m, S)
+        kg = I[:, i1]
+        kg *= ue - (i1 - i0)
+        kg += C[:, i1]
+        kg -= C[:, i0]                                                      # 0 within one hour
+        start = I[:, i0]
+        point = d[:, 0] <= 0
+        at_start = start[:, point, :] * (e[point, None] / 1000.0)        # zero-length jobs
+        start *= u
+        kg -= start
+        with np.errstate(divide="ignore", invalid="ignore"):
+            kg *= np.where(point, 0.0, e / 1000.0 / d[:, 0])[:, None]
+        kg[:, point, :] = at_start
+        del start
+
+        known = cur >= 0
+        ok = np.broadcast_to(lat_ok, (m, R)).copy()                         # (m, R) allowed regions
+        if max_cost_increase_pct is not None:
+            cap = np.where(known, price[cur], np.inf) * (1 + max_cost_increase_pct / 100.0)
+            ok &= price[None, :] <= cap[:, None]
+        ok[np.flatnonzero(known), cur[known]] = True
+        kg[~ok.T] = np.inf
+        kg[:, offs[None, :] > jobs["max_delay_h"][a:b, None] + 1e-9] = np.inf
+
+        flat = kg.transpose(1, 0, 2).reshape(m, R * S)
+        k = flat.argmin(axis=1)
+        rows = np.arange(m)
+        out["best_kg"][a:b] = flat[rows, k]
+        out["best_region"][a:b] = k // S
+        out["delay_h"][a:b] = offs[k % S]
+        out["region_only_kg"][a:b] = kg[:, rows, 0].min(axis=0)
+        cur_k = np.where(known, cur, 0)
+        base = kg[cur_k, rows, 0]
+        time_only = kg[cur_k, rows, :].min(axis=1)
+        out["baseline_kg"][a:b] = np.where(known, base, np.nan)
+        out["time_only_kg"][a:b] = np.where(known, time_only, np.nan)
+    out["baseline_eur"] = jobs["energy_kwh"] * np.where(jobs["region"] >= 0, price[jobs["region"]], np.nan)
+    out["best_eur"] = jobs["energy_kwh"] * price[out["best_region"]]
+    return out
+
+def print_plan(plan, jobs, tbl):
+    placed = ~np.isnan(plan["baseline_kg"])
+    n, k = len(placed), int(placed.sum())
+    base = float(plan["baseline_kg"][placed].sum())
+    print(f"Jobs: {n} ({n - k} skipped: current region not in table)" if n > k else f"Jobs: {n}")
+    if not k:
+        return
+    def line(label, key):
+        v = float(plan[key][placed].sum())
+        pct = 100.0 * (base - v) / base if base > 0 else 0.0
+        print(f"- {label}: {v:.3f} kg CO₂e (−{base - v:.3f} kg, {pct:.1f}%)")
+    print(f"Baseline (current region, as scheduled): {base:.3f} kg CO₂e")
+    line("Best region, same start", "region_only_kg")
+    line("Same region, best start", "time_only_kg")
+    line("Best region and start", "best_kg")
+    cost0, cost1 = float(plan["baseline_eur"][placed].sum()), float(plan["best_eur"][placed].sum())
+    print(f"Energy cost: €{cost0:.2f} → €{cost1:.2f}")
+    moved = placed & (plan["best_region"] != jobs["region"])
+    delayed = placed & (plan["delay_h"] > 0)
+    print(f"Moved: {int(moved.sum())} jobs, delayed: {int(delayed.sum())} jobs "
+          f"(mean delay {float(plan['delay_h'][delayed].mean()) if delayed.any() else 0.0:.1f} h)")
+    saved = plan["baseline_kg"] - plan["best_kg"]
+    print("Top destinations:")
+    for idx in np.argsort(-np.bincount(plan["best_region"][placed], weights=saved[placed], minlength=len(tbl)))[:10]:
+        sel = placed & (plan["best_region"] == idx)
+        if not sel.any():
+            continue
+        r = tbl[idx]
+        print(f"- {r.get('display_name', r['region'])} ({r['region']}): {int(sel.sum())} jobs, "
+              f"{float(saved[sel].sum()):.3f} kg saved")
+
+def write_plan(path, plan, jobs, tbl):
+    names = [r["region"] for r in tbl]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["job", "region", "best_region", "delay_h", "baseline_kg", "best_kg"])
+        for j in range(len(jobs["label"])):
+            cur, best = jobs["region"][j], plan["best_region"][j]
+            w.writerow([jobs["label"][j], names[cur] if cur >= 0 else "", names[best] if best >= 0 else "",
+                        plan["delay_h"][j], f"{plan['baseline_kg'][j]:.9g}", f"{plan['best_kg'][j]:.9g}"])
+
+def batch_main(args, tbl):
+    grid = GridIntensity.load(args.series) if args.series else None
+    load = jobs_from_log if args.log else jobs_from_csv
+    jobs = load(args.log or args.jobs, tbl, (args.current or "").lower() or None, args.max_delay_h)
+    if not len(jobs["label"]):
+        print("No jobs.")
+        return
+    plan = plan_batch(jobs, tbl, grid, args.slot_h, args.max_latency_ms, args.max_cost_increase_pct,
+                      float(os.getenv("CARBONWISE_KWH_EUR", "0.25")))
+    print_plan(plan, jobs, tbl)
+    if args.out:
+        write_plan(args.out, plan, jobs, tbl)
+        print(f"Wrote {args.out}")
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--current", required=True, help="region id (e.g., eu-west-1)")
-    ap.add_argument("--energy_kwh", type=float, required=True, help="energy of your run")
+    ap.add_argument("--current", help="region id (e.g., eu-west-1); in batch mode, for jobs without one")
+    ap.add_argument("--energy_kwh", type=float, help="energy of your run")
     ap.add_argument("--table", default="region_factors.json")
+    ap.add_argument("--series", nargs="+", help="hourly grid intensity CSV/Parquet files or directories")
+    ap.add_argument("--at", help="run start, ISO time or epoch seconds (default now; needs --series)")
+    ap.add_argument("--hours", type=float, default=0.0, help="run duration to average intensity over")
+    ap.add_argument("--log", help="batch: plan every run in this log")
+    ap.add_argument("--jobs", help="batch: plan jobs from a CSV (energy_kwh, duration_h[, start, region, max_delay_h, job])")
+    ap.add_argument("--max_delay_h", type=float, default=24.0, help="batch: latest start shift per job")
+    ap.add_argument("--slot_h", type=float, default=1.0, help="batch: start slot granularity")
+    ap.add_argument("--max_latency_ms", type=float, help="batch: exclude regions whose latency_ms is higher")
+    ap.add_argument("--max_cost_increase_pct", type=float, help="batch: max energy price increase vs current region")
+    ap.add_argument("--out", help="batch: per-job plan CSV")
     args = ap.parse_args()
 
     tbl = load_table(args.table)
-    reg = {r["region"]: r for r in tbl}
-    if args.current not in reg:
+    if args.log or args.jobs:
+        batch_main(args, tbl)
+        return
+    if not args.current or args.energy_kwh is None:
+        ap.error("--current and --energy_kwh are required (or use --log / --jobs)")
+    intensities, when = None, ""
+    if args.series:
+        t0 = parse_ts(args.at) if args.at else datetime.now(timezone.utc).timestamp()
+        intensities = intensities_over(tbl, GridIntensity.load(args.series), t0, t0 + args.hours * 3600)
+        when = f" at {datetime.fromtimestamp(t0, timezone.utc):%Y-%m-%d %H:%M} UTC"
+    rows = greener_regions(tbl, args.current, args.energy_kwh, intensities)
+    if rows is None:
         print(f"Current region {args.current} not in table.")
         return
 
-    cur = reg[args.current]
-    cur_g = float(cur["gco2_per_kwh"])
-    rows = []
-    for r in tbl:
-        g = float(r["gco2_per_kwh"])
-        if g < cur_g:
-            saved = (cur_g - g) / cur_g
-            saved_kg = args.energy_kwh * (cur_g - g) / 1000.0
-            rows.append((r["region"], r["display_name"], g, saved*100.0, saved_kg))
-    rows.sort(key=lambda x: x[2])
-    print("Top greener regions (by gCO2/kWh):")
+    print(f"Top greener regions (by gCO2/kWh{when}):")
     for region, name, g, pct, kg in rows[:3]:
         print(f"- {name} ({region}): {g:.0f} gCO2/kWh → ~{pct:.1f}% less CO₂e (≈ {kg:.3f} kg saved for {args.energy_kwh:.2f} kWh)")
 
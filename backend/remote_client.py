@@ -0,0 +1,196 @@
+# remote_client.py
+# Client for remote inference over HTTP (Hathora / OpenAI-style chat
+# completion endpoints). It keeps one keep-alive connection pool per client
+# and fans batches out over a bounded thread pool (`concurrency` requests in
+# flight, never more pooled connections). Connection errors, timeouts and
+# 429/5xx answers are retried with capped, jittered exponential backoff,
+# honouring Retry-After. Every request is its own tracked call on the shared
+# session, so overlapping requests split the process's energy. Its record
+# adds the fields below, which separate waiting on the server from reading
+# the answer:
+#   ttfb_ms      send -> response headers, last attempt (network + remote compute)
+#   latency_ms   whole call, including retries and backoff
+#   bytes_out / bytes_in   request body / response body as read off the wire
+#   status, attempts, backoff_ms, error
+# Usage:
+#   python stub_inference_server.py --port 8080 &
+#   python remote_client.py --url http://127.0.0.1:8080/v1/chat/completions --concurrency 8 "prompt 1" "prompt 2"
+
+import argparse, json, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from tracker import annotate, track
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# transport failures worth another attempt; any other RequestException (bad URL,
+# redirect loop, undecodable body) is recorded and returned at once
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+class Reply:
+    """Outcome of one request; `error` is set (and `body` may be empty) when it failed for good."""
+
+    __slots__ = ("status", "body", "ttfb_ms", "latency_ms", "bytes_out", "bytes_in", "attempts", "error")
+
+    def __init__(self, status: Optional[int], body: bytes, ttfb_ms: Optional[float], latency_ms: float,
+                 bytes_out: int, bytes_in: int, attempts: int, error: Optional[str] = None):
+        self.status, self.body, self.ttfb_ms, self.latency_ms = status, body, ttfb_ms, latency_ms
+        self.bytes_out, self.bytes_in, self.attempts, self.error = bytes_out, bytes_in, attempts, error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def text(self) -> str:
+        """First choice's message content of a chat completion ('' if absent)."""
+        try:
+            return self.json().get("choices", [{}])[0].get("message", {}).get("content", "") or ""
+        except (ValueError, AttributeError, IndexError):
+            return ""
+
+def chat_payload(prompt: str, max_tokens: int = 128, temperature: float = 0.7, **extra: Any) -> Dict[str, Any]:
+    return {"messages": [{"role": "user", "content": prompt}], "max_tokens": max_tokens,
+            "temperature": temperature, **extra}
+
+class InferenceClient:
+    """
+    Pooled, bounded-concurrency client for one endpoint:
+
+        with InferenceClient(url, token, concurrency=8, meta={"region": "eu-west-1"}) as client:
+            replies = client.map(chat_payload(p) for p in prompts)
+
+    Each thread gets its own requests.Session, all mounted on one HTTPAdapter,
+    so they share the connection pool (pool_block: at most `concurrency` open
+    connections). Records are written as run `run_name` through tracker.track.
+    """
+
+    def __init__(self, url: str, token: Optional[str] = None, *, concurrency: int = 8, timeout: float = 30.0,
+                 retries: int = 3, backoff_s: float = 0.2, backoff_max_s: float = 5.0, run_name: str = "remote",
+                 meta: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+                 country_iso: Optional[str] = None, energy_backend: Optional[str] = None):
+        self.url, self.timeout, self.retries = url, timeout, max(0, int(retries))
+        self.backoff_s, self.backoff_max_s = backoff_s, backoff_max_s
+        self.concurrency = max(1, int(concurrency))
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, pool_block=True, max_retries=0)
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._rnd = random.Random()
+        meta = {"source": "remote", "endpoint": urlsplit(url).netloc, "concurrency": self.concurrency, **(meta or {})}
+        self._tracked = track(run_name, requests=1, meta=meta, shared=True, country_iso=country_iso,
+                              energy_backend=energy_backend)(self._send)
+
+    def __enter__(self) -> "InferenceClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+            sessions, self._sessions = self._sessions, []
+        if pool is not None:
+            pool.shutdown(wait=True)
+        for s in sessions:
+            s.close()
+        self._adapter.close()
+
+    def _session(self) -> requests.Session:
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = requests.Session()
+            s.mount("http://", self._adapter)
+            s.mount("https://", self._adapter)
+            s.headers.update(self.headers)
+            with self._lock:
+                self._sessions.append(s)
+        return s
+
+    def _delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after is not None:
+            try:
+                return min(self.backoff_max_s, max(0.0, float(retry_after)))
+            except ValueError:
+                pass   # HTTP-date form: fall back to our own backoff
+        # "full jitter": uniform in [0, capped exponential], so retrying clients spread out
+        return self._rnd.uniform(0.0, min(self.backoff_max_s, self.backoff_s * 2 ** attempt))
+
+    def _send(self, payload: Dict[str, Any]) -> Reply:
+        body = json.dumps(payload).encode("utf-8")
+        session = self._session()
+        t_start = time.perf_counter()
+        content, bytes_in, backoff = b"", 0, 0.0
+        attempt = 0
+        while True:
+            status = ttfb_ms = error = retry_after = None   # the record describes the last attempt only
+            t0 = time.perf_counter()
+            try:
+                # stream=True returns once the headers are in: that is the first byte
+                r = session.post(self.url, data=body, stream=True, timeout=self.timeout)
+                ttfb_ms = (time.perf_counter() - t0) * 1000.0
+                content, status = r.content, r.status_code   # reading it all hands the connection back to the pool
+                bytes_in = r.raw.tell() or len(content)
+                error = None if r.ok else f"HTTP {status}"
+                retry = status in RETRY_STATUSES
+                retry_after = r.headers.get("Retry-After")
+            except requests.RequestException as e:
+                status, content, bytes_in, error = None, b"", 0, f"{type(e).__name__}: {e}"
+                retry = isinstance(e, RETRY_ERRORS)
+            attempt += 1
+            if error is None or not retry or attempt > self.retries:
+                break
+            pause = self._delay(attempt - 1, retry_after)
+            backoff += pause
+            time.sleep(pause)
+        latency_ms = (time.perf_counter() - t_start) * 1000.0
+        annotate(ttfb_ms=None if ttfb_ms is None else round(ttfb_ms, 2), bytes_out=len(body), bytes_in=bytes_in,
+                 status=status, attempts=attempt, backoff_ms=round(backoff * 1000.0, 2), error=error)
+        return Reply(status, content, ttfb_ms, latency_ms, len(body), bytes_in, attempt, error)
+
+    def request(self, payload: Dict[str, Any]) -> Reply:
+        """Send one payload from the calling thread (tracked)."""
+        return self._tracked(payload)
+
+    def map(self, payloads: Iterable[Dict[str, Any]]) -> List[Reply]:
+        """Send payloads with at most `concurrency` in flight; replies in input order."""
+        if self.concurrency == 1:
+            return [self._tracked(p) for p in payloads]
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix="cw-remote")
+            pool = self._pool
+        return list(pool.map(self._tracked, payloads))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("prompts", nargs="+")
+    ap.add_argument("--url", required=True, help="chat completions endpoint")
+    ap.add_argument("--token", help="bearer token")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--retries", type=int, default=3)
+    ap.add_argument("--max-tokens", dest="max_tokens", type=int, default=128)
+    ap.add_argument("--run-name", dest="run_name", default="remote")
+    ap.add_argument("--region", help="meta.region of the endpoint, for the grid factor")
+    args = ap.parse_args()
+
+    meta = {"region": args.region} if args.region else None
+    with InferenceClient(args.url, args.token, concurrency=args.concurrency, retries=args.retries,
+                         run_name=args.run_name, meta=meta) as client:
+        for prompt, r in zip(args.prompts, client.map(chat_payload(p, args.max_tokens) for p in args.prompts)):
+            if r.ok:
+                print(f"[{r.latency_ms:.0f}ms, ttfb {r.ttfb_ms:.0f}ms, {r.bytes_in} B] {r.text()[:80]}")
+            else:
+                print(f"[failed after {r.attempts} attempt(s)] {prompt[:40]}: {r.error}")
+
+if __name__ == "__main__":
+    main()
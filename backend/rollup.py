@@ -0,0 +1,369 @@
+# rollup.py
+# Time-windowed rollups of tracker records: per run_name and window
+# (1m / 1h / 1d) keep count, sums, min, max and quantile sketches of latency
+# and energy, persisted in a compact zip of per-run sections that answers
+# range queries without rescanning raw logs.
+# Usage:
+#   python rollup.py build run_log.jsonl --out rollups.cwroll
+#   python rollup.py build new_rows.jsonl --out rollups.cwroll --update
+#   python rollup.py query rollups.cwroll --run baseline --window 1h --since 2025-11-01 --until 2025-12-01
+
+import json, argparse, bisect, math, os, zipfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from aggregate import METRICS
+
+WINDOWS = {"1m": 60, "1h": 3600, "1d": 86400}
+SKETCH_METRICS = ("latency_ms", "energy_kwh")
+FORMAT_VERSION = 1
+# On-disk partition span per window; a query only reads partitions it overlaps.
+PARTITION_SECS = {"1m": 86400, "1h": 32 * 86400}
+
+def parse_ts(ts: Any) -> float:
+    """Tracker `ts` ('2025-11-08T13:09:05Z') or epoch seconds -> epoch seconds."""
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def fmt_ts(t: float) -> str:
+    return datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class QuantileSketch:
+    """
+    Log-bucketed sketch with relative accuracy `alpha` (DDSketch style):
+    every quantile estimate is within alpha of a true sample value, and
+    sketches merge exactly by adding bucket counts.
+    """
+
+    __slots__ = ("alpha", "_lg", "zeros", "buckets")
+
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self._lg = math.log((1 + alpha) / (1 - alpha))
+        self.zeros = 0           # values <= 0 (idle runs report 0 energy)
+        self.buckets: Dict[int, int] = {}
+
+    @property
+    def count(self) -> int:
+        return self.zeros + sum(self.buckets.values())
+
+    def add(self, x: float, n: float = 1) -> None:
+        if x <= 0:
+            self.zeros += n
+            return
+        k = math.ceil(math.log(x) / self._lg)
+        self.buckets[k] = self.buckets.get(k, 0) + n
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        self.zeros += other.zeros
+        for k, c in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + c
+        return self
+
+    def quantile(self, q: float) -> float:
+        total = self.count
+        if total == 0:
+            return 0.0
+        rank = q * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        gamma = math.exp(self._lg)
+        keys = sorted(self.buckets)
+        for k in keys:
+            seen += self.buckets[k]
+            if rank < seen:
+                break
+        return 2.0 * gamma ** k / (gamma + 1.0)   # relative midpoint of (gamma^(k-1), gamma^k]
+
+    def to_list(self) -> list:
+        keys = sorted(self.buckets)
+        return [self.zeros, keys, [self.buckets[k] for k in keys]]
+
+    @classmethod
+    def from_list(cls, d: list, alpha: float) -> "QuantileSketch":
+        s = cls(alpha)
+        s.zeros = d[0]
+        s.buckets = dict(zip(d[1], d[2]))
+        return s
+
+class Bucket:
+    """Pre-aggregated row for one (run_name, window start)."""
+
+    __slots__ = ("count", "sums", "mins", "maxs", "sketches")
+
+    def __init__(self, alpha: float):
+        self.count = 0
+        self.sums = [0.0] * len(METRICS)
+        self.mins = [math.inf] * len(METRICS)
+        self.maxs = [-math.inf] * len(METRICS)
+        self.sketches = {m: QuantileSketch(alpha) for m in SKETCH_METRICS}
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        w = rec.get("sample_weight") or 1   # sampled records stand for w calls
+        self.count += w
+        for i, m in enumerate(METRICS):
+            v = rec.get(m)
+            v = float(v) if v is not None else 0.0
+            self.sums[i] += w * v
+            if v < self.mins[i]:
+                self.mins[i] = v
+            if v > self.maxs[i]:
+                self.maxs[i] = v
+        for m, sk in self.sketches.items():
+            v = rec.get(m)
+            sk.add(float(v) if v is not None else 0.0, w)
+
+    def merge(self, other: "Bucket") -> "Bucket":
+        self.count += other.count
+        for i in range(len(METRICS)):
+            self.sums[i] += other.sums[i]
+            self.mins[i] = min(self.mins[i], other.mins[i])
+            self.maxs[i] = max(self.maxs[i], other.maxs[i])
+        for m, sk in self.sketches.items():
+            sk.merge(other.sketches[m])
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"count": self.count}
+        for i, m in enumerate(METRICS):
+            out[f"{m}_sum"] = self.sums[i]
+            out[f"{m}_mean"] = self.sums[i] / self.count if self.count else 0.0
+            out[f"{m}_min"] = self.mins[i] if self.count else None
+            out[f"{m}_max"] = self.maxs[i] if self.count else None
+        for m, sk in self.sketches.items():
+            for q in (0.5, 0.9, 0.99):
+                out[f"{m}_p{q * 100:g}"] = sk.quantile(q)
+        return out
+
+class RollupStore:
+    """
+    Buckets keyed by window -> run_name -> sorted window starts. Range
+    queries bisect the start list, and totals are assembled from the coarsest
+    windows that tile the range (days, then hours, then minutes at the edges),
+    so answering one does not depend on how many raw rows were rolled up.
+    """
+
+    def __init__(self, windows: Iterable[str] = WINDOWS, alpha: float = 0.01):
+        self.alpha = alpha
+        self.windows = list(windows)
+        self._data: Dict[str, Dict[str, Tuple[List[int], List[Bucket]]]] = {w: {} for w in self.windows}
+        self._zip: Optional[zipfile.ZipFile] = None
+        # Partitions on disk not read yet: (window, run_name) -> {partition key: member}
+        self._members: Dict[Tuple[str, str], Dict[int, str]] = {}
+
+    def _section(self, window: str, run_name: str, create: bool = False,
+                 since: Optional[float] = None, until: Optional[float] = None) -> Tuple[List[int], List[Bucket]]:
+        """Buckets of one (window, run_name), reading the on-disk partitions that overlap [since, until)."""
+        sec = self._data[window].get(run_name)
+        parts = self._members.get((window, run_name))
+        if parts:
+            if sec is None:
+                sec = self._data[window][run_name] = ([], [])
+            span = PARTITION_SECS.get(window)
+            for key in sorted(parts):
+                if span and ((until is not None and key * span >= until) or
+                             (since is not None and (key + 1) * span <= since)):
+                    continue
+                p_starts, p_buckets = self._read_section(parts.pop(key))
+                starts, buckets = sec
+                i = bisect.bisect_left(starts, p_starts[0]) if p_starts else 0
+                starts[i:i] = p_starts
+                buckets[i:i] = p_buckets
+            if not parts:
+                del self._members[(window, run_name)]
+        if sec is None:
+            sec = ([], [])
+            if create:
+                self._data[window][run_name] = sec
+        return sec
+
+    def _bucket(self, window: str, run_name: str, start: int) -> Bucket:
+        starts, buckets = self._section(window, run_name, create=True)
+        i = bisect.bisect_left(starts, start)
+        if i == len(starts) or starts[i] != start:
+            starts.insert(i, start)
+            buckets.insert(i, Bucket(self.alpha))
+        return buckets[i]
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        if "ts" not in rec or rec.get("kind") == "span":
+            return
+        t = parse_ts(rec["ts"])
+        name = rec["run_name"]
+        for w in self.windows:
+            size = WINDOWS[w]
+            self._bucket(w, name, int(t // size) * size).add(rec)
+
+    def add_all(self, records: Iterable[Dict[str, Any]]) -> "RollupStore":
+        for rec in records:
+            self.add(rec)
+        return self
+
+    def merge(self, other: "RollupStore") -> "RollupStore":
+        for w in other.windows:
+            if w not in self._data:
+                continue
+            for name in other.run_names(w):
+                starts, buckets = other._section(w, name)
+                for s, b in zip(starts, buckets):
+                    self._bucket(w, name, s).merge(b)
+        return self
+
+    def run_names(self, window: Optional[str] = None) -> List[str]:
+        w = window or self.windows[0]
+        return sorted(set(self._data[w]) | {n for (mw, n) in self._members if mw == w})
+
+    def query(self, run_name: str, window: str = "1h", since: Optional[float] = None,
+              until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Bucket rows with since <= start < until."""
+        starts, buckets = self._section(window, run_name, since=since, until=until)
+        i = 0 if since is None else bisect.bisect_left(starts, since)
+        j = len(starts) if until is None else bisect.bisect_left(starts, until)
+        return [{"run_name": run_name, "window": window, "start": fmt_ts(starts[k]), **buckets[k].summary()}
+                for k in range(i, j)]
+
+    def _plan(self, since: float, until: float) -> List[Tuple[str, float, float]]:
+        """Cover [since, until) with aligned buckets, coarsest first."""
+        order = sorted(self.windows, key=lambda w: WINDOWS[w], reverse=True)
+        plan: List[Tuple[str, float, float]] = []
+
+        def cover(lo: float, hi: float, level: int) -> None:
+            if lo >= hi:
+                return
+            w = order[level]
+            size = WINDOWS[w]
+            if level == len(order) - 1:
+                plan.append((w, lo, hi))  # finest window: edges are rounded to its buckets
+                return
+            a = math.ceil(lo / size) * size
+            b = math.floor(hi / size) * size
+            if a >= b:
+                cover(lo, hi, level + 1)
+                return
+            cover(lo, a, level + 1)
+            plan.append((w, a, b))
+            cover(b, hi, level + 1)
+
+        cover(since, until, 0)
+        return plan
+
+    def total(self, run_name: str, since: Optional[float] = None, until: Optional[float] = None,
+              window: Optional[str] = None) -> Dict[str, Any]:
+        """Everything in [since, until) merged into one summary row."""
+        if window is not None:
+            plan = [(window, since, until)]
+        elif since is None and until is None:
+            plan = [(max(self.windows, key=lambda w: WINDOWS[w]), None, None)]
+        else:
+            # Open ends are clamped to the coarsest window's bucket edges.
+            coarse = max(self.windows, key=lambda w: WINDOWS[w])
+            starts = self._section(coarse, run_name)[0]
+            if not starts:
+                plan = []
+            else:
+                lo = since if since is not None else starts[0]
+                hi = until if until is not None else starts[-1] + WINDOWS[coarse]
+                plan = self._plan(lo, hi)
+        acc = Bucket(self.alpha)
+        for w, lo, hi in plan:
+            starts, buckets = self._section(w, run_name, since=lo, until=hi)
+            i = 0 if lo is None else bisect.bisect_left(starts, lo)
+            j = len(starts) if hi is None else bisect.bisect_left(starts, hi)
+            for k in range(i, j):
+                acc.merge(buckets[k])
+        return {"run_name": run_name, **acc.summary()}
+
+    # -- persistence ---------------------------------------------------------
+    # A zip archive: manifest.json plus one deflated JSON member per
+    # (window, run_name, time partition), read only when a query touches it.
+
+    def save(self, path: str) -> None:
+        manifest = {"version": FORMAT_VERSION, "alpha": self.alpha, "metrics": list(METRICS),
+                    "sketch_metrics": list(SKETCH_METRICS), "windows": self.windows, "sections": []}
+        tmp = path + ".tmp"
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for w in self.windows:
+                span = PARTITION_SECS.get(w)
+                for name in self.run_names(w):
+                    starts, buckets = self._section(w, name)
+                    parts: Dict[int, List[int]] = {}
+                    for k, st in enumerate(starts):
+                        parts.setdefault(int(st // span) if span else 0, []).append(k)
+                    for key, idx in parts.items():
+                        member = f"s{len(manifest['sections'])}.json"
+                        manifest["sections"].append({"window": w, "run_name": name, "partition": key, "member": member})
+                        zf.writestr(member, json.dumps({
+                            "start": [starts[k] for k in idx],
+                            "count": [buckets[k].count for k in idx],
+                            "sum": [buckets[k].sums for k in idx],
+                            "min": [buckets[k].mins for k in idx],
+                            "max": [buckets[k].maxs for k in idx],
+                            "sketch": {m: [buckets[k].sketches[m].to_list() for k in idx] for m in SKETCH_METRICS},
+                        }, separators=(",", ":")))
+            zf.writestr("manifest.json", json.dumps(manifest))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RollupStore":
+        zf = zipfile.ZipFile(path)
+        manifest = json.loads(zf.read("manifest.json"))
+        if manifest.get("version") != FORMAT_VERSION or manifest["metrics"] != list(METRICS):
+            raise ValueError(f"{path}: unsupported rollup file")
+        store = cls(manifest["windows"], manifest["alpha"])
+        store._zip = zf
+        for sec in manifest["sections"]:
+            store._members.setdefault((sec["window"], sec["run_name"]), {})[sec["partition"]] = sec["member"]
+        return store
+
+    def _read_section(self, member: str) -> Tuple[List[int], List[Bucket]]:
+        col = json.loads(self._zip.read(member))
+        buckets = []
+        for k in range(len(col["start"])):
+            b = Bucket.__new__(Bucket)
+            b.count, b.sums, b.mins, b.maxs = col["count"][k], col["sum"][k], col["min"][k], col["max"][k]
+            b.sketches = {m: QuantileSketch.from_list(col["sketch"][m][k], self.alpha) for m in SKETCH_METRICS}
+            buckets.append(b)
+        return col["start"], buckets
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="roll up raw logs")
+    b.add_argument("logs", nargs="+", help="run logs (any format runstore reads)")
+    b.add_argument("--out", default="rollups.cwroll")
+    b.add_argument("--update", action="store_true", help="merge into an existing rollup file")
+    b.add_argument("--windows", default="1m,1h,1d")
+    q = sub.add_parser("query", help="query a rollup file")
+    q.add_argument("path")
+    q.add_argument("--run", required=True)
+    q.add_argument("--window", default="1h", choices=list(WINDOWS))
+    q.add_argument("--since", help="ISO time (inclusive)")
+    q.add_argument("--until", help="ISO time (exclusive)")
+    q.add_argument("--total", action="store_true", help="one merged row for the whole range (--window ignored)")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        from runstore import iter_records
+        store = RollupStore(args.windows.split(","))
+        for p in args.logs:
+            store.add_all(iter_records(p, ["run_name", "ts", "sample_weight", "kind", *METRICS]))
+        if args.update and os.path.exists(args.out):
+            store = RollupStore.load(args.out).merge(store)
+        store.save(args.out)
+        print(f"Wrote {args.out} ({os.path.getsize(args.out)} bytes)")
+    else:
+        store = RollupStore.load(args.path)
+        since = parse_ts(args.since) if args.since else None
+        until = parse_ts(args.until) if args.until else None
+        if args.total:
+            print(json.dumps(store.total(args.run, since, until), indent=2))
+        else:
+            for row in store.query(args.run, args.window, since, until):
+                print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,704 @@
+# runstore.py
+# Run-log storage: JSONL (what the tracker writes) plus a columnar format
+# for large logs and compressed segments for rotated ones (logcompact.py).
+# Readers pick the format from the file's magic bytes.
+# Usage:
+#   python runstore.py convert run_log.jsonl run_log.cwcol
+#   python runstore.py convert run_log.jsonl run_log.cwseg.gz   # .cwseg.zst needs zstandard
+#   python runstore.py convert run_log.jsonl run_log.parquet   # needs pyarrow
+#   python runstore.py info run_log.cwcol
+
+import json, argparse, gzip, mmap, os, struct, sys, zlib
+from array import array
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from envmeta import ENV_KEYS, SCHEMA_VERSION, block_id
+
+MAGIC = b"CWCOL\x00\x01\n"
+PARQUET_MAGIC = b"PAR1"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+def detect_format(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC))
+    if head == MAGIC:
+        return "cwcol"
+    if head[:4] == PARQUET_MAGIC:
+        return "parquet"
+    if head[:2] == GZIP_MAGIC or head[:4] == ZSTD_MAGIC:
+        return "cwseg"
+    return "jsonl"
+
+# ---------------------------------------------------------------------------
+# JSONL
+
+def iter_jsonl(path: str, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                yield r if columns is None else {k: r[k] for k in columns if k in r}
+
+# ---------------------------------------------------------------------------
+# Columnar (.cwcol)
+#
+# Layout: MAGIC | u64 header length | header JSON | 8-byte aligned column blobs.
+# Column kinds:
+#   f8   float64, NaN = missing          i8   int64, never missing
+#   bool int8, -1 = missing               str/json  int32 codes into a JSON
+#                                         string table, -1 = missing
+# `json` holds anything else (dicts such as `meta`, lists, mixed types) as
+# dictionary-encoded JSON text; repeated meta blocks cost 4 bytes per row.
+# None in a numeric/bool/str column is stored as missing.
+
+NAN = float("nan")
+
+class _ColBuilder:
+    def __init__(self, name: str, nrows: int):
+        self.name = name
+        self.kind: Optional[str] = None   # decided by the first non-None value
+        self.pending = nrows              # leading missing values before kind is known
+        self.data: Any = None
+        self.table: Dict[str, int] = {}
+        self.all_int = True
+
+    def _start(self, kind: str) -> None:
+        self.kind = kind
+        if kind == "f8":
+            self.data = array("d", [NAN]) * self.pending
+        elif kind == "bool":
+            self.data = array("b", [-1]) * self.pending
+        else:
+            self.data = array("i", [-1]) * self.pending
+
+    def _code(self, s: str) -> int:
+        c = self.table.get(s)
+        if c is None:
+            c = self.table[s] = len(self.table)
+        return c
+
+    def _to_json(self) -> None:
+        old_kind, old = self.kind, self.data
+        rev = {c: s for s, c in self.table.items()}
+        self.table = {}
+        self.kind = "json"
+        self.data = array("i")
+        for v in old:
+            if old_kind == "f8":
+                self.data.append(-1 if v != v else self._code(json.dumps(int(v) if self.all_int else v)))
+            elif old_kind == "bool":
+                self.data.append(-1 if v < 0 else self._code(json.dumps(bool(v))))
+            else:
+                self.data.append(-1 if v < 0 else self._code(json.dumps(rev[v])))
+
+    def add(self, v: Any) -> None:
+        if v is None:
+            if self.kind is None:
+                self.pending += 1
+            else:
+                self.missing()
+            return
+        if isinstance(v, bool):
+            kind = "bool"
+        elif isinstance(v, (int, float)):
+            kind = "f8"
+        elif isinstance(v, str):
+            kind = "str"
+        else:
+            kind = "json"
+        if self.kind is None:
+            self._start(kind)
+        elif kind != self.kind and self.kind != "json":
+            self._to_json()
+        if self.kind == "f8":
+            if not isinstance(v, int) or abs(v) > 2 ** 53:
+                self.all_int = False
+            self.data.append(float(v))
+        elif self.kind == "bool":
+            self.data.append(1 if v else 0)
+        elif self.kind == "str":
+            self.data.append(self._code(v))
+        else:
+            self.data.append(self._code(json.dumps(v, sort_keys=True)))
+
+    def missing(self) -> None:
+        if self.kind is None:
+            self.pending += 1
+        elif self.kind == "f8":
+            self.data.append(NAN)
+        else:
+            self.data.append(-1)
+
+    def finish(self):
+        """Return (kind, data bytes, string table or None)."""
+        if self.kind is None:
+            # Only None seen: keep the nulls so rows round-trip.
+            return "json", (array("i", [0]) * self.pending).tobytes(), ["null"]
+        if self.kind == "f8" and self.all_int and all(v == v for v in self.data):
+            return "i8", array("q", (int(v) for v in self.data)).tobytes(), None
+        if self.kind in ("f8", "bool"):
+            return self.kind, self.data.tobytes(), None
+        table = [None] * len(self.table)
+        for s, c in self.table.items():
+            table[c] = s
+        return self.kind, self.data.tobytes(), table
+
+def write_columnar(records: Iterable[Dict[str, Any]], path: str) -> int:
+    """Write records to a .cwcol file; returns the row count."""
+    cols: Dict[str, _ColBuilder] = {}
+    n = 0
+    for r in records:
+        for k, v in r.items():
+            b = cols.get(k)
+            if b is None:
+                b = cols[k] = _ColBuilder(k, n)
+            b.add(v)
+        if len(r) != len(cols):
+            for k, b in cols.items():
+                if k not in r:
+                    b.missing()
+        n += 1
+
+    blobs: List[bytes] = []
+    header: Dict[str, Any] = {"version": 1, "rows": n, "byteorder": sys.byteorder, "columns": []}
+    for name, b in cols.items():
+        kind, data, table = b.finish()
+        col = {"name": name, "kind": kind, "nbytes": len(data)}
+        blobs.append(data)
+        if table is not None:
+            tb = json.dumps(table).encode("utf-8")
+            col["table_nbytes"] = len(tb)
+            blobs.append(tb)
+        header["columns"].append(col)
+
+    # Offsets depend on the header size, which depends on the offsets; iterate.
+    off_guess = 0
+    while True:
+        hdr = json.dumps(header).encode("utf-8")
+        start = _align(len(MAGIC) + 8 + len(hdr))
+        if start == off_guess:
+            break
+        off_guess = start
+        pos = start
+        for col in header["columns"]:
+            col["offset"] = pos
+            pos = _align(pos + col["nbytes"])
+            if "table_nbytes" in col:
+                col["table_offset"] = pos
+                pos = _align(pos + col["table_nbytes"])
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(hdr)))
+        f.write(hdr)
+        for blob in blobs:
+            f.write(b"\x00" * (_align(f.tell()) - f.tell()))
+            f.write(blob)
+    return n
+
+def _align(x: int) -> int:
+    return (x + 7) & ~7
+
+class ColumnarLog:
+    """
+    Memory-mapped .cwcol reader. Only the byte ranges of the columns you ask
+    for are touched, so projecting `run_name` + `latency_ms` reads just those.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a CarbonWise columnar file")
+        (hlen,) = struct.unpack_from("<Q", self._mm, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(self._mm[start:start + hlen])
+        if self.header.get("byteorder", sys.byteorder) != sys.byteorder:
+            raise ValueError(f"{path}: written on a {self.header['byteorder']}-endian host")
+        self.rows = int(self.header["rows"])
+        self._cols = {c["name"]: c for c in self.header["columns"]}
+        self._tables: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __enter__(self) -> "ColumnarLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # views still exported; the mapping goes away with them
+        self._f.close()
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._cols)
+
+    def kind(self, name: str) -> str:
+        return self._cols[name]["kind"]
+
+    def raw(self, name: str) -> memoryview:
+        """Zero-copy view of a column's stored values (float64/int64/int8/int32 codes)."""
+        c = self._cols[name]
+        fmt = {"f8": "d", "i8": "q", "bool": "b", "str": "i", "json": "i"}[c["kind"]]
+        return memoryview(self._mm)[c["offset"]:c["offset"] + c["nbytes"]].cast(fmt)
+
+    def table(self, name: str) -> List[Any]:
+        """Decoded string table of a str/json column (code -> value)."""
+        t = self._tables.get(name)
+        if t is None:
+            c = self._cols[name]
+            t = json.loads(self._mm[c["table_offset"]:c["table_offset"] + c["table_nbytes"]])
+            if c["kind"] == "json":
+                t = [json.loads(s) for s in t]
+            self._tables[name] = t
+        return t
+
+    def column(self, name: str) -> Sequence[Any]:
+        """Values of one column; numeric columns come back as zero-copy views."""
+        kind = self.kind(name)
+        if kind in ("f8", "i8"):
+            return self.raw(name)
+        if kind == "bool":
+            return [None if v < 0 else bool(v) for v in self.raw(name)]
+        t = self.table(name)
+        return [None if c < 0 else t[c] for c in self.raw(name)]
+
+    def iter_rows(self, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        names = [c for c in (columns or self.names) if c in self._cols]
+        getters = []
+        for name in names:
+            kind = self.kind(name)
+            raw = self.raw(name)
+            if kind == "f8":
+                getters.append((name, raw, None, lambda v: None if v != v else v))
+            elif kind == "i8":
+                getters.append((name, raw, None, None))
+            elif kind == "bool":
+                getters.append((name, raw, None, lambda v: None if v < 0 else bool(v)))
+            else:
+                getters.append((name, raw, self.table(name), None))
+        for i in range(self.rows):
+            row = {}
+            for name, raw, table, conv in getters:
+                v = raw[i]
+                if table is not None:
+                    if v >= 0:
+                        row[name] = table[v]
+                elif conv is None:
+                    row[name] = v
+                else:
+                    v = conv(v)
+                    if v is not None:
+                        row[name] = v
+            yield row
+
+# ---------------------------------------------------------------------------
+# Parquet (optional; needs pyarrow). Dict-valued fields such as `meta` are
+# stored as JSON text so heterogeneous metadata never breaks the schema.
+
+def write_parquet(records: Iterable[Dict[str, Any]], path: str) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    rows = [{k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in r.items()} for r in records]
+    pq.write_table(pa.Table.from_pylist(rows), path)
+    return len(rows)
+
+def iter_parquet(path: str, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    import pyarrow.parquet as pq
+    pf = pq.ParquetFile(path, memory_map=True)
+    cols = None if columns is None else [c for c in columns if c in pf.schema_arrow.names]
+    for batch in pf.iter_batches(columns=cols):
+        for r in batch.to_pylist():
+            out = {}
+            for k, v in r.items():
+                if v is None:
+                    continue
+                if k == "meta" and isinstance(v, str):
+                    v = json.loads(v)
+                out[k] = v
+            yield out
+
+# ---------------------------------------------------------------------------
+# Compacted segments (.cwseg.gz, or .cwseg.zst with the zstandard package).
+#
+# A gzip/zstd stream of JSON lines, read back in one streaming pass:
+#   {"cwseg": 1, "schema_version": ..., "kwh_eur": ...}   header (first line)
+#   {"e": [env_id, block]}     env block, as in the .env.jsonl side table
+#   {"m": [n, meta]}           meta block n; records store n instead of the dict
+#   {"s": [n, keys, derived]}  shape n: a record's keys in order, and those of
+#                              them that were dropped because they recompute
+#   [v1, v2, ..., n]           record of shape n: values of the kept keys
+# Definitions precede their first use. Records are migrated to the current
+# SCHEMA_VERSION on the way in, and again on the way out if a segment was
+# written by an older version. Any other gzip/zstd stream reads as JSONL.
+
+SEGMENT_VERSION = 1
+SEGMENT_EXTS = {".cwseg.gz": "gzip", ".cwseg.zst": "zstd"}
+# €/kWh a segment prices derived cost_eur at; same default as tracker.KWH_COST
+DEFAULT_KWH_EUR = float(os.environ.get("CARBONWISE_KWH_EUR", "0.25"))
+PRE_VERSIONING = "1.0.0"   # records from before meta.schema_version was written
+
+def _derivations(kwh_eur: float) -> Dict[str, Tuple[Tuple[str, ...], Callable]]:
+    """field -> (input fields, fn): what tracker._build_record computes from the raw units."""
+    return {
+        "energy_wh": (("energy_kwh",), lambda e: round(e * 1000.0, 3)),
+        "co2e_g": (("co2e_kg",), lambda c: round(c * 1000.0, 3)),
+        "sci_wh_per_req": (("energy_kwh", "requests"), lambda e, n: round(e * 1000.0 / n, 3)),
+        "cost_eur": (("energy_kwh",), lambda e: round(e * kwh_eur, 4)),
+        "budget_exceeded": (("energy_kwh", "carbon_budget_wh"), lambda e, b: b is not None and e * 1000.0 > b),
+    }
+
+def _version_key(v: str) -> Tuple[int, ...]:
+    try:
+        return tuple(int(x) for x in v.split("."))
+    except (AttributeError, ValueError):
+        return (0,)
+
+_CURRENT = _version_key(SCHEMA_VERSION)
+
+def migrate_record(rec: Dict[str, Any], kwh_eur: float = DEFAULT_KWH_EUR
+                   ) -> Tuple[Dict[str, Any], Optional[Tuple[str, Dict[str, Any]]]]:
+    """
+    Bring a run record written by an older tracker up to SCHEMA_VERSION.
+    Returns (record, (env_id, env block) split out of it or None); records
+    already current, newer ones and span records come back unchanged.
+      < 1.1.0  add cost_eur (at kwh_eur) and the empty budget / grid fields
+      < 1.2.0  move the inline env block out of meta, leaving meta.env_id
+    Migrated meta also records `migrated_from`.
+    """
+    meta = rec.get("meta")
+    if not isinstance(meta, dict) or rec.get("kind") == "span":
+        return rec, None
+    version = meta.get("schema_version") or PRE_VERSIONING
+    if version == SCHEMA_VERSION or _version_key(version) >= _CURRENT:
+        return rec, None
+    rec = dict(rec)
+    if "schema_version" not in meta:
+        e = rec.get("energy_kwh")
+        if isinstance(e, (int, float)) and "cost_eur" not in rec:
+            rec["cost_eur"] = round(e * kwh_eur, 4)
+        rec.setdefault("carbon_budget_wh", None)
+        rec.setdefault("budget_exceeded", False)
+        rec.setdefault("grid_factor_gco2_per_kwh_used", None)
+    env = None
+    if "env_id" not in meta and "python_version" in meta:
+        block = {k: meta[k] for k in ENV_KEYS if k in meta}
+        env = (block_id(block), block)
+    # without an env block to split out, keys that share a name with env keys are the caller's own meta
+    moved = ENV_KEYS if env is not None else ("schema_version",)
+    new = {k: v for k, v in meta.items() if k not in moved}
+    new["schema_version"] = SCHEMA_VERSION
+    if env is not None:
+        new["env_id"] = env[0]
+    new["migrated_from"] = version
+    rec["meta"] = new
+    return rec, env
+
+def _same(a: Any, b: Any) -> bool:
+    return type(a) is type(b) and a == b
+
+class SegmentWriter:
+    """Streaming writer of one segment; `envs` (env_id -> block) resolves meta.env_id."""
+
+    def __init__(self, path: str, codec: str = "gzip", level: Optional[int] = None,
+                 kwh_eur: float = DEFAULT_KWH_EUR, envs: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.path, self.codec, self.kwh_eur = path, codec, kwh_eur
+        self.envs = dict(envs or {})
+        self.records = self.migrated = 0
+        self._derive = _derivations(kwh_eur)
+        self._metas: Dict[str, int] = {}
+        self._shapes: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], Tuple[int, List[str]]] = {}
+        self._env_done: set = set()
+        self._buf: List[str] = []
+        raw = open(path, "wb")
+        if codec == "zstd":
+            import zstandard
+            self._f = zstandard.ZstdCompressor(level=level or 10).stream_writer(raw, closefd=True)
+        elif codec == "gzip":
+            self._f = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=level or 9, mtime=0)
+            self._raw = raw
+        else:
+            raw.close()
+            raise ValueError(f"unknown codec {codec!r} (gzip or zstd)")
+        self._line({"cwseg": SEGMENT_VERSION, "schema_version": SCHEMA_VERSION, "kwh_eur": kwh_eur})
+
+    def _line(self, obj: Any) -> None:
+        self._buf.append(json.dumps(obj, separators=(",", ":")))
+        if len(self._buf) >= 4096:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buf:
+            self._buf.append("")
+            self._f.write("\n".join(self._buf).encode("utf-8"))
+            self._buf = []
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        new, env = migrate_record(rec, self.kwh_eur)
+        if new is not rec:
+            rec = new
+            self.migrated += 1
+        if env is not None:
+            self.envs.setdefault(*env)
+        meta = rec.get("meta")
+        if "meta" in rec:
+            if isinstance(meta, dict):
+                eid = meta.get("env_id")
+                if eid in self.envs and eid not in self._env_done:
+                    self._env_done.add(eid)
+                    self._line({"e": [eid, self.envs[eid]]})
+            key = json.dumps(meta, sort_keys=True)
+            mid = self._metas.get(key)
+            if mid is None:
+                mid = self._metas[key] = len(self._metas)
+                self._line({"m": [mid, meta]})
+        dropped = []
+        for name, (inputs, fn) in self._derive.items():
+            if name in rec and all(k in rec for k in inputs):
+                try:
+                    ok = _same(fn(*[rec[k] for k in inputs]), rec[name])
+                except (TypeError, ZeroDivisionError):
+                    ok = False
+                if ok:
+                    dropped.append(name)
+        keys = tuple(rec)
+        shape = self._shapes.get((keys, tuple(dropped)))
+        if shape is None:
+            shape = self._shapes[(keys, tuple(dropped))] = (len(self._shapes), [k for k in keys if k not in dropped])
+            self._line({"s": [shape[0], keys, dropped]})
+        vals = [mid if k == "meta" else rec[k] for k in shape[1]]
+        vals.append(shape[0])
+        self._line(vals)
+        self.records += 1
+
+    @property
+    def meta_blocks(self) -> int:
+        return len(self._metas)
+
+    @property
+    def shapes(self) -> int:
+        return len(self._shapes)
+
+    def close(self) -> int:
+        self._flush()
+        self._f.close()
+        if self.codec == "gzip":
+            self._raw.close()
+        return self.records
+
+def write_segment(records: Iterable[Dict[str, Any]], path: str, codec: Optional[str] = None, **kw: Any) -> int:
+    """Write records to a segment; the codec defaults to the one the extension names."""
+    w = SegmentWriter(path, codec or segment_codec(path), **kw)
+    try:
+        for r in records:
+            w.write(r)
+    finally:
+        n = w.close()
+    return n
+
+def segment_codec(path: str) -> str:
+    for ext, codec in SEGMENT_EXTS.items():
+        if path.endswith(ext):
+            return codec
+    return "gzip"
+
+def _chunks(path: str, size: int = 1 << 18) -> Iterator[bytes]:
+    """Decompressed bytes of a gzip or zstd file, streamed."""
+    with open(path, "rb") as f:
+        if f.read(4) == ZSTD_MAGIC:
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError(f"{path}: zstd segment, install the zstandard package to read it") from None
+            f.seek(0)
+            yield from zstandard.ZstdDecompressor().read_to_iter(f, read_size=size)
+            return
+        f.seek(0)
+        d = zlib.decompressobj(wbits=31)
+        while True:
+            buf = f.read(size)
+            if not buf:
+                break
+            while buf:
+                yield d.decompress(buf)
+                buf = b""
+                if d.eof:   # concatenated gzip members
+                    buf = d.unused_data
+                    d = zlib.decompressobj(wbits=31)
+
+def iter_lines(path: str) -> Iterator[str]:
+    """Text lines of a gzip or zstd file, decompressed as they are read."""
+    rest = b""
+    for chunk in _chunks(path):
+        chunk = rest + chunk
+        cut = chunk.rfind(b"\n") + 1
+        rest = chunk[cut:]
+        if cut:
+            yield from chunk[:cut - 1].decode("utf-8").split("\n")
+    if rest:
+        yield rest.decode("utf-8")
+
+def _decoder(keys: Sequence[str], dropped: Sequence[str], columns: Optional[Sequence[str]],
+             metas: List[Any], derive: Dict[str, Tuple[Tuple[str, ...], Callable]]) -> Callable:
+    """Build the list -> dict function for one shape, projected to `columns`."""
+    kept = [k for k in keys if k not in dropped]
+    pos = {k: i for i, k in enumerate(kept)}
+    specs = []   # (name, fn, index of 1st input, of 2nd or -1)
+    for name in dropped:
+        if columns is not None and name not in columns:
+            continue
+        inputs, fn = derive[name]
+        idx = [pos[k] for k in inputs]
+        specs.append((name, fn, idx[0], idx[1] if len(idx) > 1 else -1))
+    mi = pos.get("meta") if columns is None or "meta" in columns else None
+    if columns is None:
+        if not specs and mi is None:
+            return lambda v: dict(zip(kept, v))
+        # put derived values back where they were, so whole records keep their key order
+        names = list(keys) if specs else kept
+        at = sorted(keys.index(name) for name, *_ in specs)
+        specs = [spec[1:] for spec in sorted(specs, key=lambda spec: keys.index(spec[0]))]
+
+        def full(v):
+            if mi is not None:
+                v[mi] = metas[v[mi]].copy()
+            if specs:
+                vals = [f(v[i]) if j < 0 else f(v[i], v[j]) for f, i, j in specs]
+                for p, x in zip(at, vals):
+                    v.insert(p, x)
+            return dict(zip(names, v))
+        return full
+    names = [k for k in kept if k in columns and k != "meta"]
+    if not names:
+        get = lambda v: ()
+    elif len(names) == 1:
+        i = pos[names[0]]
+        get = lambda v: (v[i],)
+    else:
+        get = itemgetter(*[pos[k] for k in names])
+
+    def projected(v):
+        rec = dict(zip(names, get(v)))
+        for name, f, i, j in specs:
+            rec[name] = f(v[i]) if j < 0 else f(v[i], v[j])
+        if mi is not None:
+            rec["meta"] = metas[v[mi]].copy()
+        return rec
+    return projected
+
+def iter_segment(path: str, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Stream records out of a segment (or a plain gzip/zstd-compressed JSONL log)."""
+    loads = json.loads
+    lines = iter_lines(path)
+    first = next(lines, "")
+    header = loads(first) if first.strip() else {}
+    if not isinstance(header, dict) or "cwseg" not in header:
+        if header:
+            yield header if columns is None else {k: header[k] for k in columns if k in header}
+        for line in lines:
+            if line.strip():
+                r = loads(line)
+                yield r if columns is None else {k: r[k] for k in columns if k in r}
+        return
+    if header["cwseg"] > SEGMENT_VERSION:
+        raise ValueError(f"{path}: segment version {header['cwseg']} is newer than this reader")
+    kwh_eur = header.get("kwh_eur", DEFAULT_KWH_EUR)
+    derive = _derivations(kwh_eur)
+    old = _version_key(header.get("schema_version", PRE_VERSIONING)) < _CURRENT
+    cols = None if columns is None else set(columns)
+    if old and cols is not None:
+        cols.add("meta")   # migration reads it
+    metas: List[Any] = []
+    decoders: List[Callable] = []
+    for line in lines:
+        v = loads(line)
+        if type(v) is list:
+            rec = decoders[v.pop()](v)
+            if old:
+                rec = migrate_record(rec, kwh_eur)[0]
+                if columns is not None:
+                    rec = {k: rec[k] for k in columns if k in rec}
+            yield rec
+        elif "m" in v:
+            metas.append(v["m"][1])
+        elif "s" in v:
+            decoders.append(_decoder(v["s"][1], v["s"][2], cols, metas, derive))
+
+def segment_envs(path: str) -> Dict[str, Dict[str, Any]]:
+    """env_id -> env block carried by a segment."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for line in iter_lines(path):
+        if line.startswith('{"e":'):
+            eid, block = json.loads(line)["e"]
+            out[eid] = block
+    return out
+
+# ---------------------------------------------------------------------------
+# Format-agnostic entry points used by the CLIs.
+
+def iter_records(path: str, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield records from a JSONL, .cwcol, Parquet or segment log, projected to `columns` if given."""
+    fmt = detect_format(path)
+    if fmt == "cwcol":
+        log = ColumnarLog(path)
+        try:
+            yield from log.iter_rows(columns)
+        finally:
+            log.close()
+    elif fmt == "parquet":
+        yield from iter_parquet(path, columns)
+    elif fmt == "cwseg":
+        yield from iter_segment(path, columns)
+    else:
+        yield from iter_jsonl(path, columns)
+
+def load_records(path: str, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    return list(iter_records(path, columns))
+
+def convert(src: str, dst: str) -> int:
+    records = iter_records(src)
+    if dst.endswith(".parquet"):
+        return write_parquet(records, dst)
+    if dst.endswith(tuple(SEGMENT_EXTS)):
+        return write_segment(records, dst)
+    if dst.endswith(".jsonl"):
+        n = 0
+        with open(dst, "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r) + "\n")
+                n += 1
+        return n
+    return write_columnar(records, dst)
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="convert between jsonl / .cwcol / .parquet / .cwseg.gz / .cwseg.zst")
+    c.add_argument("src")
+    c.add_argument("dst")
+    i = sub.add_parser("info", help="show columns of a log")
+    i.add_argument("path")
+    args = ap.parse_args()
+
+    if args.cmd == "convert":
+        n = convert(args.src, args.dst)
+        print(f"Wrote {n} records to {args.dst}")
+    else:
+        fmt = detect_format(args.path)
+        print(f"format: {fmt}")
+        if fmt == "cwcol":
+            with ColumnarLog(args.path) as log:
+                print(f"rows: {log.rows}")
+                for c in log.header["columns"]:
+                    print(f"- {c['name']}: {c['kind']} ({c['nbytes'] + c.get('table_nbytes', 0)} bytes)")
+
+if __name__ == "__main__":
+    main()
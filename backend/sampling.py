@@ -0,0 +1,142 @@
+# sampling.py
+# Call sampling for track() on high-QPS services: only a subset of calls is
+# written, and every written record carries a `sample_weight` (the number of
+# calls it stands for) so weighted totals over the log stay unbiased.
+#   CallSampler     - 1-in-N calls, optionally adapting N to an overhead budget
+#   WindowReservoir - uniform sample of k calls per time window (Algorithm R)
+
+import atexit, math, random, threading, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class CallSampler:
+    """
+    Tracks every N-th call; the tracked call's weight is the number of calls
+    since the previous tracked one, so changing N on the fly stays unbiased.
+
+    With `overhead_budget_pct`, N is re-derived after each tracked call from
+    EWMAs of the wrapped function's CPU time (work), the cost every call pays
+    even when not sampled (fixed) and the extra cost of a tracked call:
+    N = ceil(overhead / (budget * work - fixed)), so the tracker's amortized
+    cost per call stays under `budget` percent of the request's CPU time.
+    N moves by at most 2x per observation, so one cold or descheduled call
+    cannot park the sampler at `max_every`; if `fixed` alone exceeds the
+    budget it doubles towards `max_every`.
+    """
+
+    def __init__(self, every: int = 1, overhead_budget_pct: Optional[float] = None,
+                 max_every: int = 1_000_000, smoothing: float = 0.2):
+        self.every = max(1, int(every))
+        self.budget = overhead_budget_pct / 100.0 if overhead_budget_pct else None
+        self.max_every = max_every
+        self.smoothing = smoothing
+        self.overhead_s: Optional[float] = None
+        self.work_s: Optional[float] = None
+        self.fixed_s = 0.0
+        self._skipped = 0
+        self._lock = threading.Lock()
+
+    def decide(self) -> Optional[int]:
+        """Weight for this call if it should be tracked, else None."""
+        with self._lock:
+            self._skipped += 1
+            if self._skipped < self.every:
+                return None
+            w, self._skipped = self._skipped, 0
+            return w
+
+    def observe(self, overhead_s: float, work_s: float, fixed_s: float = 0.0) -> None:
+        """Feed the costs of one tracked call; no-op without a budget."""
+        if self.budget is None:
+            return
+        a = self.smoothing
+        with self._lock:
+            if self.work_s is None:
+                self.overhead_s, self.work_s, self.fixed_s = overhead_s, work_s, fixed_s
+            else:
+                self.overhead_s = (1 - a) * self.overhead_s + a * overhead_s
+                self.work_s = (1 - a) * self.work_s + a * work_s
+                self.fixed_s = (1 - a) * self.fixed_s + a * fixed_s
+            room = self.budget * self.work_s - self.fixed_s
+            n = math.ceil(self.overhead_s / room) if room > 0 else self.max_every
+            n = min(max(n, self.every // 2), 2 * self.every)
+            self.every = min(self.max_every, max(1, n))
+
+    @property
+    def overhead_pct(self) -> Optional[float]:
+        """Estimated amortized tracker overhead, % of request CPU time."""
+        if not self.work_s or self.overhead_s is None:
+            return None
+        return 100.0 * (self.fixed_s + self.overhead_s / self.every) / self.work_s
+
+class WindowReservoir:
+    """
+    Keeps a uniform sample of at most `k` calls per `window_secs` window.
+    The keep/skip decision is made when a call starts (Algorithm R does not
+    look at the item), the finished record is parked in its slot, and the
+    window's records are released to `emit` when the next window opens,
+    on flush() or at exit, each with weight = calls seen / records kept.
+    """
+
+    def __init__(self, k: int, window_secs: float, emit: Callable[[Dict[str, Any]], None],
+                 seed: Optional[int] = None):
+        if k < 1 or window_secs <= 0:
+            raise ValueError("reservoir needs k >= 1 and window_secs > 0")
+        self.k = int(k)
+        self.window_secs = float(window_secs)
+        self.emit = emit
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._gen = 0
+        self._start = time.monotonic()
+        self._seen = 0
+        self._slots: List[Optional[Dict[str, Any]]] = []
+        atexit.register(self.flush)
+
+    def offer(self) -> Optional[Tuple[int, int]]:
+        """(generation, slot) if this call should be measured, else None."""
+        now = time.monotonic()
+        released = None
+        with self._lock:
+            if now - self._start >= self.window_secs:
+                released = self._rotate(now)
+            self._seen += 1
+            if len(self._slots) < self.k:
+                self._slots.append(None)
+                token = (self._gen, len(self._slots) - 1)
+            else:
+                j = self._rnd.randrange(self._seen)
+                token = (self._gen, j) if j < self.k else None
+        if released:
+            self._release(released)
+        return token
+
+    def fill(self, token: Tuple[int, int], rec: Dict[str, Any]) -> None:
+        gen, slot = token
+        with self._lock:
+            if gen == self._gen:
+                self._slots[slot] = rec
+        # else the window closed while this call was in flight; the other
+        # kept records of that window already carry its weight
+
+    def flush(self) -> None:
+        with self._lock:
+            released = self._rotate(time.monotonic())
+        self._release(released)
+
+    def _rotate(self, now: float) -> Tuple[int, List[Dict[str, Any]]]:
+        kept = [r for r in self._slots if r is not None]
+        out = (self._seen, kept)
+        self._gen += 1
+        self._start = now - (now - self._start) % self.window_secs
+        self._seen = 0
+        self._slots = []
+        return out
+
+    def _release(self, released: Tuple[int, List[Dict[str, Any]]]) -> None:
+        seen, kept = released
+        if not kept:
+            return
+        w = seen / len(kept)
+        for rec in kept:
+            rec["sample_weight"] = w
+            self.emit(rec)
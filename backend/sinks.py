@@ -0,0 +1,145 @@
+# sinks.py
+# Record sinks for tracker output. Plug one in with tracker.set_sink(...)
+# or set CARBONWISE_SINK=buffered.
+
+from __future__ import annotations
+import json, os, threading, atexit
+from typing import Any, Dict, List, Optional, Set
+
+try:
+    import orjson  # optional fast encoder
+except Exception:
+    orjson = None
+
+try:
+    import fcntl  # POSIX advisory locks for cross-process appends
+except Exception:
+    fcntl = None
+
+def encode_line(rec: Dict[str, Any]) -> bytes:
+    """One JSONL line as bytes, using orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(rec) + b"\n"
+        except TypeError:
+            pass
+    return (json.dumps(rec) + "\n").encode("utf-8")
+
+def append_lines(path: str, data: bytes) -> None:
+    """
+    Append whole lines with a single O_APPEND write, under an exclusive flock
+    where available, so concurrent writers never interleave partial lines.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        view = memoryview(data)
+        while view:
+            n = os.write(fd, view)
+            view = view[n:]
+    finally:
+        os.close(fd)  # closing releases the lock
+
+class RecordSink:
+    """Interface: write() must be cheap; flush()/close() make records durable."""
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+class JsonlSink(RecordSink):
+    """Synchronous append of one line per record (the original tracker behaviour)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        append_lines(self.path, encode_line(rec))
+
+class BufferedJsonlSink(RecordSink):
+    """
+    Batches records in memory and appends them from a background thread.
+    - Flushes when `max_records` are pending or every `max_delay_secs`.
+    - Encoding and I/O happen off the caller's thread; write() is a list append.
+    - Closed at interpreter exit (see _close_open_sinks); records written
+      after close() are appended synchronously instead of being dropped.
+    """
+
+    def __init__(self, path: str, max_records: int = 1000, max_delay_secs: float = 1.0):
+        self.path = path
+        self.max_records = int(max_records)
+        self.max_delay_secs = float(max_delay_secs)
+        self._buf: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="carbonwise-sink", daemon=True)
+        self._thread.start()
+        _open_sinks.add(self)
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._buf.append(rec)
+                n = len(self._buf)
+        if closed:
+            with self._io_lock:
+                append_lines(self.path, encode_line(rec))
+        elif n >= self.max_records:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.max_delay_secs)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._io_lock:
+            with self._lock:
+                batch, self._buf = self._buf, []
+            if batch:
+                append_lines(self.path, b"".join(encode_line(r) for r in batch))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        _open_sinks.discard(self)
+        self._wake.set()
+        self._thread.join(timeout=self.max_delay_secs + 1.0)
+        self.flush()
+
+# Buffered sinks not closed yet. One exit hook closes them all; it is
+# registered when this module is imported, before anything that emits records
+# at exit (sampling.WindowReservoir flushes), and atexit runs hooks last-in
+# first-out, so those records still go through the buffer.
+_open_sinks: Set[BufferedJsonlSink] = set()
+
+def _close_open_sinks() -> None:
+    for sink in list(_open_sinks):
+        sink.close()
+
+atexit.register(_close_open_sinks)
+
+def sink_from_env(path: str) -> Optional[RecordSink]:
+    """CARBONWISE_SINK=buffered|jsonl; unset keeps the tracker's default path."""
+    kind = os.environ.get("CARBONWISE_SINK", "").lower()
+    if kind == "buffered":
+        return BufferedJsonlSink(
+            path,
+            max_records=int(os.environ.get("CARBONWISE_SINK_MAX_RECORDS", "1000")),
+            max_delay_secs=float(os.environ.get("CARBONWISE_SINK_MAX_DELAY", "1.0")),
+        )
+    if kind == "jsonl":
+        return JsonlSink(path)
+    return None
@@ -0,0 +1,125 @@
+# spans.py
+# Nested spans inside a tracked call, for per-phase latency and energy:
+#
+#   @track("baseline", shared=True)
+#   def batch_inference():
+#       with span("tokenize"):
+#           ...
+#       with span("model"):
+#           forward()            # @span("forward") nests as model/forward
+#
+# Entering/leaving a span only reads the clock, swaps a context variable and
+# appends a tuple to the run's ring buffer (a bounded deque). Energy is
+# attributed when the run finishes (tracker._attach_spans). Spans opened
+# outside a tracked call are no-ops. Context variables follow asyncio tasks;
+# for thread pools submit `contextvars.copy_context().run`.
+# annotate(ttfb_ms=..., bytes_in=...) adds fields to the current call's record.
+
+import contextvars, functools, inspect, itertools, os, sys, threading, time
+from collections import deque
+from typing import Any, Callable, Deque, Optional, Tuple
+
+SPAN_RING_SIZE = int(os.getenv("CARBONWISE_SPAN_RING", "4096"))
+
+# (span_id, parent_span_id, depth, name, t0, t1, thread_id, task, error)
+SpanTuple = Tuple[int, int, int, str, float, float, int, Optional[str], bool]
+
+class RunFrame:
+    """Span state of one tracked call; the ring keeps the last `capacity` closed spans."""
+
+    __slots__ = ("run_id", "ring", "fields", "_ids", "_closed")
+
+    def __init__(self, run_id: str, capacity: int = SPAN_RING_SIZE):
+        self.run_id = run_id
+        self.fields: Optional[dict] = None   # annotate(); merged into the run record
+        self.ring: Deque[SpanTuple] = deque(maxlen=capacity)
+        self._ids = itertools.count(1)        # 0 is the run itself
+        self._closed = itertools.count(1)
+
+    def finish(self) -> Tuple[list, int]:
+        """(closed spans still in the ring, spans that fell off it); call once, at run end."""
+        spans = list(self.ring)
+        return spans, max(0, next(self._closed) - 1 - len(spans))
+
+_current: contextvars.ContextVar = contextvars.ContextVar("carbonwise_span", default=None)
+
+def open_run(run_id: str, capacity: int = SPAN_RING_SIZE) -> Tuple[RunFrame, contextvars.Token]:
+    frame = RunFrame(run_id, capacity)
+    return frame, _current.set((frame, 0, 0))
+
+def close_run(handle: Tuple[RunFrame, contextvars.Token]) -> RunFrame:
+    frame, token = handle
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)   # async generator finalized from another context
+    return frame
+
+def _task_name() -> Optional[str]:
+    asyncio = sys.modules.get("asyncio")   # not imported: no loop can be running (and importing it is slow)
+    if asyncio is None or asyncio._get_running_loop() is None:
+        return None
+    task = asyncio.current_task()
+    return task.get_name() if task is not None else None
+
+class span:
+    """Context manager / decorator for one phase of a tracked call."""
+
+    __slots__ = ("name", "_frame", "_id", "_parent", "_depth", "_token", "_t0")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._frame = None
+
+    def __enter__(self) -> "span":
+        cur = _current.get()
+        if cur is None:
+            return self
+        frame, parent, depth = cur
+        self._frame, self._parent, self._depth = frame, parent, depth + 1
+        self._id = next(frame._ids)
+        self._token = _current.set((frame, self._id, self._depth))
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        frame = self._frame
+        if frame is None:
+            return False
+        t1 = time.perf_counter()
+        _current.reset(self._token)
+        frame.ring.append((self._id, self._parent, self._depth, self.name, self._t0, t1,
+                           threading.get_ident(), _task_name(), exc_type is not None))
+        next(frame._closed)
+        self._frame = None
+        return False
+
+    def __call__(self, fn: Callable) -> Callable:
+        name = self.name
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+def annotate(**fields: Any) -> bool:
+    """Add fields to the current tracked call's record (never overriding its own); False outside one."""
+    cur = _current.get()
+    if cur is None:
+        return False
+    frame = cur[0]
+    if frame.fields is None:
+        frame.fields = {}
+    frame.fields.update(fields)
+    return True
+
+def current_run_id() -> Optional[str]:
+    cur = _current.get()
+    return cur[0].run_id if cur is not None else None
@@ -0,0 +1,123 @@
+# stub_inference_server.py
+# Local stand-in for a remote chat-completions endpoint (Hathora / OpenAI
+# style), for exercising remote_client.py without a GPU or a token. Each
+# POST waits --latency-ms plus --token-ms per completion token (with
+# +/- --jitter), holding one of --capacity slots like a server's batch slots,
+# then answers with a canned completion. --fail-rate answers that fraction
+# with 503 + Retry-After. Connections are HTTP/1.1 keep-alive; GET /stats
+# reports connections opened and requests served.
+# Usage:
+#   python stub_inference_server.py --port 8080 --latency-ms 40 --token-ms 1 --capacity 16
+#   python remote_client.py --url http://127.0.0.1:8080/v1/chat/completions "Hello"
+
+import argparse, json, random, socket, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+WORDS = ("carbon", "aware", "inference", "batches", "requests", "on", "greener", "grids", "with", "lower", "latency")
+
+class StubState:
+    def __init__(self, latency_ms: float = 40.0, token_ms: float = 1.0, jitter: float = 0.1,
+                 fail_rate: float = 0.0, capacity: int = 16, seed: int = 0):
+        self.latency_ms, self.token_ms, self.jitter, self.fail_rate = latency_ms, token_ms, jitter, fail_rate
+        self.slots = threading.BoundedSemaphore(capacity)
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"connections": 0, "requests": 0, "failed": 0}
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def draw(self) -> float:
+        with self._lock:
+            return self._rnd.random()
+
+    def completion(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        tokens = max(1, int(req.get("max_tokens") or 16))
+        prompt = " ".join(str(m.get("content", "")) for m in req.get("messages") or ())
+        text = " ".join(WORDS[i % len(WORDS)] for i in range(tokens))
+        return {
+            "id": f"stub-{self.stats['requests']}",
+            "object": "chat.completion",
+            "model": req.get("model") or "stub",
+            "choices": [{"index": 0, "finish_reason": "length",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": tokens,
+                      "total_tokens": len(prompt.split()) + tokens},
+        }
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients reuse connections
+
+    def setup(self):
+        super().setup()
+        # headers and body go out in two writes: without NODELAY the body waits
+        # for the client's delayed ACK (~40 ms) on every reused connection
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.state.count("connections")
+
+    def _send(self, status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/stats":
+            return self._send(404, {"error": "not found"})
+        self._send(200, self.server.state.stats)
+
+    def do_POST(self):
+        state = self.server.state
+        try:
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            return self._send(400, {"error": "invalid JSON"})
+        state.count("requests")
+        if state.fail_rate and state.draw() < state.fail_rate:
+            state.count("failed")
+            return self._send(503, {"error": "overloaded"}, {"Retry-After": "0"})
+        tokens = max(1, int(req.get("max_tokens") or 16))
+        work_ms = (state.latency_ms + tokens * state.token_ms) * (1 + state.jitter * (2 * state.draw() - 1))
+        with state.slots:   # over capacity, requests queue here like on a busy server
+            time.sleep(max(0.0, work_ms) / 1000.0)
+        self._send(200, state.completion(req))
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+def make_server(host: str = "127.0.0.1", port: int = 8080, verbose: bool = False, **stub) -> ThreadingHTTPServer:
+    """Stub server (port 0 picks a free one); stub kwargs go to StubState."""
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    srv.state = StubState(**stub)
+    srv.verbose = verbose
+    return srv
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--latency-ms", dest="latency_ms", type=float, default=40.0, help="per request (queueing + prefill)")
+    ap.add_argument("--token-ms", dest="token_ms", type=float, default=1.0, help="per completion token (max_tokens)")
+    ap.add_argument("--jitter", type=float, default=0.1, help="relative +/- spread of the delay")
+    ap.add_argument("--fail-rate", dest="fail_rate", type=float, default=0.0, help="fraction answered 503")
+    ap.add_argument("--capacity", type=int, default=16, help="requests served at once")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+    srv = make_server(args.host, args.port, args.verbose, latency_ms=args.latency_ms, token_ms=args.token_ms,
+                      jitter=args.jitter, fail_rate=args.fail_rate, capacity=args.capacity)
+    print(f"stub inference server on http://{args.host}:{srv.server_address[1]}/v1/chat/completions")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
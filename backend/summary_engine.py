@@ -0,0 +1,326 @@
+# summary_engine.py
+# NumPy summary engine: loads metric columns into arrays once and computes
+# mean, stddev, min/max, p50/p90/p99/p99.9 and bootstrap CIs of the mean for
+# every metric and run_name. Also hosts the two-sample tests used by the
+# distribution mode of cw_quality_gate.py.
+
+import math
+import numpy as np
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from aggregate import METRICS, PHASE_METRICS, SPAN_COLUMNS, PhaseBreakdown
+from runstore import ColumnarLog, detect_format, iter_records
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+def load_columns(
+    path: str,
+    metrics: Sequence[str] = METRICS,
+    phases: Optional[PhaseBreakdown] = None,
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Read `run_name` and the metric columns once.
+    Returns (run names, int codes per row, float64 matrix [rows, metrics]).
+    Missing values are 0.0, as in the streaming aggregator.
+    Span records are left out; they are folded into `phases` if given.
+    Memory is O(rows): 8 bytes per value plus 8 per row for the code, read
+    from JSONL into typed buffers that the returned arrays share.
+    """
+    if detect_format(path) == "cwcol":
+        with ColumnarLog(path) as log:
+            n = log.rows
+            if log.kind("run_name") == "str":
+                names = list(log.table("run_name"))
+                codes = np.frombuffer(log.raw("run_name"), dtype=np.int32).astype(np.int64)
+            else:
+                names, codes = _encode(log.column("run_name"))
+            X = np.zeros((n, len(metrics)))
+            for j, m in enumerate(metrics):
+                if m not in log.names:
+                    continue
+                kind = log.kind(m)
+                if kind in ("f8", "i8"):
+                    X[:, j] = np.frombuffer(log.raw(m), dtype=np.float64 if kind == "f8" else np.int64)
+                else:
+                    X[:, j] = [v if isinstance(v, (int, float)) else np.nan for v in log.column(m)]
+            keep = _run_rows(log)
+            if keep is not None:
+                if phases is not None:
+                    cols = ["run_name", "sample_weight", *SPAN_COLUMNS, *PHASE_METRICS]
+                    for r in log.iter_rows(cols):
+                        if r.get("kind") == "span":
+                            phases.add(r)
+                codes, X = codes[keep], X[keep]
+                used = np.flatnonzero(np.bincount(codes, minlength=len(names)))
+                if len(used) < len(names):   # run names seen only on span rows
+                    remap = np.zeros(len(names), dtype=np.int64)
+                    remap[used] = np.arange(len(used))
+                    names, codes = [names[i] for i in used], remap[codes]
+        np.nan_to_num(X, copy=False, nan=0.0)
+        return names, codes, X
+
+    index: Dict[str, int] = {}
+    code_list = array("q")
+    flat = array("d")
+    for r in iter_records(path, ["run_name", *SPAN_COLUMNS, *metrics]):
+        if r.get("kind") == "span":
+            if phases is not None:
+                phases.add(r)
+            continue
+        code_list.append(index.setdefault(r["run_name"], len(index)))
+        for m in metrics:
+            v = r.get(m)
+            flat.append(float(v) if v is not None else 0.0)
+    X = np.frombuffer(flat, dtype=np.float64).reshape(len(code_list), len(metrics))
+    return list(index), np.frombuffer(code_list, dtype=np.int64), X
+
+def _run_rows(log: ColumnarLog) -> Optional[np.ndarray]:
+    """Boolean mask of non-span rows, or None when the log has no span records."""
+    if "kind" not in log.names:
+        return None
+    if log.kind("kind") == "str":
+        table = list(log.table("kind"))
+        if "span" not in table:
+            return None
+        return np.frombuffer(log.raw("kind"), dtype=np.int32) != table.index("span")
+    mask = np.array([v != "span" for v in log.column("kind")])
+    return None if mask.all() else mask
+
+def _encode(values) -> Tuple[List[str], np.ndarray]:
+    index: Dict[str, int] = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int64)
+    return list(index), codes
+
+def summarize_arrays(
+    names: List[str],
+    codes: np.ndarray,
+    X: np.ndarray,
+    metrics: Sequence[str] = METRICS,
+    percentiles: Sequence[float] = PERCENTILES,
+    n_boot: int = 1000,
+    ci: float = 0.95,
+    max_boot_n: int = 2000,
+    seed: Optional[int] = 0,
+    weights: Optional[np.ndarray] = None,
+) -> "ArraySummary":
+    """
+    Vectorized per-group statistics. Rows are grouped once by run_name and each
+    group's block is sorted column-wise in place; percentiles use the same
+    linear interpolation as np.percentile.
+    Bootstrap CIs resample at most `max_boot_n` rows per group (m-out-of-n,
+    rescaled by sqrt(m/n)) with one index draw shared by all metrics.
+    `weights` are per-row frequency weights (`sample_weight` of sampled
+    records): means, stddev, CIs and counts are weighted, and percentiles use
+    the weighted inverted CDF instead of interpolation.
+    """
+    G, M = len(names), X.shape[1]
+    counts = np.bincount(codes, minlength=G)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    wsum = np.bincount(codes, weights=weights, minlength=G) if weights is not None else counts
+    safe = np.maximum(wsum, 1)
+
+    # one column at a time, so temporaries stay at a row-length vector
+    sums = np.empty((G, M))
+    ss = np.empty((G, M))
+    for j in range(M):
+        x = X[:, j]
+        sums[:, j] = np.bincount(codes, weights=x if weights is None else x * weights, minlength=G)
+    means = sums / safe[:, None]
+    for j in range(M):
+        dev = X[:, j] - means[codes, j]
+        dev *= dev
+        if weights is not None:
+            dev *= weights
+        ss[:, j] = np.bincount(codes, weights=dev, minlength=G)
+    std = np.sqrt(ss / np.maximum(wsum - 1, 1)[:, None])
+
+    q = np.asarray(percentiles, dtype=np.float64) / 100.0
+    pos = q[None, :] * (counts[:, None] - 1).clip(min=0)            # [G, Q]
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    frac = pos - lo
+    last = starts + np.maximum(counts, 1) - 1
+    pct = np.empty((G, M, len(q)))
+    mins = np.empty((G, M))
+    maxs = np.empty((G, M))
+    order_by_group = np.argsort(codes, kind="stable")
+    Xg = X[order_by_group]                                          # rows grouped by run_name
+    if weights is None:
+        Xs = Xg.copy()
+        for g in range(G):
+            Xs[starts[g]:starts[g] + counts[g]].sort(axis=0)        # every metric sorted within its group
+        for j in range(M):
+            s = Xs[:, j]
+            a = s[np.minimum(starts[:, None] + lo, last[:, None])]
+            b = s[np.minimum(starts[:, None] + hi, last[:, None])]
+            pct[:, j, :] = a + (b - a) * frac
+            mins[:, j] = s[np.minimum(starts, last)]
+            maxs[:, j] = s[last]
+    else:
+        wg = weights[order_by_group]
+        for j in range(M):
+            order = np.lexsort((X[:, j], codes))                    # by group, then value
+            s = X[order, j]
+            cw = np.cumsum(weights[order])
+            before = np.concatenate(([0.0], cw))[starts]            # weight of earlier groups
+            target = before[:, None] + q[None, :] * wsum[:, None]
+            k = np.searchsorted(cw, target, side="left")
+            pct[:, j, :] = s[np.clip(k, starts[:, None], last[:, None])]
+            mins[:, j] = s[np.minimum(starts, last)]
+            maxs[:, j] = s[last]
+
+    ci_lo = means.copy()
+    ci_hi = means.copy()
+    if n_boot > 0:
+        rng = np.random.default_rng(seed)
+        alpha = (1.0 - ci) / 2.0
+        for g in range(G):
+            n = int(counts[g])
+            if n < 2:
+                continue
+            m = min(n, max_boot_n)
+            idx = starts[g] + rng.integers(0, n, size=(n_boot, m))
+            if weights is None:
+                boot = Xg[idx].mean(axis=1)                           # [B, M]
+            else:
+                bw = wg[idx]
+                boot = (Xg[idx] * bw[:, :, None]).sum(axis=1) / bw.sum(axis=1)[:, None]
+            d = (boot - means[g]) * np.sqrt(m / n)
+            ql, qh = np.quantile(d, [alpha, 1.0 - alpha], axis=0)
+            ci_lo[g] = means[g] - qh                                  # basic bootstrap interval
+            ci_hi[g] = means[g] - ql
+
+    return ArraySummary(names, list(metrics), list(percentiles), counts, means, std,
+                        mins, maxs, pct, ci_lo, ci_hi, ci, wsum if weights is not None else None)
+
+class ArraySummary:
+    """Result of summarize_arrays; `means()` matches StreamingAggregator.means()."""
+
+    def __init__(self, names, metrics, percentiles, counts, means, std, mins, maxs, pct, ci_lo, ci_hi, ci, wsum=None):
+        self.names = names
+        self.metrics = metrics
+        self.percentiles = percentiles
+        self.counts = counts
+        self.mean = means
+        self.std = std
+        self.min = mins
+        self.max = maxs
+        self.pct = pct
+        self.ci_lo = ci_lo
+        self.ci_hi = ci_hi
+        self.ci = ci
+        self.wsum = wsum            # weighted row counts when the log is sampled
+        self.phases: Optional[PhaseBreakdown] = None
+        self._index = {n: i for i, n in enumerate(names)}
+
+    def count(self, name: str) -> float:
+        """Rows for `name`; with sample weights, the number of calls they stand for."""
+        g = self._index.get(name)
+        if g is None:
+            return 0
+        return float(self.wsum[g]) if self.wsum is not None else int(self.counts[g])
+
+    def means(self, name: str) -> Dict[str, float]:
+        g = self._index.get(name)
+        out: Dict[str, float] = {"n": self.count(name)}
+        for j, m in enumerate(self.metrics):
+            out[m] = float(self.mean[g, j]) if g is not None else 0.0
+        return out
+
+    def stats(self, name: str, metric: str) -> Dict[str, Any]:
+        g, j = self._index[name], self.metrics.index(metric)
+        out = {
+            "n": int(self.counts[g]),
+            "mean": float(self.mean[g, j]),
+            "std": float(self.std[g, j]),
+            "min": float(self.min[g, j]),
+            "max": float(self.max[g, j]),
+            "ci_lo": float(self.ci_lo[g, j]),
+            "ci_hi": float(self.ci_hi[g, j]),
+        }
+        for k, p in enumerate(self.percentiles):
+            out[pct_label(p)] = float(self.pct[g, j, k])
+        return out
+
+def pct_label(p: float) -> str:
+    return f"p{p:g}"
+
+def summarize_log(path: str, metrics: Sequence[str] = METRICS, **kw) -> ArraySummary:
+    phases = PhaseBreakdown()
+    names, codes, X = load_columns(path, (*metrics, "sample_weight"), phases)
+    w = X[:, -1]
+    w[w <= 0] = 1.0                 # unsampled records: missing weight loads as 0.0
+    weights = w.copy() if (w != 1.0).any() else None
+    summary = summarize_arrays(names, codes, np.ascontiguousarray(X[:, :-1]), metrics, weights=weights, **kw)
+    summary.phases = phases
+    return summary
+
+# ---------------------------------------------------------------------------
+# Two-sample tests used by the distribution quality gate. Both are one-sided:
+# a small p-value means `b` is stochastically larger (worse) than `a`.
+
+def mann_whitney_greater(a: np.ndarray, b: np.ndarray) -> float:
+    """One-sided Mann-Whitney U p-value for b > a (normal approx., tie-corrected)."""
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+    both = np.concatenate((a, b))
+    uniq, inv, cnt = np.unique(both, return_inverse=True, return_counts=True)
+    avg_rank = np.cumsum(cnt) - (cnt - 1) / 2.0                      # 1-based average ranks
+    r2 = avg_rank[inv[n1:]].sum()
+    u2 = r2 - n2 * (n2 + 1) / 2.0
+    n = n1 + n2
+    tie = (cnt.astype(np.float64) ** 3 - cnt).sum()
+    var = n1 * n2 / 12.0 * ((n + 1) - tie / (n * (n - 1))) if n > 1 else 0.0
+    if var <= 0:
+        return 1.0
+    z = (u2 - n1 * n2 / 2.0 - 0.5) / np.sqrt(var)                     # continuity correction
+    return float(0.5 * math.erfc(z / math.sqrt(2.0)))
+
+BOOT_CHUNK = 1 << 22   # resampled values held at once (32 MB of float64)
+
+def weighted_percentile(x: np.ndarray, w: np.ndarray, q: float, axis: int = -1) -> np.ndarray:
+    """Percentile `q` under frequency weights `w` (inverted CDF, as summarize_arrays uses)."""
+    order = np.argsort(x, axis=axis)
+    xs = np.take_along_axis(x, order, axis=axis)
+    cw = np.cumsum(np.take_along_axis(w, order, axis=axis), axis=axis)
+    target = np.take(cw, [-1], axis=axis) * (q / 100.0)
+    k = np.minimum((cw < target).sum(axis=axis, keepdims=True), x.shape[axis] - 1)
+    return np.take_along_axis(xs, k, axis=axis).squeeze(axis)
+
+def _boot_percentiles(x: np.ndarray, q: float, n_boot: int, max_boot_n: int, rng,
+                      w: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Percentile `q` of n_boot resamples of x (weighted by `w` if given).
+    Groups above max_boot_n rows are resampled m-out-of-n and spread
+    rescaled by sqrt(m/n) around the full sample's percentile, as in
+    summarize_arrays; resamples are drawn in chunks so memory stays
+    bounded whatever the group size.
+    """
+    n = len(x)
+    m = min(n, max_boot_n)
+    rows = max(1, BOOT_CHUNK // m)
+    out = np.empty(n_boot)
+    for lo in range(0, n_boot, rows):
+        k = min(rows, n_boot - lo)
+        idx = rng.integers(0, n, size=(k, m))
+        out[lo:lo + k] = np.percentile(x[idx], q, axis=1) if w is None else weighted_percentile(x[idx], w[idx], q)
+    if m < n:
+        full = np.percentile(x, q) if w is None else weighted_percentile(x, w, q)
+        out = full + (out - full) * np.sqrt(m / n)
+    return out
+
+def bootstrap_greater(a: np.ndarray, b: np.ndarray, q: float = 50.0, n_boot: int = 2000,
+                      seed: Optional[int] = 0, max_boot_n: int = 50_000,
+                      wa: Optional[np.ndarray] = None, wb: Optional[np.ndarray] = None) -> float:
+    """
+    One-sided bootstrap p-value that percentile `q` of b exceeds that of a.
+    With sample weights, records are resampled uniformly and each resample's
+    percentile is weighted.
+    """
+    if len(a) == 0 or len(b) == 0:
+        return 1.0
+    rng = np.random.default_rng(seed)
+    qa = _boot_percentiles(a, q, n_boot, max_boot_n, rng, wa)
+    qb = _boot_percentiles(b, q, n_boot, max_boot_n, rng, wb)
+    return float((np.count_nonzero(qb - qa <= 0) + 1) / (n_boot + 1))
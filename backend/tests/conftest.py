@@ -0,0 +1,7 @@
+# tests/conftest.py
+# The backend modules are scripts imported by top-level name (run from
+# backend/), so put that directory on the path for `pytest backend/tests`.
+
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,109 @@
+# tests/test_attribution.py
+# Energy attribution of TrackerSession, driven by FakeBackend on a clock the
+# test advances by hand: the only energy is what the test injects while calls
+# are open, so the per-call totals must add up to it exactly, whatever the
+# thread scheduling and however the "cpu" mode splits it.
+
+import threading
+import pytest
+from attribution import TrackedThreadPool
+from energy_backends import FakeBackend
+from tracker import TrackerSession
+
+WATTS = 3.6e6 / 1000.0   # 1e-3 kWh per fake second
+KWH_PER_S = 1e-3
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self.t
+
+    def advance(self, secs: float) -> None:
+        with self._lock:
+            self.t += secs
+
+def burn(n: int) -> int:
+    x = 0
+    for i in range(n):
+        x += i * i
+    return x
+
+@pytest.fixture(params=["share", "cpu"])
+def session(request):
+    clock = Clock()
+    # the sampler never ticks within a test: FakeBackend is exact, so begin/end read it
+    s = TrackerSession(3600.0, attribution=request.param, backend=FakeBackend(WATTS, clock)).start()
+    yield s, clock
+    s.stop()
+
+def test_overlapping_calls_split_by_mode(session):
+    s, clock = session
+    a = s.begin()
+    clock.advance(1.0)              # a alone
+    b = s.begin()
+    clock.advance(2.0)              # a and b on one thread: halves in both modes
+    _, kwh_a = s.end(a)
+    clock.advance(3.0)              # b alone
+    _, kwh_b = s.end(b)
+    assert kwh_a == pytest.approx(2.0 * KWH_PER_S, rel=1e-12)
+    assert kwh_b == pytest.approx(4.0 * KWH_PER_S, rel=1e-12)
+
+def test_parallel_calls_add_up(session):
+    s, clock = session
+    n = 6
+    started = threading.Barrier(n)
+    out = []
+    lock = threading.Lock()
+
+    def worker(i):
+        token = s.begin()
+        started.wait()              # every call is open before any energy is drawn
+        burn(20_000 * (i + 1))
+        clock.advance(i + 1.0)
+        _, kwh = s.end(token)
+        with lock:
+            out.append(kwh)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(out) == n and min(out) >= 0.0
+    assert sum(out) == pytest.approx(sum(range(1, n + 1)) * KWH_PER_S, rel=1e-9)
+    assert s.backend.energy_kwh() == pytest.approx(sum(out), rel=1e-9)
+
+def test_thread_pool_fanout_adds_up():
+    clock = Clock()
+    s = TrackerSession(3600.0, attribution="cpu", backend=FakeBackend(WATTS, clock)).start()
+    try:
+        def task():
+            burn(50_000)
+            clock.advance(1.0)
+
+        solo_kwh = []
+        solo_open = threading.Event()
+
+        def solo():
+            token = s.begin()
+            solo_open.set()
+            burn(50_000)
+            clock.advance(1.0)
+            solo_kwh.append(s.end(token)[1])
+
+        fan = s.begin()
+        th = threading.Thread(target=solo)
+        th.start()
+        solo_open.wait()
+        with TrackedThreadPool(2) as pool:
+            for f in [pool.submit(task) for _ in range(2)]:
+                f.result()
+        th.join()
+        _, fan_kwh = s.end(fan)
+    finally:
+        s.stop()
+    assert min(fan_kwh, solo_kwh[0]) >= 0.0
+    assert fan_kwh + solo_kwh[0] == pytest.approx(3.0 * KWH_PER_S, rel=1e-9)
@@ -0,0 +1,62 @@
+# tests/test_energy_backends.py
+# FakeBackend on a hand-driven clock, and RaplBackend on a fake powercap tree
+# (counter files the test rewrites), including a wrap and a clean stop().
+
+import os
+import pytest
+from energy_backends import FakeBackend, RaplBackend, UJ_PER_KWH, make_backend, rapl_zones
+
+def test_fake_backend_reads_power_times_time_plus_injected():
+    assert isinstance(make_backend("fake"), FakeBackend)
+    now = [100.0]
+    b = FakeBackend(watts=360.0, clock=lambda: now[0])
+    assert b.start() is b
+    assert b.energy_kwh() == 0.0
+    now[0] += 10.0                                  # 3600 J
+    assert b.energy_kwh() == pytest.approx(1e-3)
+    b.add(2e-3)
+    now[0] += 5.0
+    assert b.energy_kwh() == pytest.approx(1e-3 + 2e-3 + 5e-4)
+    assert b.stop() == pytest.approx(3.5e-3)
+
+def _zone(root, name, zone, uj, max_uj=None):
+    path = root / name
+    path.mkdir()
+    (path / "name").write_text(zone + "\n")
+    (path / "energy_uj").write_text(f"{uj}\n")
+    if max_uj is not None:
+        (path / "max_energy_range_uj").write_text(f"{max_uj}\n")
+    return path
+
+@pytest.fixture
+def powercap(tmp_path):
+    pkg = _zone(tmp_path, "intel-rapl:0", "package-0", 1_000, max_uj=9_999)
+    _zone(tmp_path, "intel-rapl:0:0", "core", 500)          # inside the package: skipped
+    dram = _zone(tmp_path, "intel-rapl:0:1", "dram", 2_000, max_uj=99_999)
+    return tmp_path, pkg, dram
+
+def test_rapl_zones_skip_subzones_inside_the_package(powercap):
+    root, pkg, dram = powercap
+    assert rapl_zones(str(root)) == [(str(pkg), "package-0"), (str(dram), "dram")]
+
+def test_rapl_backend_sums_zones_across_a_wrap_and_stops_cleanly(powercap):
+    root, pkg, dram = powercap
+    b = RaplBackend(str(root), poll_secs=0.001).start()
+    fds = [c.fd for c in b._counters]
+
+    def set_uj(zone, uj):
+        with b._lock:                                           # the poller reads under it
+            (zone / "energy_uj").write_text(f"{uj}\n")
+
+    assert b.energy_kwh() == 0.0
+    set_uj(pkg, 9_000)                                          # +8000
+    set_uj(dram, 2_500)                                         # +500
+    assert b.energy_kwh() == pytest.approx(8_500 / UJ_PER_KWH)
+    set_uj(pkg, 500)                                            # wrapped: +1000 +500
+    assert b.energy_kwh() == pytest.approx(10_000 / UJ_PER_KWH)
+    poller = b._poller
+    assert b.stop() == pytest.approx(10_000 / UJ_PER_KWH)
+    assert not poller.is_alive()
+    for fd in fds:
+        with pytest.raises(OSError):
+            os.fstat(fd)
@@ -1,10 +1,20 @@
 from __future__ import annotations
-import json, os, time, uuid, logging, platform, shutil
+import json, os, time, uuid, logging, threading, atexit, bisect, functools, inspect
 from datetime import datetime
-from typing import Any, Dict, Callable, Optional
-from codecarbon import EmissionsTracker
+from typing import Any, Dict, Callable, Optional, Tuple, TYPE_CHECKING
+from energy_backends import EnergyBackend, make_backend   # codecarbon is only imported if selected
+from sinks import RecordSink, sink_from_env
+from sampling import CallSampler, WindowReservoir
+from spans import RunFrame, open_run, close_run, span, annotate   # re-exported: `from tracker import track, span`
+from envmeta import SCHEMA_VERSION, env_id, register_env   # SCHEMA_VERSION is re-exported
+from grid_intensity import default_provider as _grid_provider
+
+if TYPE_CHECKING:   # attribution (and concurrent.futures) is imported by "cpu" sessions only
+    from attribution import CpuAccount
+
+__all__ = ["track", "span", "annotate", "start_session", "stop_session", "set_sink", "set_metrics",
+           "TrackerSession", "SCHEMA_VERSION", "LOG_PATH", "KWH_COST"]
 
-SCHEMA_VERSION = "1.1.0"
 LOG_PATH = os.environ.get("CARBONWISE_LOG", "run_log.jsonl")
 
 # €/kWh for impact/cost calc
@@ -31,61 +41,407 @@ COUNTRY_G_INTENSITY = {
     "DE": 420,
 }
 
-def _get_energy_kwh_safe(tracker: EmissionsTracker) -> float:
-    """Try multiple places CodeCarbon may store energy (kWh)."""
-    try:
-        data = getattr(tracker, "final_emissions_data", None)
-        if data is not None and hasattr(data, "energy_consumed") and data.energy_consumed is not None:
-            return float(data.energy_consumed)
-    except Exception:
-        pass
-    try:
-        total_energy = getattr(tracker, "_total_energy", None)
-        if total_energy is not None and hasattr(total_energy, "kWh"):
-            return float(total_energy.kWh)
-    except Exception:
-        pass
-    try:
-        em = getattr(tracker, "_emissions_data", None)
-        if isinstance(em, dict):
-            val = em.get("energy_consumed")
-            if val is not None:
-                return float(val)
-    except Exception:
-        pass
-    return 0.0
-
-def _infer_gco2_per_kwh(meta: Dict[str, Any], country_iso: Optional[str]) -> float:
-    """Pick a grid intensity (gCO2/kWh) from meta.region or country ISO; default 300."""
+def _grid_keys(meta: Dict[str, Any], country_iso: Optional[str]) -> Tuple[str, ...]:
+    """(region, country) to look grid intensity up by, most specific first; either may be missing."""
     region = None
     m = meta or {}
     if isinstance(m, dict):
         region = m.get("region") or m.get("cloud_region") or m.get("provider_region")
-        if isinstance(region, str):
-            region = region.lower()
-    if region and region in REGION_G_INTENSITY:
-        return float(REGION_G_INTENSITY[region])
-    c = (country_iso or os.getenv("CODECARBON_COUNTRY_ISO_CODE") or "").upper()
-    if c in COUNTRY_G_INTENSITY:
-        return float(COUNTRY_G_INTENSITY[c])
+    region = region.lower() if isinstance(region, str) and region else None
+    c = (country_iso or os.getenv("CODECARBON_COUNTRY_ISO_CODE") or "").upper() or None
+    return tuple(k for k in (region, c) if k)
+
+def _infer_gco2_per_kwh(meta: Dict[str, Any], country_iso: Optional[str]) -> float:
+    """Pick a grid intensity (gCO2/kWh) from meta.region or country ISO; default 300."""
+    for key in _grid_keys(meta, country_iso):
+        if key in REGION_G_INTENSITY:
+            return float(REGION_G_INTENSITY[key])
+        if key in COUNTRY_G_INTENSITY:
+            return float(COUNTRY_G_INTENSITY[key])
     return 300.0  # conservative default
 
-def _env_meta() -> Dict[str, Any]:
-    return {
-        "schema_version": SCHEMA_VERSION,
-        "python_version": platform.python_version(),
-        "platform": platform.platform(),
-        "cpu": platform.processor(),
-        "codecarbon_version": _pkg_ver("codecarbon"),
-        "cwd": os.getcwd(),
+def _grid_factor(keys: Tuple[str, ...], static: float, t0: float, t1: float) -> Tuple[float, bool]:
+    """
+    gCO2/kWh for a run over epoch [t0, t1] and whether it came from a series:
+    the interval mean of the first key covered by $CARBONWISE_GRID_SERIES
+    (grid_intensity.py), else the static table value.
+    """
+    grid = _grid_provider()
+    if grid is not None:
+        for key in keys:
+            s = grid.get(key)
+            if s is not None:
+                return s.mean(t0, t1), True
+    return static, False
+
+_env_refs: Dict[Optional[str], Dict[str, str]] = {}
+
+def _env_meta(energy_backend: Optional[str] = None) -> Dict[str, Any]:
+    """meta fields naming this process's env block (see envmeta.py); built once per backend."""
+    ref = _env_refs.get(energy_backend)
+    if ref is None:
+        ref = _env_refs[energy_backend] = {"schema_version": SCHEMA_VERSION,
+                                           "env_id": env_id(SCHEMA_VERSION, energy_backend)}
+    return ref
+
+class TrackerSession:
+    """
+    Long-lived, per-process power sampler for request-level tracking.
+    - One energy backend (energy_backends.py) runs for the life of the process.
+    - A sampler thread records (t, cumulative kWh) into a bounded timeline.
+    - Tracked calls only note start/end timestamps; energy is read off the
+      timeline by linear interpolation (extrapolated past the last sample).
+      Backends with a cheap, exact counter (rapl, cputdp, fake) are sampled
+      at each begin/end as well, so calls are charged exact deltas.
+    - Calls that overlap (threads, asyncio tasks) split the energy of the
+      overlap equally, so N concurrent calls are not each charged N times.
+    - attribution="cpu" splits it by CPU seconds instead, counting pool
+      threads and child processes working for each call (see attribution.py);
+      the accounting runs at every begin/end and sampler tick.
+    """
+
+    def __init__(self, measure_secs: float = 1.0, country_iso: Optional[str] = None, max_samples: int = 4096,
+                 attribution: str = "share", backend: Optional[Any] = None):
+        if attribution not in ("share", "cpu"):
+            raise ValueError("attribution must be 'share' or 'cpu'")
+        self.measure_secs = float(measure_secs)
+        self.country_iso = country_iso
+        self.max_samples = int(max_samples)
+        self.backend: EnergyBackend = (backend if isinstance(backend, EnergyBackend)
+                                       else make_backend(backend, measure_secs, country_iso))
+        self.env = _env_meta(self.backend.name)
+        self._t: list = []
+        self._e: list = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Fair-share accounting: _share is the running integral of
+        # energy / active calls; a call's energy is the increase while it ran.
+        self._acct_lock = threading.Lock()
+        self._active = 0
+        self._share = 0.0
+        self._last_e = 0.0
+        self.attribution = attribution
+        self._ledger = None
+        if attribution == "cpu":
+            from attribution import CpuLedger, _current
+            self._ledger, self._account_var = CpuLedger(), _current
+
+    def start(self) -> "TrackerSession":
+        if self._thread is not None:
+            return self
+        self.backend.start()
+        self._sample()
+        self._thread = threading.Thread(target=self._run, name="carbonwise-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.measure_secs * 2)
+        try:
+            self.backend.stop()
+        except Exception:
+            pass
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.measure_secs):
+            self._sample()
+            if self._ledger is not None:
+                with self._acct_lock:   # keep CPU-split intervals no longer than a sample period
+                    self._advance(time.perf_counter())
+
+    def _sample(self) -> float:
+        with self._lock:   # read under the lock so concurrent samples stay in time order
+            e = self.backend.energy_kwh()
+            t = time.perf_counter()
+            if self._e and e < self._e[-1]:
+                e = self._e[-1]  # cumulative counter never goes backwards
+            self._t.append(t)
+            self._e.append(e)
+            if len(self._t) > 2 * self.max_samples:
+                del self._t[:-self.max_samples]
+                del self._e[:-self.max_samples]
+        return e
+
+    def energy_at(self, t: float) -> float:
+        """Cumulative kWh at perf_counter time `t`."""
+        ts, es = self._t, self._e
+        with self._lock:
+            n = len(ts)
+            if n == 0:
+                return 0.0
+            if t >= ts[-1]:
+                if n < 2 or ts[-1] <= ts[-2]:
+                    return es[-1]
+                rate = (es[-1] - es[-2]) / (ts[-1] - ts[-2])
+                return es[-1] + rate * (t - ts[-1])
+            i = bisect.bisect_right(ts, t)
+            if i == 0:
+                return es[0]
+            t0, t1, e0, e1 = ts[i - 1], ts[i], es[i - 1], es[i]
+            return e0 + (e1 - e0) * (t - t0) / (t1 - t0)
+
+    def energy_between(self, t0: float, t1: float) -> float:
+        return max(0.0, self.energy_at(t1) - self.energy_at(t0))
+
+    def energy_so_far(self, token: tuple) -> float:
+        """kWh attributed so far to a call that is still running (read-only, for live budget checks)."""
+        if self._ledger is not None:
+            return token[1].kwh   # split at every event and sampler tick
+        e = self.energy_at(time.perf_counter())
+        with self._acct_lock:
+            pending = max(0.0, e - self._last_e) / self._active if self._active else 0.0
+            return self._share - token[1] + pending
+
+    def _advance(self, now: float) -> None:
+        # exact counters are read (and added to the timeline) at every event
+        e = self._sample() if self.backend.exact else self.energy_at(now)
+        if self._ledger is not None:
+            self._ledger.split(max(0.0, e - self._last_e))
+        elif self._active and e > self._last_e:
+            self._share += (e - self._last_e) / self._active
+        self._last_e = max(e, self._last_e)
+
+    def begin(self) -> tuple:
+        """Mark a tracked call as active; returns a token for end()."""
+        now = time.perf_counter()
+        with self._acct_lock:
+            self._advance(now)
+            if self._ledger is None:
+                self._active += 1
+                return now, self._share
+            acc = self._ledger.open()
+            self._ledger.attach_thread(acc)
+        return now, acc, self._account_var.set((self, acc))
+
+    def end(self, token: tuple) -> tuple:
+        """Close a call opened by begin(); returns (latency_s, attributed kWh)."""
+        now = time.perf_counter()
+        if self._ledger is None:
+            t0, share0 = token
+            with self._acct_lock:
+                self._advance(now)
+                self._active -= 1
+                return now - t0, self._share - share0
+        t0, acc, ctx_token = token
+        try:
+            self._account_var.reset(ctx_token)
+        except ValueError:   # async generator finalized from another context
+            self._account_var.set(None)
+        with self._acct_lock:
+            self._advance(now)
+            self._ledger.detach_thread(acc)
+            self._ledger.close(acc)
+        return now - t0, acc.kwh
+
+    # Used by attribution.bind / TrackedProcessPool / watch_pid ("cpu" mode only).
+
+    def attach_thread(self, acc: CpuAccount) -> None:
+        with self._acct_lock:
+            self._advance(time.perf_counter())
+            if acc.active:
+                self._ledger.attach_thread(acc)
+
+    def detach_thread(self, acc: CpuAccount) -> None:
+        with self._acct_lock:
+            self._advance(time.perf_counter())
+            self._ledger.detach_thread(acc)
+
+    def add_cpu(self, acc: CpuAccount, cpu_s: float) -> None:
+        with self._acct_lock:
+            if acc.active:
+                acc.pending += cpu_s
+
+    def watch_pid(self, acc: CpuAccount, pid: int) -> bool:
+        with self._acct_lock:
+            self._advance(time.perf_counter())
+            return acc.active and self._ledger.watch_pid(acc, pid)
+
+_session: Optional[TrackerSession] = None
+_session_lock = threading.Lock()
+
+def start_session(measure_secs: float = 1.0, country_iso: Optional[str] = None,
+                  attribution: Optional[str] = None, energy_backend: Optional[Any] = None) -> TrackerSession:
+    """
+    Start (or return) the process-wide shared session used by `track(shared=True)`.
+    `attribution` ("share" or "cpu", default $CARBONWISE_ATTRIBUTION or "share")
+    and `energy_backend` (a name or an EnergyBackend, default
+    $CARBONWISE_ENERGY_BACKEND or "auto") only apply when this call creates it.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            attribution = attribution or os.getenv("CARBONWISE_ATTRIBUTION", "share")
+            _session = TrackerSession(measure_secs, country_iso, attribution=attribution,
+                                      backend=energy_backend).start()
+            atexit.register(stop_session)
+        return _session
+
+def stop_session() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.stop()
+            _session = None
+
+# Where records go; None keeps the synchronous per-record append to LOG_PATH.
+_sink: Optional[RecordSink] = sink_from_env(LOG_PATH)
+
+def set_sink(sink: Optional[RecordSink]) -> None:
+    """Route tracker records to `sink` (e.g. sinks.BufferedJsonlSink); None restores the default."""
+    global _sink
+    old, _sink = _sink, sink
+    if old is not None and old is not sink:
+        old.close()
+
+# Live metrics registry (metrics.py); None: no per-call metrics or budget watches.
+_metrics = None
+if os.environ.get("CARBONWISE_METRICS") or os.environ.get("CARBONWISE_METRICS_PORT"):
+    from metrics import metrics_from_env
+    _metrics = metrics_from_env()
+
+def set_metrics(registry) -> None:
+    """Feed every tracked call into `registry` (a metrics.MetricsRegistry); None turns it off."""
+    global _metrics
+    _metrics = registry
+
+def _no_clock() -> float:
+    return 0.0
+
+def _write_record(rec: Dict[str, Any]) -> None:
+    if _sink is not None:
+        _sink.write(rec)
+        return
+    with open(LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec) + "\n")
+
+def _build_record(
+    run_name: str,
+    requests: int,
+    meta: Dict[str, Any],
+    env: Dict[str, Any],
+    energy_kwh: float,
+    co2e_kg: float,
+    latency_ms: float,
+    carbon_budget_wh: Optional[float],
+    gco2_per_kwh_used: Optional[float],
+    run_id: Optional[str] = None,
+    grid_source: Optional[str] = None,
+) -> Dict[str, Any]:
+    energy_wh = energy_kwh * 1000.0
+    co2e_g = co2e_kg * 1000.0
+    fu = max(1, int(requests))
+    sci_wh_per_req = energy_wh / fu
+    cost_eur = energy_kwh * KWH_COST
+
+    budget_exceeded = False
+    budget_wh = None
+    if carbon_budget_wh is not None:
+        budget_wh = float(carbon_budget_wh)
+        budget_exceeded = energy_wh > budget_wh
+
+    rec = {
+        "run_id": run_id or str(uuid.uuid4()),
+        "run_name": run_name,
+        "ts": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+
+        # Raw units
+        "energy_kwh": round(energy_kwh, 9),
+        "co2e_kg": round(co2e_kg, 9),
+
+        # Display units
+        "energy_wh": round(energy_wh, 3),
+        "co2e_g": round(co2e_g, 3),
+        "latency_ms": round(latency_ms, 2),
+
+        # KPI
+        "requests": fu,
+        "sci_wh_per_req": round(sci_wh_per_req, 3),
+        "cost_eur": round(cost_eur, 4),
+
+        # Budget
+        "carbon_budget_wh": budget_wh,
+        "budget_exceeded": budget_exceeded,
+
+        # Provenance
+        "grid_factor_gco2_per_kwh_used": gco2_per_kwh_used,
+        "meta": {**meta, **env},
     }
+    if grid_source:
+        rec["grid_factor_source"] = grid_source   # "series": mean over the run from grid_intensity
+    return rec
 
-def _pkg_ver(name: str) -> str:
-    try:
-        import importlib.metadata as im
-        return im.version(name)
-    except Exception:
-        return "unknown"
+def _write_run(rec: Dict[str, Any]) -> None:
+    """Write a run record followed by its span records (which inherit its sample weight)."""
+    spans = rec.pop("_spans", None)
+    eid = rec["meta"].get("env_id")
+    if eid is not None:   # first record of this env for this log: add it to the side table
+        register_env(getattr(_sink, "path", LOG_PATH), eid)
+    _write_record(rec)
+    for s in spans or ():
+        if "sample_weight" in rec:
+            s["sample_weight"] = rec["sample_weight"]
+        _write_record(s)
+
+def _attach_spans(
+    rec: Dict[str, Any],
+    frame: RunFrame,
+    t0: float,
+    t1: float,
+    energy_kwh: float,
+    co2e_kg: float,
+    session: Optional[TrackerSession] = None,
+) -> None:
+    """
+    Turn the run's closed spans into child records (kind="span") on rec["_spans"].
+    A span's energy is the run's attributed energy over the span's interval:
+    weighted by the session's power timeline when there is one, otherwise by
+    wall time. Sequential spans that tile the run add up to the run's energy.
+    Fields from annotate() are copied onto the run record first.
+    """
+    for k, v in (frame.fields or {}).items():
+        rec.setdefault(k, v)
+    spans, dropped = frame.finish()
+    if not spans and not dropped:
+        return
+    whole = session.energy_between(t0, t1) if session is not None else 0.0
+    if whole > 0:
+        weigh = lambda a, b: session.energy_between(a, b) * energy_kwh / whole
+    else:
+        dur = t1 - t0
+        weigh = lambda a, b: energy_kwh * (b - a) / dur if dur > 0 else 0.0
+    kg_per_kwh = co2e_kg / energy_kwh if energy_kwh > 0 else 0.0
+    paths = {0: ""}
+    out = []
+    for sid, parent, depth, name, a, b, thread_id, task, error in sorted(spans):
+        path = paths[sid] = f"{paths.get(parent, '?')}/{name}" if parent else name
+        e = weigh(a, b)
+        out.append({
+            "kind": "span",
+            "run_id": rec["run_id"],
+            "run_name": rec["run_name"],
+            "ts": rec["ts"],
+            "span_id": sid,
+            "parent_span_id": parent,
+            "span": name,
+            "span_path": path,
+            "depth": depth,
+            "start_ms": round((a - t0) * 1000.0, 3),
+            "latency_ms": round((b - a) * 1000.0, 3),
+            "energy_kwh": round(e, 12),
+            "co2e_kg": round(e * kg_per_kwh, 12),
+            "thread_id": thread_id,
+            "task": task,
+            "error": error,
+        })
+    rec["spans"] = len(out)
+    if dropped:
+        rec["spans_dropped"] = dropped
+    rec["_spans"] = out
 
 def track(
     run_name: str = "run",
@@ -96,100 +452,252 @@ def track(
     measure_secs: float = 1.0,           # power sampling period
     quiet: bool = True,                  # suppress CodeCarbon logs
     carbon_budget_wh: Optional[float] = None,  # e.g., 800.0 Wh budget for the run
+    shared: bool = False,                # attribute from the process-wide session instead of a tracker per call
+    sample_every: int = 1,               # write 1-in-N calls, each with sample_weight=N
+    sample_reservoir: Optional[Tuple[int, float]] = None,  # (k, window_secs): k random calls per window
+    overhead_budget_pct: Optional[float] = None,  # adapt N to keep tracker cost under this % of call CPU
+    attribution: Optional[str] = None,   # "share" | "cpu" for the shared session, if this call starts it
+    energy_backend: Optional[str] = None,  # "rapl" | "cputdp" | "codecarbon" | "fake" | "auto" (energy_backends.py)
 ) -> Callable:
     """
     Decorator to measure energy/CO2 and log JSONL.
     - Falls back to energy-from-CO2 if raw energy is unavailable.
     - Adds SCI, cost, budget flags, and environment metadata.
+    - shared=True: per-request mode; one sampler per process (see TrackerSession),
+      each call only records timestamps and is charged from the power timeline.
+    - Coroutine functions and async generators are detected and always tracked
+      through the shared session, from first await to completion/exhaustion.
+    - Sampling (sample_every / sample_reservoir / overhead_budget_pct) writes only
+      some calls; each record then carries `sample_weight` (calls it stands for),
+      which cw_report / cw_quality_gate / rollup use as a frequency weight.
+    - attribution="cpu" splits overlapping calls' energy by CPU time, including
+      work submitted to attribution.TrackedThreadPool / TrackedProcessPool.
+    - `span("phase")` blocks inside a tracked call are written after the run
+      record as child records (kind="span") with their share of its energy;
+      `annotate(key=value)` adds fields to the call's own record.
+    - With $CARBONWISE_GRID_SERIES set (hourly CSV/Parquet, grid_intensity.py),
+      CO2e uses the grid intensity averaged over each run instead of the static
+      REGION_G_INTENSITY / COUNTRY_G_INTENSITY value.
+    - energy_backend picks the energy source (default $CARBONWISE_ENERGY_BACKEND,
+      else auto: RAPL if readable, then CodeCarbon, then CPU time x TDP).
+    - With a metrics registry (set_metrics / $CARBONWISE_METRICS_PORT), every
+      call updates live counters and windows, and calls with carbon_budget_wh
+      are watched while they run: alerts fire on the energy so far.
     """
     if quiet:
         logging.getLogger("codecarbon").setLevel(logging.ERROR)
 
     meta = dict(meta or {})
     meta.setdefault("notes", "CarbonWise tracker")
+    if sample_reservoir and (sample_every > 1 or overhead_budget_pct):
+        raise ValueError("sample_reservoir cannot be combined with sample_every/overhead_budget_pct")
 
     def deco(fn: Callable) -> Callable:
-        def wrapper(*args, **kwargs):
-            rid = str(uuid.uuid4())
+        sampler = (CallSampler(sample_every, overhead_budget_pct)
+                   if sample_every > 1 or overhead_budget_pct else None)
+        reservoir = WindowReservoir(*sample_reservoir, emit=_write_run) if sample_reservoir else None
+        # Overhead accounting needs the thread CPU clock; skip the calls otherwise.
+        cpu = time.thread_time if sampler is not None and sampler.budget else _no_clock
 
-            # Respect env var if set; otherwise allow explicit country hint
-            if country_iso and not os.getenv("CODECARBON_COUNTRY_ISO_CODE"):
-                os.environ["CODECARBON_COUNTRY_ISO_CODE"] = country_iso
+        budget = float(carbon_budget_wh) if carbon_budget_wh is not None else None
 
-            # Build tracker (works across CodeCarbon versions)
-            try:
-                tracker = EmissionsTracker(
-                    measure_power_secs=measure_secs,
-                    country_iso_code=os.getenv("CODECARBON_COUNTRY_ISO_CODE"),
+        def live(m, latency_s: float, energy_kwh: float, weight=1) -> None:
+            m.observe(run_name, latency_s * 1000.0, energy_kwh, weight,
+                      budget is not None and energy_kwh * 1000.0 > budget)
+
+        def watch(energy_fn: Callable[[], float], handle):
+            """Budget watch on the metrics registry while the call runs (None without one)."""
+            m = _metrics
+            if m is None:
+                return None
+            return m.watch(run_name, budget, energy_fn, handle[0].run_id if handle else None)
+
+        def expose(wrapper: Callable) -> Callable:
+            wrapper.sampler, wrapper.reservoir = sampler, reservoir   # for inspection / flush()
+            return wrapper
+
+        def admit():
+            """(tracked?, ticket): ticket is the sample weight or a reservoir slot."""
+            if reservoir is not None:
+                slot = reservoir.offer()
+                return slot is not None, slot
+            if sampler is not None:
+                w = sampler.decide()
+                return w is not None, w
+            return True, None
+
+        def write(rec: Dict[str, Any], ticket) -> None:
+            if reservoir is not None:
+                reservoir.fill(ticket, rec)   # weighted and written when its window closes
+                return
+            if ticket is not None:
+                rec["sample_weight"] = ticket
+            _write_run(rec)
+
+        if shared or inspect.iscoroutinefunction(fn) or inspect.isasyncgenfunction(fn):
+            grid_keys = _grid_keys(meta, country_iso)
+            static_gco2 = _infer_gco2_per_kwh(meta, country_iso)
+
+            def emit(session: TrackerSession, token: tuple, latency_s: float, energy_kwh: float,
+                     ticket, frame: RunFrame) -> None:
+                end = time.time()
+                gco2_per_kwh, from_series = _grid_factor(grid_keys, static_gco2, end - latency_s, end)
+                co2e_kg = energy_kwh * gco2_per_kwh / 1000.0
+                rec = _build_record(
+                    run_name, requests, meta, session.env, energy_kwh, co2e_kg,
+                    latency_s * 1000.0, carbon_budget_wh, gco2_per_kwh, run_id=frame.run_id,
+                    grid_source="series" if from_series else None,
                 )
-            except TypeError:
-                tracker = EmissionsTracker(measure_power_secs=measure_secs)
+                t0 = token[0]
+                _attach_spans(rec, frame, t0, t0 + latency_s, energy_kwh, co2e_kg, session)
+                write(rec, ticket)
 
-            tracker.start()
-            t0 = time.time()
-            result = fn(*args, **kwargs)
-            latency_ms = (time.time() - t0) * 1000.0
+        # Coroutines and async generators always use the shared session: the awaited
+        # work is timed (not coroutine creation) and overlapping tasks share power.
+        # Calls that are not sampled still begin/end on the session so concurrent
+        # sampled calls are only charged their fair share. Thread CPU time is not
+        # per-task under asyncio, so the overhead budget compares against latency.
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                session = _session or start_session(measure_secs, country_iso, attribution, energy_backend)
+                tracked, ticket = admit()
+                handle = open_run(str(uuid.uuid4())) if tracked else None
+                token = session.begin()
+                watching = watch(lambda: session.energy_so_far(token), handle) if budget is not None else None
+                try:
+                    result = await fn(*args, **kwargs)
+                finally:
+                    latency_s, energy_kwh = session.end(token)
+                    frame = close_run(handle) if handle else None
+                    if watching is not None:
+                        watching.close()
+                    m = _metrics
+                    if m is not None:
+                        live(m, latency_s, energy_kwh)
+                if tracked:
+                    c0 = cpu()
+                    emit(session, token, latency_s, energy_kwh, ticket, frame)
+                    if sampler is not None:
+                        sampler.observe(cpu() - c0, latency_s)
+                return result
+            return expose(async_wrapper)
 
-            # stop() returns CO2e in kg
-            try:
-                co2e_kg = float(tracker.stop() or 0.0)
-            except Exception:
-                co2e_kg = 0.0
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def asyncgen_wrapper(*args, **kwargs):
+                session = _session or start_session(measure_secs, country_iso, attribution, energy_backend)
+                tracked, ticket = admit()
+                handle = open_run(str(uuid.uuid4())) if tracked else None
+                token = session.begin()
+                watching = watch(lambda: session.energy_so_far(token), handle) if budget is not None else None
+                done = False
+                try:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                    done = True
+                finally:
+                    latency_s, energy_kwh = session.end(token)
+                    frame = close_run(handle) if handle else None
+                    if watching is not None:
+                        watching.close()
+                    m = _metrics
+                    if m is not None:
+                        live(m, latency_s, energy_kwh)
+                    if done and tracked:
+                        c0 = cpu()
+                        emit(session, token, latency_s, energy_kwh, ticket, frame)
+                        if sampler is not None:
+                            sampler.observe(cpu() - c0, latency_s)
+            return expose(asyncgen_wrapper)
+
+        if shared:
+            @functools.wraps(fn)
+            def shared_wrapper(*args, **kwargs):
+                session = _session or start_session(measure_secs, country_iso, attribution, energy_backend)
+                c_in = cpu()
+                tracked, ticket = admit()
+                handle = open_run(str(uuid.uuid4())) if tracked else None
+                token = session.begin()
+                watching = watch(lambda: session.energy_so_far(token), handle) if budget is not None else None
+                c0 = cpu()
+                try:
+                    result = fn(*args, **kwargs)
+                finally:
+                    c1 = cpu()
+                    latency_s, energy_kwh = session.end(token)
+                    frame = close_run(handle) if handle else None
+                    if watching is not None:
+                        watching.close()
+                    m = _metrics
+                    if m is not None:
+                        live(m, latency_s, energy_kwh)
+                if tracked:
+                    c2 = cpu()
+                    emit(session, token, latency_s, energy_kwh, ticket, frame)
+                    if sampler is not None:
+                        # begin/end is paid by every call, the record only by tracked ones
+                        sampler.observe(cpu() - c2, c1 - c0, (c0 - c_in) + (c2 - c1))
+                return result
+            return expose(shared_wrapper)
 
-            # Try to read energy; if zero/missing, infer from CO2 using grid intensity.
-            energy_kwh = _get_energy_kwh_safe(tracker)
+        grid_keys = _grid_keys(meta, country_iso)
+        static_gco2 = _infer_gco2_per_kwh(meta, country_iso)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracked, ticket = admit()
+            if not tracked:
+                return fn(*args, **kwargs)
+            c_in = cpu()
+
+            backend = make_backend(energy_backend, measure_secs, country_iso, save_to_file=True).start()
+            t0 = time.time()
+            handle = open_run(str(uuid.uuid4()))
+            watching = watch(backend.energy_kwh, handle) if budget is not None else None
+            p0 = time.perf_counter()
+            c0 = cpu()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                c1 = cpu()
+                p1 = time.perf_counter()
+                frame = close_run(handle)
+                if watching is not None:
+                    watching.close()
+                t1 = time.time()
+                energy_kwh = backend.stop()   # also when fn raised: release fds, poll thread, CodeCarbon
+            latency_ms = (t1 - t0) * 1000.0
+            gco2, from_series = _grid_factor(grid_keys, static_gco2, t0, t1)
+            co2e_kg = getattr(backend, "co2e_kg", None)
             gco2_per_kwh_used = None
-            if (energy_kwh is None) or (energy_kwh <= 0.0):
-                gco2_per_kwh_used = _infer_gco2_per_kwh(meta, country_iso)
+            if co2e_kg is None or (from_series and energy_kwh > 0.0):
+                # CodeCarbon reports its own CO2e; other backends, and any run an
+                # intensity series covers, use the grid intensity over the run
+                gco2_per_kwh_used = gco2
+                co2e_kg = energy_kwh * gco2 / 1000.0
+            elif energy_kwh <= 0.0:
+                # Energy unavailable: infer it from CO2 using grid intensity.
+                gco2_per_kwh_used = static_gco2
+                from_series = False
                 # energy_kwh = (kg * 1000 g/kg) / (g/kWh)
                 if gco2_per_kwh_used > 0:
                     energy_kwh = (co2e_kg * 1000.0) / gco2_per_kwh_used
                 else:
                     energy_kwh = 0.0
 
-            energy_wh = energy_kwh * 1000.0
-            co2e_g = co2e_kg * 1000.0
-            fu = max(1, int(requests))
-            sci_wh_per_req = energy_wh / fu
-            cost_eur = energy_kwh * KWH_COST
-
-            budget_exceeded = False
-            budget_wh = None
-            if carbon_budget_wh is not None:
-                budget_wh = float(carbon_budget_wh)
-                budget_exceeded = energy_wh > budget_wh
-
-            rec = {
-                "run_id": rid,
-                "run_name": run_name,
-                "ts": datetime.utcnow().isoformat(timespec="seconds") + "Z",
-
-                # Raw units
-                "energy_kwh": round(energy_kwh, 9),
-                "co2e_kg": round(co2e_kg, 9),
-
-                # Display units
-                "energy_wh": round(energy_wh, 3),
-                "co2e_g": round(co2e_g, 3),
-                "latency_ms": round(latency_ms, 2),
-
-                # KPI
-                "requests": fu,
-                "sci_wh_per_req": round(sci_wh_per_req, 3),
-                "cost_eur": round(cost_eur, 4),
-
-                # Budget
-                "carbon_budget_wh": budget_wh,
-                "budget_exceeded": budget_exceeded,
-
-                # Provenance
-                "grid_factor_gco2_per_kwh_used": gco2_per_kwh_used,
-                "meta": {**meta, **_env_meta()},
-            }
-
-            with open(LOG_PATH, "a", encoding="utf-8") as f:
-                f.write(json.dumps(rec) + "\n")
-
+            rec = _build_record(
+                run_name, requests, meta, _env_meta(backend.name), energy_kwh, co2e_kg,
+                latency_ms, carbon_budget_wh, gco2_per_kwh_used, run_id=frame.run_id,
+                grid_source="series" if from_series else None,
+            )
+            _attach_spans(rec, frame, p0, p1, energy_kwh, co2e_kg)   # no power timeline: split by time
+            write(rec, ticket)
+            m = _metrics
+            if m is not None:   # only measured calls reach here; a sampler's weight stands for the rest
+                live(m, p1 - p0, energy_kwh, ticket if sampler is not None else 1)
+            if sampler is not None:
+                sampler.observe((c0 - c_in) + (cpu() - c1), c1 - c0)
             return result
-        return wrapper
+        return expose(wrapper)
     return deco
@@ -43,6 +43,9 @@ export default function Upload() {
           });
       }
 
+      // Span records (kind: "span") are per-phase children of a run, not runs
+      parsedRuns = parsedRuns.filter((r: any) => r?.kind !== 'span');
+
       setRuns(parsedRuns);
       toast.success(`Successfully loaded ${parsedRuns.length} runs`);
     } catch (error) {